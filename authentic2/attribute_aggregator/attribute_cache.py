@@ -0,0 +1,198 @@
+'''
+    VERIDIC Project - Towards a centralized access control system
+
+    Copyright (C) 2011  Mikael Ates
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+import datetime
+import hashlib
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import get_cache
+from django.contrib.auth.models import User
+from django.db.models import get_model
+from django.db.models.signals import post_save, post_delete, \
+    class_prepared
+
+from authentic2.attribute_aggregator.core import iso8601_to_datetime
+
+
+logger = logging.getLogger('attribute_aggregator.attribute_cache')
+
+
+# Time in seconds the values retrieved from a source are cached, per source
+# name, 0 disables the cache of a source
+CACHE_TIMEOUT = getattr(settings, 'ATTRIBUTE_SOURCE_CACHE_TIMEOUT', 0)
+CACHE_TIMEOUTS = getattr(settings, 'ATTRIBUTE_SOURCE_CACHE_TIMEOUTS', {})
+# Name of the Django cache used
+CACHE = getattr(settings, 'ATTRIBUTE_CACHE', 'default')
+# Lifetime of the generation of the cached values of a user, it must be
+# longer than the timeouts of the sources
+GENERATION_TIMEOUT = 30 * 86400
+PROFILE_MODULE = getattr(settings, 'AUTH_PROFILE_MODULE', '').lower()
+
+
+def get_timeout(source):
+    return CACHE_TIMEOUTS.get(source.name, CACHE_TIMEOUT)
+
+
+def get_generation(cache, user):
+    '''
+        Return the generation of the cached values of a user, changing it
+        invalidates all of them.
+    '''
+    key = 'attribute-cache-generation-%s' % user.pk
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        cache.add(key, generation, GENERATION_TIMEOUT)
+        generation = cache.get(key, generation)
+    return generation
+
+
+def get_key(user, generation, source, definition):
+    return 'attribute-cache-%s-%s-%s-%s' % (user.pk, generation, source.pk,
+        hashlib.sha1(definition.encode('utf-8')).hexdigest())
+
+
+def get_attributes(user, source, definitions):
+    '''
+        Return the list of cached attributes of the user in a source for
+        the given definitions, and the list of the definitions not cached.
+    '''
+    if not definitions or not get_timeout(source):
+        return [], definitions
+    cache = get_cache(CACHE)
+    generation = get_generation(cache, user)
+    keys = dict((get_key(user, generation, source, definition), definition)
+        for definition in definitions)
+    cached = cache.get_many(keys.keys())
+    data = []
+    for key, attributes in cached.iteritems():
+        data.extend(attributes)
+    missing = [definition for key, definition in keys.iteritems()
+        if key not in cached]
+    logger.debug('get_attributes: %d definitions of %s cached for %s' \
+        % (len(definitions) - len(missing), source, user))
+    return data, missing
+
+
+def set_attributes(user, source, definitions, data):
+    '''
+        Cache the attributes retrieved from a source for the given
+        definitions, definitions without values are cached as such.
+    '''
+    timeout = get_timeout(source)
+    if not definitions or not timeout:
+        return
+    now = datetime.datetime.now()
+    by_definition = dict((definition.lower(), []) for definition in definitions)
+    timeouts = dict()
+    for attribute in data or []:
+        definition = attribute.get('definition', '').lower()
+        if definition not in by_definition:
+            continue
+        by_definition[definition].append(attribute)
+        if attribute.get('expiration_date'):
+            try:
+                expiration = \
+                    iso8601_to_datetime(attribute['expiration_date'])
+            except ValueError:
+                continue
+            delta = expiration - now
+            seconds = delta.days * 86400 + delta.seconds
+            timeouts[definition] = min(timeouts.get(definition, timeout),
+                seconds)
+    cache = get_cache(CACHE)
+    generation = get_generation(cache, user)
+    for definition in definitions:
+        attributes = by_definition[definition.lower()]
+        definition_timeout = timeouts.get(definition.lower(), timeout)
+        if definition_timeout <= 0:
+            continue
+        cache.set(get_key(user, generation, source, definition), attributes,
+            definition_timeout)
+
+
+def invalidate_user(user):
+    '''
+        Forget the cached attributes of a user.
+    '''
+    invalidate_user_id(user.pk)
+
+
+def invalidate_user_id(user_id):
+    cache = get_cache(CACHE)
+    cache.set('attribute-cache-generation-%s' % user_id, uuid.uuid4().hex,
+        GENERATION_TIMEOUT)
+    logger.debug('invalidate_user_id: cached attributes of user %s \
+        invalidated' % user_id)
+
+
+def user_changed(sender, instance, **kwargs):
+    '''
+        Invalidate the cached attributes of a user when the user is
+        modified.
+    '''
+    invalidate_user_id(instance.pk)
+
+
+def user_related_changed(sender, instance, **kwargs):
+    '''
+        Invalidate the cached attributes of a user when its profile or its
+        aliases in the sources are modified.
+    '''
+    invalidate_user_id(instance.user_id)
+
+
+def connect_model(sender, receiver):
+    name = '%s.%s' % (sender._meta.app_label,
+        sender._meta.object_name.lower())
+    post_save.connect(receiver, sender=sender,
+        dispatch_uid='attribute_cache_%s_saved' % name)
+    post_delete.connect(receiver, sender=sender,
+        dispatch_uid='attribute_cache_%s_deleted' % name)
+
+
+def is_profile_model(sender):
+    return PROFILE_MODULE and PROFILE_MODULE == '%s.%s' \
+        % (sender._meta.app_label, sender._meta.object_name.lower())
+
+
+def profile_model_prepared(sender, **kwargs):
+    if is_profile_model(sender):
+        connect_model(sender, user_related_changed)
+
+
+def connect_signals():
+    from authentic2.attribute_aggregator.models import UserAliasInSource
+    connect_model(User, user_changed)
+    connect_model(UserAliasInSource, user_related_changed)
+    if not PROFILE_MODULE or '.' not in PROFILE_MODULE:
+        return
+    # the profile model cannot be loaded while models are being loaded,
+    # connect to it once its class is prepared
+    app_label, model_name = PROFILE_MODULE.split('.', 1)
+    profile_model = get_model(app_label, model_name, seed_cache=False,
+        only_installed=False)
+    if profile_model is not None:
+        connect_model(profile_model, user_related_changed)
+    else:
+        class_prepared.connect(profile_model_prepared,
+            dispatch_uid='attribute_cache_profile_prepared')
@@ -33,6 +33,79 @@ from authentic2.attribute_aggregator.mapping import ATTRIBUTE_MAPPING
 logger = logging.getLogger('attribute_aggregator')
 
 
+def build_indexes(mapping):
+    '''
+        Build the reverse indexes of an attribute mapping.
+
+        Each index maps a key (an oid, an alias, a profile field name or a
+        (namespace, name) pair) to the tuple of the names of the definitions
+        using it, in the iteration order of the mapping, so that the first
+        one is the one found by a linear scan of the mapping. The indexes
+        are private to this module, the lookup functions return names or
+        new lists, never the indexes themselves.
+    '''
+    indexes = dict(oid={}, alias={}, profile_field_name={}, name_in_ns={},
+        friendly_name_in_ns={})
+
+    def add(index, key, def_name):
+        defs = indexes[index].setdefault(key, [])
+        if def_name not in defs:
+            defs.append(def_name)
+
+    for def_name, content in mapping.items():
+        if 'oid' in content:
+            add('oid', content['oid'], def_name)
+        for alias in content.get('alias', ()):
+            add('alias', alias, def_name)
+        if 'profile_field_name' in content:
+            add('profile_field_name', content['profile_field_name'],
+                def_name)
+        for namespace, names in content.get('namespaces', {}).items():
+            for name in names.get('identifiers', ()):
+                add('name_in_ns', (namespace, name), def_name)
+            for name in names.get('friendly_names', ()):
+                add('friendly_name_in_ns', (namespace, name), def_name)
+    return dict((index, dict((key, tuple(defs))
+            for key, defs in content.items()))
+        for index, content in indexes.items())
+
+
+def check_mapping(mapping=ATTRIBUTE_MAPPING):
+    '''
+        Return a list of messages describing the keys of the mapping which
+        are used by more than one definition, only the first one is found
+        by the lookup functions.
+    '''
+    errors = []
+    indexes = build_indexes(mapping)
+    for index, content in sorted(indexes.items()):
+        for key, defs in sorted(content.items()):
+            if len(defs) > 1:
+                errors.append('%s %r is used by %s' \
+                    % (index, key, ', '.join(defs)))
+    for alias, defs in sorted(indexes['alias'].items()):
+        if alias in mapping and alias not in defs:
+            errors.append('alias %r of %s is also a definition name' \
+                % (alias, ', '.join(defs)))
+    return errors
+
+
+_INDEXES = build_indexes(ATTRIBUTE_MAPPING)
+_DEF_NAME_FROM_OID = \
+    dict((k, v[0]) for k, v in _INDEXES['oid'].items())
+_DEF_NAME_FROM_ALIAS = \
+    dict((k, v[0]) for k, v in _INDEXES['alias'].items())
+_DEF_NAME_FROM_PROFILE_FIELD_NAME = \
+    dict((k, v[0]) for k, v in _INDEXES['profile_field_name'].items())
+_DEF_NAMES_FROM_NAME_AND_NS = dict()
+for index in ('name_in_ns', 'friendly_name_in_ns'):
+    for key, defs in _INDEXES[index].items():
+        _DEF_NAMES_FROM_NAME_AND_NS[key] = \
+            _DEF_NAMES_FROM_NAME_AND_NS.get(key, frozenset()) | frozenset(defs)
+_DEF_ORDER = dict((def_name, i) \
+    for i, def_name in enumerate(ATTRIBUTE_MAPPING.keys()))
+
+
 def iso8601_to_datetime(date_string):
     '''
         Convert a string formatted as an ISO8601 date into a time_t value.
@@ -63,11 +136,7 @@ def get_full_definition(definition):
 def get_def_name_from_oid(oid):
     if not oid:
         return None
-    for def_name, content in ATTRIBUTE_MAPPING.items():
-        if 'oid' in content:
-            if content['oid'] == oid:
-                return def_name
-    return None
+    return _DEF_NAME_FROM_OID.get(oid)
 
 
 def get_oid_from_def_name(definition_name):
@@ -80,31 +149,21 @@ def get_oid_from_def_name(definition_name):
 def get_def_name_from_alias(alias):
     if not alias:
         return None
-    for def_name, content in ATTRIBUTE_MAPPING.items():
-        if 'alias' in content:
-            if alias in content['alias']:
-                return def_name
-    return None
+    return _DEF_NAME_FROM_ALIAS.get(alias)
 
 
 def get_definition_from_oid(oid):
-    if not oid:
+    def_name = get_def_name_from_oid(oid)
+    if not def_name:
         return None
-    for def_name, content in ATTRIBUTE_MAPPING.items():
-        if 'oid' in content:
-            if content['oid'] == oid:
-                return ATTRIBUTE_MAPPING[def_name]
-    return None
+    return ATTRIBUTE_MAPPING[def_name]
 
 
 def get_definition_from_alias(alias):
-    if not alias:
+    def_name = get_def_name_from_alias(alias)
+    if not def_name:
         return None
-    for def_name, content in ATTRIBUTE_MAPPING.items():
-        if 'alias' in content:
-            if alias in content['alias']:
-                return ATTRIBUTE_MAPPING[def_name]
-    return None
+    return ATTRIBUTE_MAPPING[def_name]
 
 
 def get_profile_field_name_from_definition(definition):
@@ -117,24 +176,18 @@ def get_profile_field_name_from_definition(definition):
 def get_definition_from_profile_field_name(field_name):
     if not field_name:
         return None
-    for def_name, content in ATTRIBUTE_MAPPING.items():
-        if 'profile_field_name' in content:
-            if field_name == content['profile_field_name']:
-                return def_name
-    return None
+    return _DEF_NAME_FROM_PROFILE_FIELD_NAME.get(field_name)
 
 
 def get_def_name_from_name_and_ns_of_attribute(name, namespace):
     if not name or not namespace:
         return None
-    for def_name, content in ATTRIBUTE_MAPPING.items():
-        if "namespaces" in content \
-                and namespace in content["namespaces"].keys():
-            if name in content["namespaces"][namespace]["identifiers"]:
-                return def_name
-            if name in content["namespaces"][namespace]["friendly_names"]:
-                return def_name
-    return None
+    defs = _DEF_NAMES_FROM_NAME_AND_NS.get((namespace, name))
+    if not defs:
+        return None
+    # the first definition of the mapping using the name as an identifier
+    # or as a friendly name
+    return min(defs, key=_DEF_ORDER.get)
 
 
 def get_attribute_name_in_namespace(definition, namespace):
@@ -186,6 +239,23 @@ def is_oid_of_definition(definition_name, oid):
     return False
 
 
+def get_def_names_matching(definition):
+    '''
+        Return the names of the definitions identified by a definition
+        name, an alias or an oid.
+    '''
+    if not definition:
+        return []
+    defs = []
+    if definition in ATTRIBUTE_MAPPING:
+        defs.append(definition)
+    for def_name in _INDEXES['alias'].get(definition, ()) \
+            + _INDEXES['oid'].get(definition, ()):
+        if def_name not in defs:
+            defs.append(def_name)
+    return defs
+
+
 def convert_from_string(definition_name, value):
     if not definition_name in ATTRIBUTE_MAPPING:
         return None
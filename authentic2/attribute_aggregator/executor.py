@@ -0,0 +1,114 @@
+'''
+    VERIDIC Project - Towards a centralized access control system
+
+    Copyright (C) 2011  Mikael Ates
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+import logging
+
+from django.conf import settings
+
+from authentic2.executor import Executor, workers_share_database, \
+    run_concurrently as run_tasks
+
+
+logger = logging.getLogger('attribute_aggregator.executor')
+
+
+# Number of threads querying attribute sources concurrently
+MAX_WORKERS = getattr(settings, 'ATTRIBUTE_SOURCE_WORKERS', 10)
+# Time in seconds given to each source to answer, can be set per source
+# name with ATTRIBUTE_SOURCE_TIMEOUTS
+SOURCE_TIMEOUT = getattr(settings, 'ATTRIBUTE_SOURCE_TIMEOUT', 5)
+SOURCE_TIMEOUTS = getattr(settings, 'ATTRIBUTE_SOURCE_TIMEOUTS', {})
+# Time in seconds given to all sources to answer
+DEADLINE = getattr(settings, 'ATTRIBUTE_SOURCES_DEADLINE', 10)
+# Sources answering after this time in seconds are logged
+SLOW_SOURCE = getattr(settings, 'ATTRIBUTE_SOURCE_SLOW', 1)
+
+
+_executor = Executor(MAX_WORKERS)
+
+
+def get_source_timeout(source):
+    return SOURCE_TIMEOUTS.get(source.name, SOURCE_TIMEOUT)
+
+
+def get_receiver_timeout(source=None):
+    '''
+        Time given to a receiver querying a source, or all the sources,
+        which it queries concurrently.
+    '''
+    if source is not None:
+        return get_source_timeout(source)
+    return max([SOURCE_TIMEOUT] + SOURCE_TIMEOUTS.values())
+
+
+def run_concurrently(tasks, deadline=None, executor=None):
+    '''
+        authentic2.executor.run_concurrently() with the settings of the
+        attribute sources, tasks with a None timeout are given
+        SOURCE_TIMEOUT.
+    '''
+    if deadline is None:
+        deadline = DEADLINE
+    if executor is None:
+        executor = _executor
+    with_timeouts = []
+    for key, func, args, kwargs, timeout in tasks:
+        if timeout is None:
+            timeout = SOURCE_TIMEOUT
+        with_timeouts.append((key, func, args, kwargs, timeout))
+    return run_tasks(with_timeouts, deadline, executor, slow=SLOW_SOURCE)
+
+
+def send_concurrently(signal, sender, **named):
+    '''
+        Like Signal.send() but the receivers are called concurrently, the
+        (receiver, response) pairs are yielded as they complete. Receivers
+        are given the timeout of the source in named, or the longest
+        timeout of the sources, within the global deadline.
+
+        signal must be a ConcurrentSignal. Receivers run in the workers,
+        with their own database connections, like tasks of
+        run_concurrently(). When they would not see the rows written by the
+        request, see workers_share_database(), they are called one after
+        the other in the current thread instead.
+    '''
+    kwargs = dict(named)
+    kwargs.update(signal=signal, sender=sender)
+    receivers = signal.get_receivers(sender)
+    if not workers_share_database():
+        for receiver in receivers:
+            try:
+                response = receiver(**kwargs)
+            except Exception:
+                logger.exception('send_concurrently: receiver %r failed' \
+                    % receiver)
+                continue
+            yield receiver, response
+        return
+    timeout = get_receiver_timeout(named.get('source'))
+    tasks = []
+    by_key = dict()
+    for receiver in receivers:
+        key = getattr(receiver, '__module__', '') + '.' \
+            + getattr(receiver, '__name__', repr(receiver))
+        by_key[key] = receiver
+        tasks.append((key, receiver, (), kwargs, timeout))
+    for key, response in run_concurrently(tasks):
+        yield by_key[key], response
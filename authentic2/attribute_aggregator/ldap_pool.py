@@ -0,0 +1,271 @@
+'''
+    VERIDIC Project - Towards a centralized access control system
+
+    Copyright (C) 2011  Mikael Ates
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import ldap
+import ldap.ldapobject
+
+from django.conf import settings
+
+
+logger = logging.getLogger('attribute_aggregator.ldap_pool')
+
+
+# Maximum number of idle connections kept for each LDAP source
+POOL_SIZE = getattr(settings, 'LDAP_POOL_SIZE', 10)
+# Timeout in seconds of the connections and of the searches
+TIMEOUT = getattr(settings, 'LDAP_TIMEOUT', 5)
+# Connections idle for more than this number of seconds are checked before
+# being reused
+CHECK_INTERVAL = getattr(settings, 'LDAP_POOL_CHECK_INTERVAL', 60)
+# Directory of the CA certificates of the LDAPS sources, which must be
+# private to the process; by default a directory created in the temporary
+# directory
+CA_DIR = getattr(settings, 'LDAP_CA_DIR', None)
+
+
+_lock = threading.Lock()
+# source pk -> Pool
+_pools = dict()
+_ca_lock = threading.Lock()
+_ca_dir = None
+
+
+def get_uri(source):
+    if '://' in source.server:
+        return source.server
+    scheme = 'ldap'
+    if source.ldaps:
+        scheme = 'ldaps'
+    return '%s://%s:%d' % (scheme, source.server, source.port)
+
+
+def check_private(path):
+    '''
+        Raise ldap.LOCAL_ERROR unless path is owned by the process and
+        cannot be written by other users.
+    '''
+    st = os.lstat(path)
+    if st.st_uid != os.getuid() or st.st_mode & 022:
+        raise ldap.LOCAL_ERROR({'desc': '%s is not private to the '
+            'process, CA certificates cannot be stored there' % path})
+
+
+def get_ca_dir():
+    '''
+        Return the directory of the CA certificate files, LDAP_CA_DIR or a
+        directory created by the process in the temporary directory.
+    '''
+    global _ca_dir
+    _ca_lock.acquire()
+    try:
+        if _ca_dir is None:
+            if CA_DIR:
+                if not os.path.isdir(CA_DIR):
+                    os.makedirs(CA_DIR, 0700)
+                path = CA_DIR
+            else:
+                path = tempfile.mkdtemp(prefix='authentic2-ldap-ca-')
+            check_private(path)
+            _ca_dir = path
+        return _ca_dir
+    finally:
+        _ca_lock.release()
+
+
+def get_ca_file(certificate):
+    '''
+        Return the path of a file containing the PEM certificate, as
+        python-ldap only accepts CA certificates as files. An existing file
+        is only reused if it is private and holds the same certificate.
+    '''
+    content = certificate.encode('utf-8')
+    directory = get_ca_dir()
+    path = os.path.join(directory,
+        '%s.pem' % hashlib.sha1(content).hexdigest())
+    try:
+        check_private(path)
+        f = open(path, 'rb')
+        try:
+            if f.read() == content:
+                return path
+        finally:
+            f.close()
+    except (OSError, IOError, ldap.LOCAL_ERROR):
+        pass
+    fd, tmp = tempfile.mkstemp(dir=directory)
+    try:
+        os.write(fd, content)
+    finally:
+        os.close(fd)
+    os.rename(tmp, path)
+    return path
+
+
+class Pool(object):
+    '''
+        Idle connections to a LDAP source, bound with the service account of
+        the source.
+    '''
+
+    def __init__(self, source):
+        self.key = self.get_key(source)
+        self.uri = get_uri(source)
+        self.user = source.user
+        self.password = source.password
+        self.certificate = source.certificate
+        self.lock = threading.Lock()
+        # list of (connection, time of release)
+        self.idle = []
+
+    @classmethod
+    def get_key(cls, source):
+        return (get_uri(source), source.user, source.password,
+            source.certificate)
+
+    def connect(self):
+        conn = ldap.ldapobject.ReconnectLDAPObject(self.uri, retry_max=2,
+            retry_delay=0.5)
+        conn.protocol_version = ldap.VERSION3
+        conn.set_option(ldap.OPT_NETWORK_TIMEOUT, TIMEOUT)
+        conn.set_option(ldap.OPT_TIMEOUT, TIMEOUT)
+        conn.set_option(ldap.OPT_REFERRALS, 0)
+        if self.certificate:
+            conn.set_option(ldap.OPT_X_TLS_CACERTFILE,
+                get_ca_file(self.certificate))
+            conn.set_option(ldap.OPT_X_TLS_REQUIRE_CERT,
+                ldap.OPT_X_TLS_DEMAND)
+            conn.set_option(ldap.OPT_X_TLS_NEWCTX, 0)
+        if self.user and self.password:
+            # ReconnectLDAPObject binds again after a reconnection
+            conn.simple_bind_s(self.user, self.password)
+        logger.debug('connect: new connection to %s' % self.uri)
+        return conn
+
+    def check(self, conn):
+        '''
+            Read the root DSE, reconnecting if the server closed the
+            connection.
+        '''
+        try:
+            conn.search_st('', ldap.SCOPE_BASE, '(objectClass=*)', ['1.1'],
+                timeout=TIMEOUT)
+            return True
+        except ldap.LDAPError, err:
+            logger.warning('check: connection to %s is unusable: %s' \
+                % (self.uri, err))
+            return False
+
+    def acquire(self):
+        now = time.time()
+        while True:
+            self.lock.acquire()
+            try:
+                if not self.idle:
+                    break
+                conn, released = self.idle.pop()
+            finally:
+                self.lock.release()
+            if now - released < CHECK_INTERVAL or self.check(conn):
+                return conn
+            close(conn)
+        return self.connect()
+
+    def release(self, conn):
+        self.lock.acquire()
+        try:
+            if len(self.idle) < POOL_SIZE:
+                self.idle.append((conn, time.time()))
+                return
+        finally:
+            self.lock.release()
+        close(conn)
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            idle, self.idle = self.idle, []
+        finally:
+            self.lock.release()
+        for conn, released in idle:
+            close(conn)
+
+
+def close(conn):
+    try:
+        conn.unbind_s()
+    except ldap.LDAPError:
+        pass
+
+
+def get_pool(source):
+    '''
+        Return the pool of a source, a new one if its configuration
+        changed.
+    '''
+    _lock.acquire()
+    try:
+        pool = _pools.get(source.pk)
+        if pool is not None and pool.key == Pool.get_key(source):
+            return pool
+        old, pool = pool, Pool(source)
+        _pools[source.pk] = pool
+    finally:
+        _lock.release()
+    if old is not None:
+        old.clear()
+    return pool
+
+
+def search_base(source, dn, attrlist=None, timeout=TIMEOUT):
+    '''
+        Return the attributes of the entry with the given dn, or None if
+        it does not exist. Other LDAP errors are raised, ldap.TIMEOUT
+        after timeout seconds.
+    '''
+    if isinstance(dn, unicode):
+        dn = dn.encode('utf-8')
+    pool = get_pool(source)
+    conn = pool.acquire()
+    try:
+        try:
+            result = conn.search_st(dn, ldap.SCOPE_BASE, '(objectClass=*)',
+                attrlist, timeout=timeout)
+        except ldap.NO_SUCH_OBJECT:
+            result = []
+    except ldap.SERVER_DOWN:
+        # the reconnections failed, do not keep the connection
+        close(conn)
+        raise
+    except:
+        pool.release(conn)
+        raise
+    pool.release(conn)
+    # a base search returns at most the entry itself, whose dn may have been
+    # normalized by the server
+    for d, attributes in result:
+        return attributes
+    return None
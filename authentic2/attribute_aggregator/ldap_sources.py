@@ -22,10 +22,19 @@ import logging
 import ldap
 
 from authentic2.attribute_aggregator.core import get_user_alias_in_source
+from authentic2.attribute_aggregator import ldap_pool
+from authentic2.attribute_aggregator import attribute_cache
+from authentic2.executor import Executor, workers_share_database
+from authentic2.attribute_aggregator.executor import run_concurrently, \
+    get_source_timeout, MAX_WORKERS
 
 
 logger = logging.getLogger('attribute_aggregator.ldap_sources')
 
+# LDAP sources are queried from the workers running the receivers of the
+# attribute signals, they use their own pool
+_executor = Executor(MAX_WORKERS)
+
 
 def get_attributes(user, definitions=None, source=None, **kwargs):
     '''
@@ -75,120 +84,113 @@ def get_attributes(user, definitions=None, source=None, **kwargs):
         logger.debug('get_attributes: No LDAP source configured')
         return None
 
+    sources = list(sources)
     attributes = dict()
-
-    for source in sources:
-        logger.debug('get_attributes: The LDAP source is known as %s' \
-            % source.name)
-
-        identifier = None
-        '''
-            Check if the user is authenticated by LDAP.
-            If it is, grab the user dn from the LDAPUser object
-        '''
-        try:
-            from django_auth_ldap.backend import LDAPBackend
-            backend = LDAPBackend()
-            u = backend.get_user(user.id)
-            dn = u.ldap_user.dn
-            if not dn:
-                logger.debug('get_attributes: \
-                    User not logged with LDAP')
-            else:
-                logger.debug('get_attributes: \
-                    User logged with dn %s' % dn)
-                '''is it logged in that source?'''
-                logger.debug('get_attributes: \
-                    Is the user logged with the source %s?' % source.name)
-                try:
-                    l = ldap.open(source.server)
-                    l.protocol_version = ldap.VERSION3
-                    username = source.user
-                    password = source.password
-                    if username and password:
-                        l.simple_bind(username, password)
-                    ldap_result_id = \
-                        l.search(dn, ldap.SCOPE_BASE,
-                            attrlist=['objectClass'])
-                    result_type, result_data = l.result(ldap_result_id, 0)
-                    logger.debug('get_attributes: Yes it is, result %s %s' \
-                        % (result_type, result_data))
-                    identifier = dn
-                except ldap.LDAPError, err:
-                    logger.debug('get_attributes: \
-                        User dn %s unknown in %s or error %s' \
-                            % (dn, source.name, str(err)))
-        except Exception, err:
-            logger.error('get_attributes: \
-                Error working with the LDAP backend %s' %str(err))
-        if not identifier:
-            identifier = get_user_alias_in_source(user, source)
-        if not identifier:
-            logger.error('get_attributes: \
-                No user identifier known into that source')
-        else:
-            logger.debug('get_attributes: \
-                the user is known as %s in source %s' \
-                % (identifier, source.name))
-
-            try:
-                l = ldap.open(source.server)
-                l.protocol_version = ldap.VERSION3
-                username = source.user
-                password = source.password
-                if username and password:
-                    l.simple_bind(username, password)
-            except ldap.LDAPError, err:
-                logger.error('get_attributes: \
-                    an error occured at binding due to %s' % err)
-            else:
-                '''
-                    No seach of user with the scope, only exact dn
-                '''
-#                base_dn = source.base
-#                search_scope = ldap.SCOPE_SUBTREE
-                search_scope = ldap.SCOPE_BASE
-                retrieve_attributes = None
-                if definitions:
-                    #The definition name is the ldap attribute name
-                    logger.debug('get_attributes: attributes requested \
-                        are %s' % definitions)
-                    retrieve_attributes = \
-                        [d.encode('utf-8') for d in definitions]
-#                dn = ldap.dn.explode_dn(identifier,
-#                    flags=ldap.DN_FORMAT_LDAPV3)
-#                search_filter = dn[0]
-#                logger.debug('get_attributes: rdn is %s' % search_filter)
-
-                data = []
-                try:
-#                    ldap_result_id = l.search(base_dn, search_scope,
-#                        search_filter, retrieve_attributes)
-                    ldap_result_id = l.search(identifier, search_scope,
-                        attrlist=retrieve_attributes)
-                    result_type, result_data = l.result(ldap_result_id, 0)
-                    logger.debug('get_attributes: result %s %s' \
-                        % (result_type, result_data))
-                    for d, dic in result_data:
-                        logger.debug('get_attributes: found %s' % d)
-                        if d == identifier:
-                            logger.debug('get_attributes: \
-                                Attributes are %s' % dic)
-                            for key in dic.keys():
-                                attr = {}
-                                attr['definition'] = key
-                                attr['values'] = [\
-                                    a.decode('utf-8') for a in dic[key]]
-                                data.append(attr)
-                except ldap.LDAPError, err:
-                    logger.error('get_attributes: \
-                        an error occured at searching due to %s' % err)
-                else:
-                    if not data:
-                        logger.error('get_attributes: no attribute found')
-                    else:
-                        attributes[source.name] = data
+    if len(sources) == 1 or not workers_share_database():
+        results = [(source.name,
+            get_attributes_from_source(user, definitions, source))
+            for source in sources]
+    else:
+        results = run_concurrently([(source.name,
+            get_attributes_from_source, (user, definitions, source), {},
+            get_source_timeout(source)) for source in sources],
+            executor=_executor)
+    for source_name, data in results:
+        if data:
+            attributes[source_name] = data
 
     logger.debug('get_attributes: the attributes returned are %s' \
         % attributes)
     return attributes
+
+
+def get_attributes_from_source(user, definitions, source):
+    '''
+        Return the list of attributes of the user in a LDAP source, or
+        None.
+
+        The user is looked up by the dn it used to authenticate, if it
+        authenticated with LDAP, else by its alias in the source. A single
+        search is done when the dn exists in the source.
+    '''
+    logger.debug('get_attributes_from_source: The LDAP source is known \
+        as %s' % source.name)
+
+    requested = definitions
+    cached, definitions = \
+        attribute_cache.get_attributes(user, source, definitions)
+    if requested and not definitions:
+        return cached or None
+
+    retrieve_attributes = None
+    if definitions:
+        #The definition name is the ldap attribute name
+        logger.debug('get_attributes_from_source: attributes requested \
+            are %s' % definitions)
+        retrieve_attributes = [d.encode('utf-8') for d in definitions]
+
+    dn = None
+    '''
+        Check if the user is authenticated by LDAP.
+        If it is, grab the user dn from the LDAPUser object
+    '''
+    try:
+        from django_auth_ldap.backend import LDAPBackend
+        backend = LDAPBackend()
+        u = backend.get_user(user.id)
+        dn = u.ldap_user.dn
+        if not dn:
+            logger.debug('get_attributes_from_source: \
+                User not logged with LDAP')
+        else:
+            logger.debug('get_attributes_from_source: \
+                User logged with dn %s' % dn)
+    except Exception, err:
+        logger.error('get_attributes_from_source: \
+            Error working with the LDAP backend %s' %str(err))
+
+    entry = None
+    if dn:
+        entry = search_user(source, dn, retrieve_attributes)
+    if entry is None:
+        alias = get_user_alias_in_source(user, source)
+        if alias:
+            entry = search_user(source, alias, retrieve_attributes)
+    if entry is None:
+        logger.error('get_attributes_from_source: \
+            No user identifier known into that source')
+        return cached or None
+
+    logger.debug('get_attributes_from_source: Attributes are %s' % entry)
+    data = []
+    for key in entry.keys():
+        attr = {}
+        attr['definition'] = key
+        attr['values'] = [a.decode('utf-8') for a in entry[key]]
+        data.append(attr)
+    attribute_cache.set_attributes(user, source, definitions, data)
+    data = cached + data
+    if not data:
+        logger.error('get_attributes_from_source: no attribute found')
+        return None
+    return data
+
+
+def search_user(source, identifier, attributes):
+    '''
+        No seach of user with the scope, only exact dn
+    '''
+    try:
+        entry = ldap_pool.search_base(source, identifier, attributes,
+            timeout=get_source_timeout(source))
+    except ldap.LDAPError, err:
+        logger.error('search_user: an error occured at searching %s in %s \
+            due to %s' % (identifier, source.name, err))
+        return None
+    if entry is None:
+        logger.debug('search_user: User dn %s unknown in %s' \
+            % (identifier, source.name))
+    else:
+        logger.debug('search_user: the user is known as %s in source %s' \
+            % (identifier, source.name))
+    return entry
@@ -0,0 +1,44 @@
+'''
+    VERIDIC Project - Towards a centralized access control system
+
+    Copyright (C) 2011  Mikael Ates
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as
+    published by the Free Software Foundation, either version 3 of the
+    License, or (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentic2.attribute_aggregator.core import check_mapping
+
+
+class Command(BaseCommand):
+    '''
+        Report the oids, aliases, profile field names and namespace names
+        shared by several definitions of ATTRIBUTE_MAPPING
+    '''
+
+    can_import_django_settings = True
+    requires_model_validation = False
+    args = None
+    help = \
+        'Check the consistency of the attribute mapping.'
+
+    def handle(self, *args, **options):
+        errors = check_mapping()
+        for error in errors:
+            print error
+        if errors:
+            raise CommandError('%d inconsistencies found' % len(errors))
+        print 'The attribute mapping is consistent.'
@@ -0,0 +1,124 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+    
+    def forwards(self, orm):
+        
+        # Adding model 'UserAttributeValue'
+        db.create_table('attribute_aggregator_userattributevalue', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('profile', self.gf('django.db.models.fields.related.ForeignKey')(related_name='attribute_values', to=orm['attribute_aggregator.UserAttributeProfile'])),
+            ('group', self.gf('django.db.models.fields.PositiveIntegerField')()),
+            ('position', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('definition', self.gf('django.db.models.fields.CharField')(max_length=200)),
+            ('source', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['attribute_aggregator.AttributeSource'], null=True, blank=True)),
+            ('value', self.gf('django.db.models.fields.TextField')(null=True, blank=True)),
+            ('expiration', self.gf('django.db.models.fields.DateTimeField')(db_index=True, null=True, blank=True)),
+        ))
+        db.send_create_signal('attribute_aggregator', ['UserAttributeValue'])
+
+        # Adding index on 'UserAttributeValue', fields ['profile', 'definition']
+        db.create_index('attribute_aggregator_userattributevalue', ['profile_id', 'definition'])
+
+        # Adding unique constraint on 'UserAttributeValue', fields ['profile', 'group', 'position']
+        db.create_unique('attribute_aggregator_userattributevalue', ['profile_id', 'group', 'position'])
+    
+    
+    def backwards(self, orm):
+        
+        # Removing unique constraint on 'UserAttributeValue', fields ['profile', 'group', 'position']
+        db.delete_unique('attribute_aggregator_userattributevalue', ['profile_id', 'group', 'position'])
+
+        # Removing index on 'UserAttributeValue', fields ['profile', 'definition']
+        db.delete_index('attribute_aggregator_userattributevalue', ['profile_id', 'definition'])
+
+        # Deleting model 'UserAttributeValue'
+        db.delete_table('attribute_aggregator_userattributevalue')
+    
+    
+    models = {
+        'attribute_aggregator.attributesource': {
+            'Meta': {'object_name': 'AttributeSource'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '200'}),
+            'namespace': ('django.db.models.fields.CharField', [], {'default': "('Default', 'Default')", 'max_length': '100'})
+        },
+        'attribute_aggregator.ldapsource': {
+            'Meta': {'object_name': 'LdapSource', '_ormbases': ['attribute_aggregator.AttributeSource']},
+            'attributesource_ptr': ('django.db.models.fields.related.OneToOneField', [], {'to': "orm['attribute_aggregator.AttributeSource']", 'unique': 'True', 'primary_key': 'True'}),
+            'base': ('django.db.models.fields.CharField', [], {'max_length': '200'}),
+            'certificate': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'is_auth_backend': ('django.db.models.fields.BooleanField', [], {'default': 'False', 'blank': 'True'}),
+            'ldaps': ('django.db.models.fields.BooleanField', [], {'default': 'False', 'blank': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '200', 'null': 'True', 'blank': 'True'}),
+            'port': ('django.db.models.fields.IntegerField', [], {'default': '389'}),
+            'server': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '200'}),
+            'user': ('django.db.models.fields.CharField', [], {'max_length': '200', 'null': 'True', 'blank': 'True'})
+        },
+        'attribute_aggregator.useraliasinsource': {
+            'Meta': {'unique_together': "(('name', 'source'),)", 'object_name': 'UserAliasInSource'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '200'}),
+            'source': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['attribute_aggregator.AttributeSource']"}),
+            'user': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'user_alias_in_source'", 'to': "orm['auth.User']"})
+        },
+        'attribute_aggregator.userattributeprofile': {
+            'Meta': {'object_name': 'UserAttributeProfile'},
+            'data': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'user': ('django.db.models.fields.related.OneToOneField', [], {'blank': 'True', 'related_name': "'user_attribute_profile'", 'unique': 'True', 'null': 'True', 'to': "orm['auth.User']"})
+        },
+        'attribute_aggregator.userattributevalue': {
+            'Meta': {'unique_together': "(('profile', 'group', 'position'),)", 'object_name': 'UserAttributeValue'},
+            'definition': ('django.db.models.fields.CharField', [], {'max_length': '200'}),
+            'expiration': ('django.db.models.fields.DateTimeField', [], {'db_index': 'True', 'null': 'True', 'blank': 'True'}),
+            'group': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'position': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'profile': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'attribute_values'", 'to': "orm['attribute_aggregator.UserAttributeProfile']"}),
+            'source': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['attribute_aggregator.AttributeSource']", 'null': 'True', 'blank': 'True'}),
+            'value': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'})
+        },
+        'auth.group': {
+            'Meta': {'object_name': 'Group'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '80'}),
+            'permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'})
+        },
+        'auth.permission': {
+            'Meta': {'unique_together': "(('content_type', 'codename'),)", 'object_name': 'Permission'},
+            'codename': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'})
+        },
+        'auth.user': {
+            'Meta': {'object_name': 'User'},
+            'date_joined': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '75', 'blank': 'True'}),
+            'first_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'groups': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['auth.Group']", 'symmetrical': 'False', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True', 'blank': 'True'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False', 'blank': 'True'}),
+            'is_superuser': ('django.db.models.fields.BooleanField', [], {'default': 'False', 'blank': 'True'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'last_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'user_permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'}),
+            'username': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '30'})
+        },
+        'contenttypes.contenttype': {
+            'Meta': {'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        }
+    }
+    
+    complete_apps = ['attribute_aggregator']
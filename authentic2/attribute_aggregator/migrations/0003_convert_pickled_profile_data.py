@@ -0,0 +1,188 @@
+# encoding: utf-8
+import datetime
+import re
+import time
+import pickle
+import cPickle
+from cStringIO import StringIO
+from south.db import db
+from south.v2 import DataMigration
+from django.db import models
+
+# The profiles stored pickled instances of this old-style class, the
+# migration must not depend on its current code
+ATTRIBUTE_DATA_MODULE = 'authentic2.attribute_aggregator.models'
+ATTRIBUTE_DATA_NAME = 'AttributeData'
+
+ISO8601_RE = re.compile(r'(\d+-\d+-\d+T\d+:\d+:\d+)(?:\.\d+)?Z?$')
+
+
+class AttributeData:
+    '''Frozen AttributeData, pickled with the original class path'''
+    __module__ = ATTRIBUTE_DATA_MODULE
+
+
+def find_global(module, name):
+    if (module, name) == (ATTRIBUTE_DATA_MODULE, ATTRIBUTE_DATA_NAME):
+        return AttributeData
+    raise cPickle.UnpicklingError('unexpected class %s.%s' % (module, name))
+
+
+def loads(data):
+    unpickler = cPickle.Unpickler(StringIO(data))
+    unpickler.find_global = find_global
+    return unpickler.load()
+
+
+def dumps(l):
+    # pickle and not cPickle, only the former writes the class path of old
+    # style instances without importing it again
+    return pickle.dumps(l, 0)
+
+
+def iso8601_to_datetime(date_string):
+    m = ISO8601_RE.match(date_string)
+    if not m:
+        raise ValueError('invalid ISO8601 date %r' % date_string)
+    tm = time.strptime(m.group(1), '%Y-%m-%dT%H:%M:%S')
+    return datetime.datetime.fromtimestamp(time.mktime(tm))
+
+
+class Migration(DataMigration):
+    '''Convert the pickled list of AttributeData of each profile into
+       UserAttributeValue rows'''
+
+    def forwards(self, orm):
+        sources = set(orm.AttributeSource.objects \
+            .values_list('id', flat=True))
+        for profile in orm.UserAttributeProfile.objects.exclude(data=None) \
+                .exclude(data=''):
+            try:
+                l = loads(str(profile.data))
+            except:
+                continue
+            rows = []
+            for group, data in enumerate(l):
+                source_id = getattr(data, 'source_id', None)
+                if source_id not in sources:
+                    source_id = None
+                expiration = None
+                if getattr(data, 'expiration_date', None):
+                    try:
+                        expiration = iso8601_to_datetime(data.expiration_date)
+                    except ValueError:
+                        pass
+                values = [v.decode('utf-8') for v in
+                        getattr(data, 'values', None) or []] or [None]
+                for position, value in enumerate(values):
+                    rows.append(orm.UserAttributeValue(profile=profile,
+                        group=group, position=position,
+                        definition=data.definition, source_id=source_id,
+                        value=value, expiration=expiration))
+            orm.UserAttributeValue.objects.bulk_create(rows)
+    
+    def backwards(self, orm):
+        for profile in orm.UserAttributeProfile.objects.all():
+            l = []
+            current = None
+            for value in orm.UserAttributeValue.objects \
+                    .filter(profile=profile).order_by('group', 'position'):
+                if current is None or current[0] != value.group:
+                    data = AttributeData()
+                    data.definition = value.definition
+                    data.values = []
+                    data.source_id = value.source_id or -1
+                    data.expiration_date = None
+                    if value.expiration:
+                        data.expiration_date = value.expiration.isoformat()
+                    current = (value.group, data)
+                    l.append(data)
+                if value.value is not None:
+                    current[1].values.append(value.value.encode('utf-8'))
+            profile.data = dumps(l)
+            profile.save()
+        orm.UserAttributeValue.objects.all().delete()
+    
+    
+    models = {
+        'attribute_aggregator.attributesource': {
+            'Meta': {'object_name': 'AttributeSource'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '200'}),
+            'namespace': ('django.db.models.fields.CharField', [], {'default': "('Default', 'Default')", 'max_length': '100'})
+        },
+        'attribute_aggregator.ldapsource': {
+            'Meta': {'object_name': 'LdapSource', '_ormbases': ['attribute_aggregator.AttributeSource']},
+            'attributesource_ptr': ('django.db.models.fields.related.OneToOneField', [], {'to': "orm['attribute_aggregator.AttributeSource']", 'unique': 'True', 'primary_key': 'True'}),
+            'base': ('django.db.models.fields.CharField', [], {'max_length': '200'}),
+            'certificate': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'is_auth_backend': ('django.db.models.fields.BooleanField', [], {'default': 'False', 'blank': 'True'}),
+            'ldaps': ('django.db.models.fields.BooleanField', [], {'default': 'False', 'blank': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '200', 'null': 'True', 'blank': 'True'}),
+            'port': ('django.db.models.fields.IntegerField', [], {'default': '389'}),
+            'server': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '200'}),
+            'user': ('django.db.models.fields.CharField', [], {'max_length': '200', 'null': 'True', 'blank': 'True'})
+        },
+        'attribute_aggregator.useraliasinsource': {
+            'Meta': {'unique_together': "(('name', 'source'),)", 'object_name': 'UserAliasInSource'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '200'}),
+            'source': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['attribute_aggregator.AttributeSource']"}),
+            'user': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'user_alias_in_source'", 'to': "orm['auth.User']"})
+        },
+        'attribute_aggregator.userattributeprofile': {
+            'Meta': {'object_name': 'UserAttributeProfile'},
+            'data': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'user': ('django.db.models.fields.related.OneToOneField', [], {'blank': 'True', 'related_name': "'user_attribute_profile'", 'unique': 'True', 'null': 'True', 'to': "orm['auth.User']"})
+        },
+        'attribute_aggregator.userattributevalue': {
+            'Meta': {'unique_together': "(('profile', 'group', 'position'),)", 'object_name': 'UserAttributeValue'},
+            'definition': ('django.db.models.fields.CharField', [], {'max_length': '200'}),
+            'expiration': ('django.db.models.fields.DateTimeField', [], {'db_index': 'True', 'null': 'True', 'blank': 'True'}),
+            'group': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'position': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'profile': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'attribute_values'", 'to': "orm['attribute_aggregator.UserAttributeProfile']"}),
+            'source': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['attribute_aggregator.AttributeSource']", 'null': 'True', 'blank': 'True'}),
+            'value': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'})
+        },
+        'auth.group': {
+            'Meta': {'object_name': 'Group'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '80'}),
+            'permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'})
+        },
+        'auth.permission': {
+            'Meta': {'unique_together': "(('content_type', 'codename'),)", 'object_name': 'Permission'},
+            'codename': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'})
+        },
+        'auth.user': {
+            'Meta': {'object_name': 'User'},
+            'date_joined': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '75', 'blank': 'True'}),
+            'first_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'groups': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['auth.Group']", 'symmetrical': 'False', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True', 'blank': 'True'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False', 'blank': 'True'}),
+            'is_superuser': ('django.db.models.fields.BooleanField', [], {'default': 'False', 'blank': 'True'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'last_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'user_permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'}),
+            'username': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '30'})
+        },
+        'contenttypes.contenttype': {
+            'Meta': {'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        }
+    }
+    
+    complete_apps = ['attribute_aggregator']
@@ -21,10 +21,8 @@
 import datetime
 import logging
 
-from cPickle import loads, dumps
-
 from django.utils.translation import ugettext as _
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth.models import User
 try:
     import ldap
@@ -33,16 +31,21 @@ except ImportError:
 
 from authentic2.attribute_aggregator.signals import any_attributes_call, \
     listed_attributes_call, listed_attributes_with_source_call
+from authentic2.attribute_aggregator.executor import send_concurrently
 from authentic2.attribute_aggregator.mapping import ATTRIBUTE_MAPPING, \
     ATTRIBUTE_NAMESPACES
 from authentic2.attribute_aggregator.core import convert_from_string, \
     get_def_name_from_name_and_ns_of_attribute, iso8601_to_datetime, \
     get_def_name_from_oid, get_def_name_from_alias, \
-    is_alias_of_definition, is_oid_of_definition
+    is_alias_of_definition, is_oid_of_definition, get_def_names_matching
 
 
 logger = logging.getLogger('attribute_aggregator')
 
+# Number of times store_data() allocates new group numbers when they are
+# taken by a concurrent call
+STORE_DATA_ATTEMPTS = 5
+
 
 ATTRIBUTES_NS = [('Default', 'Default')] \
     + [(ns, ns) for ns in ATTRIBUTE_NAMESPACES]
@@ -254,57 +257,133 @@ class AttributeData:
         return s
 
 
+def build_attribute_data(definition, values, source_id, expiration):
+    '''
+        Build an AttributeData from stored values, without checking them
+        again.
+    '''
+    data = AttributeData(definition)
+    data.values = [value.encode('utf-8') for value in values]
+    data.source_id = source_id
+    if expiration:
+        data.expiration_date = expiration.isoformat()
+    return data
+
+
 class UserAttributeProfile(models.Model):
     user = models.OneToOneField(User, null=True, blank=True,
         related_name='user_attribute_profile')
-    data = models.TextField(null=True, blank=True)
+
+    def store_data(self, datas):
+        '''
+            Store a list of AttributeData, one row per value, using a single
+            insert.
+
+            The next group numbers are read then inserted, a concurrent
+            store_data() allocating the same groups makes the insert violate
+            the unique (profile, group, position) constraint and it is
+            retried with new group numbers.
+        '''
+        if not self.pk:
+            self.save()
+        for attempt in range(STORE_DATA_ATTEMPTS):
+            group = self.attribute_values.aggregate(
+                models.Max('group'))['group__max']
+            if group is None:
+                group = -1
+            rows = []
+            for data in datas:
+                group += 1
+                source_id = data.get_source_id()
+                if source_id == -1:
+                    source_id = None
+                expiration = None
+                if data.expiration_date:
+                    expiration = data.get_exptime_in_datetime()
+                values = data.get_values() or [None]
+                for position, value in enumerate(values):
+                    rows.append(UserAttributeValue(profile=self, group=group,
+                        position=position, definition=data.get_definition(),
+                        source_id=source_id, value=value,
+                        expiration=expiration))
+            sid = transaction.savepoint()
+            try:
+                UserAttributeValue.objects.bulk_create(rows)
+            except IntegrityError:
+                transaction.savepoint_rollback(sid)
+                logger.debug('store_data: groups of profile %s allocated '
+                    'concurrently, retrying' % self.pk)
+            else:
+                transaction.savepoint_commit(sid)
+                return
+        raise IntegrityError('unable to allocate the groups of profile %s' \
+            % self.pk)
 
     def add_data(self, data):
         if not isinstance(data, AttributeData):
             return -1
         try:
-            l = None
-            if not self.data:
-                l = list()
-            else:
-                l = loads(str(self.data))
-            l.append(data)
-            self.data = dumps(l)
+            self.store_data([data])
         except:
+            logger.exception('add_data: unable to store %s' % data)
             return -1
-        self.save()
         return 0
 
     def remove_data(self, position):
         try:
-            l = loads(str(self.data))
-            res = l.pop(position)
-            self.data = dumps(l)
-            return res
+            groups = list(self.attribute_values.order_by('group') \
+                .values_list('group', flat=True).distinct())
+            group = groups[position]
+            res = self.load_data(self.attribute_values.filter(group=group))
+            self.attribute_values.filter(group=group).delete()
+            return res[0]
         except:
             return None
 
+    def load_data(self, queryset):
+        '''
+            Build the AttributeData stored in the rows of a queryset.
+        '''
+        l = []
+        current = None
+        for group, definition, source_id, value, expiration in \
+                queryset.order_by('group', 'id').values_list('group',
+                    'definition', 'source', 'value', 'expiration'):
+            if current is None or current[0] != group:
+                if current is not None:
+                    l.append(current[1])
+                try:
+                    data = build_attribute_data(definition, [],
+                        source_id or -1, expiration)
+                except:
+                    logger.warn('load_data: unknown definition %s' \
+                        % definition)
+                    current = None
+                    continue
+                current = (group, data)
+            if value is not None:
+                current[1].values.append(value.encode('utf-8'))
+        if current is not None:
+            l.append(current[1])
+        return l
+
     def get_all_data(self):
-        try:
-            l = loads(str(self.data))
-            return l
-        except:
+        if not self.pk:
             return []
+        return self.load_data(self.attribute_values.all())
 
     def get_data_of_definition(self, definition, in_list=None):
         '''
             definition can be given by its name, an alias or an oid
         '''
-        l = None
         if in_list:
-            l = in_list
-        else:
-            l = self.get_all_data()
-        if not l:
+            return [d for d in in_list if d.get_definition() == definition \
+                or is_alias_of_definition(d.get_definition(), definition) \
+                or is_oid_of_definition(d.get_definition(), definition)]
+        if not self.pk:
             return []
-        return [d for d in l if d.get_definition() == definition \
-            or is_alias_of_definition(d.get_definition(), definition) \
-            or is_oid_of_definition(d.get_definition(), definition)]
+        return self.load_data(self.attribute_values.filter(
+            definition__in=get_def_names_matching(definition)))
 
     def get_freshest_data_of_definition(self, definition):
         l = self.get_data_of_definition(definition)
@@ -314,35 +393,32 @@ class UserAttributeProfile(models.Model):
         return l[0]
 
     def get_data_of_source(self, source, in_list=None):
-        l = []
+        if not isinstance(source, AttributeSource):
+            return []
         if in_list:
-            l = in_list
-        else:
-            l = self.get_all_data()
-        if not l or not isinstance(source, AttributeSource):
+            return [d for d in in_list if d.get_source_id() == source.id]
+        if not self.pk:
             return []
-        return [d for d in l if d.get_source_id() == source.id]
+        return self.load_data(self.attribute_values.filter(source=source))
 
     def get_data_of_source_by_name(self, source):
-        l = self.get_all_data()
-        if not l:
-            return []
-        s = []
-        try:
-            s = AttributeSource.objects.get(name=source)
-        except:
+        if not self.pk:
             return []
-        return [d for d in l if d.get_source_id() == s.id]
+        return self.load_data(self.attribute_values.filter(
+            source__name=source))
 
     def get_data_of_definition_and_source(self, definition, source):
-        in_list = self.get_data_of_source(source)
-        if not in_list:
+        if not self.pk or not isinstance(source, AttributeSource):
             return []
-        return self.get_data_of_definition(definition, in_list=in_list)
+        return self.load_data(self.attribute_values.filter(source=source,
+            definition__in=get_def_names_matching(definition)))
 
     def get_data_of_definition_and_source_by_name(self, definition, source):
-        return self.get_data_of_definition(definition,
-            in_list=self.get_data_of_source_by_name(source))
+        if not self.pk:
+            return []
+        return self.load_data(self.attribute_values.filter(
+            source__name=source,
+            definition__in=get_def_names_matching(definition)))
 
     def load_by_dic(self, dictionnary):
         '''
@@ -371,6 +447,7 @@ class UserAttributeProfile(models.Model):
             logger.error('load_by_dic: \
                 Missing profile or dictionnary')
             return -1
+        datas = []
         for source_name in dictionnary:
             logger.debug('load_by_dic: loading from source with name: %s' \
                 % source_name)
@@ -431,14 +508,13 @@ class UserAttributeProfile(models.Model):
                             values = [value for value in attribute['values'] \
                                 if convert_from_string(definition, value)]
 
-                            if self.add_data(AttributeData(\
+                            try:
+                                datas.append(AttributeData(\
                                     definition,
                                     values=values,
                                     source=source,
-                                    expiration_date=expiration_date)) == 0:
-                                logger.debug('load_by_dic: \
-                                    attribute successfully added')
-                            else:
+                                    expiration_date=expiration_date))
+                            except:
                                 logger.warn('load_by_dic: \
                                     error addind attribute')
             else:
@@ -446,12 +522,20 @@ class UserAttributeProfile(models.Model):
                     The source with name %s providing attributes %s \
                     is unknown of the system' \
                         % (str(source_name), str(dictionnary[source_name])))
+        if datas:
+            try:
+                self.store_data(datas)
+                logger.debug('load_by_dic: %d attributes successfully added' \
+                    % len(datas))
+            except:
+                logger.exception('load_by_dic: error adding attributes')
+                return -1
         return 0
 
     def load_greedy(self):
         if self.user:
-            attributes_provided = any_attributes_call.send(sender=None,
-                    user=self.user)
+            attributes_provided = send_concurrently(any_attributes_call,
+                    sender=None, user=self.user)
             for attrs in attributes_provided:
                 logger.info('load_greedy: \
                     attributes_call connected to function %s' % \
@@ -480,8 +564,8 @@ class UserAttributeProfile(models.Model):
             if defs:
                 logger.info('load_listed_attributes: \
                     attributes required are %s' % defs)
-                attributes_provided = listed_attributes_call.send(sender=None,
-                        user=self.user, definitions=defs)
+                attributes_provided = send_concurrently(listed_attributes_call,
+                        sender=None, user=self.user, definitions=defs)
                 for attrs in attributes_provided:
                     logger.info('load_listed_attributes: \
                         attributes_call connected to function %s' % \
@@ -513,8 +597,9 @@ class UserAttributeProfile(models.Model):
                 logger.info('load_listed_attributes: \
                     attributes required are %s from %s' % (defs, source))
                 attributes_provided = \
-                    listed_attributes_with_source_call.send(sender=None,
-                        user=self.user, definitions=defs, source=source)
+                    send_concurrently(listed_attributes_with_source_call,
+                        sender=None, user=self.user, definitions=defs,
+                        source=source)
                 for attrs in attributes_provided:
                     logger.info('load_listed_attributes: \
                         attributes_call connected to function %s' % \
@@ -527,13 +612,14 @@ class UserAttributeProfile(models.Model):
                     of attributes to load with %s' % str(definitions))
 
     def cleanup(self):
-        l = self.get_all_data()
-        if not l:
+        '''
+            Remove the data without expiration date or expired.
+        '''
+        if not self.pk:
             return 0
         now = datetime.datetime.now()
-        self.data = dumps([d for d in l if d.expiration_date \
-            and d.get_exptime_in_datetime() > now])
-        self.save()
+        self.attribute_values.filter(models.Q(expiration__isnull=True) \
+            | models.Q(expiration__lte=now)).delete()
 
     def __unicode__(self):
         s = None
@@ -548,3 +634,32 @@ class UserAttributeProfile(models.Model):
         for d in self.get_all_data():
             s = s + "\n\t" + d.__unicode__()
         return s
+
+
+class UserAttributeValue(models.Model):
+    '''
+        One value of an AttributeData stored in a profile, the values of an
+        AttributeData share the same group number. An AttributeData without
+        values is stored as one row with a null value.
+
+        The migration adds an index on (profile, definition).
+    '''
+    profile = models.ForeignKey(UserAttributeProfile,
+        related_name='attribute_values')
+    group = models.PositiveIntegerField()
+    # rank of the value in its group
+    position = models.PositiveIntegerField(default=0)
+    definition = models.CharField(max_length=200)
+    source = models.ForeignKey(AttributeSource, null=True, blank=True)
+    value = models.TextField(null=True, blank=True)
+    expiration = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        unique_together = (('profile', 'group', 'position'),)
+
+    def __unicode__(self):
+        return "%s: %s" % (self.definition, self.value)
+
+
+from authentic2.attribute_aggregator import attribute_cache
+attribute_cache.connect_signals()
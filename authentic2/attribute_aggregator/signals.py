@@ -18,6 +18,8 @@
 '''
 
 
+import threading
+
 try:
     import ldap_sources
 except ImportError:
@@ -27,9 +29,64 @@ import user_profile
 from django.dispatch import Signal
 
 
-any_attributes_call = Signal(providing_args = ["user"])
-listed_attributes_call = Signal(providing_args = ["user", "definitions"])
-listed_attributes_with_source_call = Signal(providing_args = \
+class ConcurrentSignal(Signal):
+    '''
+        Signal whose receivers are also registered explicitly, so that
+        executor.send_concurrently() can run them on the thread pool.
+        Receivers are kept alive by this registration.
+    '''
+
+    def __init__(self, providing_args=None):
+        super(ConcurrentSignal, self).__init__(providing_args=providing_args)
+        self.registration_lock = threading.Lock()
+        # list of (key, sender, receiver)
+        self.registered = []
+
+    def get_key(self, receiver, sender, dispatch_uid):
+        if dispatch_uid:
+            return (dispatch_uid, id(sender))
+        return (id(receiver), id(sender))
+
+    def connect(self, receiver, sender=None, weak=True, dispatch_uid=None):
+        super(ConcurrentSignal, self).connect(receiver, sender=sender,
+            weak=weak, dispatch_uid=dispatch_uid)
+        key = self.get_key(receiver, sender, dispatch_uid)
+        self.registration_lock.acquire()
+        try:
+            if key not in [k for k, s, r in self.registered]:
+                self.registered.append((key, sender, receiver))
+        finally:
+            self.registration_lock.release()
+
+    def disconnect(self, receiver=None, sender=None, weak=True,
+            dispatch_uid=None):
+        super(ConcurrentSignal, self).disconnect(receiver=receiver,
+            sender=sender, weak=weak, dispatch_uid=dispatch_uid)
+        key = self.get_key(receiver, sender, dispatch_uid)
+        self.registration_lock.acquire()
+        try:
+            self.registered = [(k, s, r) for k, s, r in self.registered
+                if k != key]
+        finally:
+            self.registration_lock.release()
+
+    def get_receivers(self, sender):
+        '''
+            Return the receivers connected for sender or for any sender, in
+            their order of connection.
+        '''
+        self.registration_lock.acquire()
+        try:
+            return [r for k, s, r in self.registered
+                if s is None or s is sender]
+        finally:
+            self.registration_lock.release()
+
+
+any_attributes_call = ConcurrentSignal(providing_args = ["user"])
+listed_attributes_call = ConcurrentSignal(providing_args = \
+    ["user", "definitions"])
+listed_attributes_with_source_call = ConcurrentSignal(providing_args = \
     ["user", "definitions", "source"])
 
 if ldap_sources:
@@ -5,7 +5,25 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
+import os
+import shutil
+import tempfile
+import threading
+import time
+
 from django.test import TestCase
+from django.utils import unittest
+
+from authentic2.attribute_aggregator import core, executor
+from authentic2.attribute_aggregator.models import AttributeData, \
+    UserAttributeProfile
+from authentic2.attribute_aggregator.signals import ConcurrentSignal
+
+try:
+    import ldap
+    from authentic2.attribute_aggregator import ldap_pool
+except ImportError:
+    ldap_pool = None
 
 
 class SimpleTest(TestCase):
@@ -14,3 +32,239 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class UserAttributeProfileTest(TestCase):
+    def test_store_data(self):
+        profile = UserAttributeProfile.objects.create()
+        profile.store_data([AttributeData('gn', values=[u'a', u'b']),
+            AttributeData('sn')])
+        profile.add_data(AttributeData('gn', values=[u'c']))
+        self.assertEqual(list(profile.attribute_values \
+                .order_by('group', 'position') \
+                .values_list('group', 'position', 'value')),
+            [(0, 0, u'a'), (0, 1, u'b'), (1, 0, None), (2, 0, u'c')])
+        self.assertEqual([(d.get_definition(), d.get_values())
+                for d in profile.get_all_data()],
+            [('gn', [u'a', u'b']), ('sn', []), ('gn', [u'c'])])
+        self.assertEqual(profile.remove_data(1).get_definition(), 'sn')
+        profile.add_data(AttributeData('sn', values=[u'd']))
+        self.assertEqual(profile.attribute_values.filter(definition='sn') \
+                .get().group, 3)
+
+
+class FakeLdapSource(object):
+    pk = 1
+    server = 'ldap.example.com'
+    port = 389
+    ldaps = False
+    user = 'cn=admin,dc=example,dc=com'
+    password = 'password'
+    certificate = ''
+
+
+class FakeLdapConnection(object):
+    '''Stand-in for a bound ReconnectLDAPObject, search_st() answers with
+       the result given or raises the exception given'''
+
+    def __init__(self):
+        self.result = []
+        self.unbound = False
+
+    def search_st(self, base, scope, filterstr, attrlist=None, timeout=-1):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+    def unbind_s(self):
+        self.unbound = True
+
+
+@unittest.skipIf(ldap_pool is None, 'python-ldap is not installed')
+class LdapPoolTest(TestCase):
+    def setUp(self):
+        self.connections = []
+        self.connect = ldap_pool.Pool.connect
+        def connect(pool):
+            conn = FakeLdapConnection()
+            self.connections.append(conn)
+            return conn
+        ldap_pool.Pool.connect = connect
+        ldap_pool._pools.clear()
+        self.source = FakeLdapSource()
+
+    def tearDown(self):
+        ldap_pool.Pool.connect = self.connect
+        ldap_pool._pools.clear()
+
+    def test_checkout_return(self):
+        pool = ldap_pool.get_pool(self.source)
+        conn = pool.acquire()
+        pool.release(conn)
+        self.assertTrue(pool.acquire() is conn)
+        self.assertEqual(len(self.connections), 1)
+        self.assertTrue(ldap_pool.get_pool(self.source) is pool)
+
+    def test_search_base(self):
+        pool = ldap_pool.get_pool(self.source)
+        conn = pool.acquire()
+        conn.result = [('uid=john,dc=example,dc=com', {'uid': ['john']})]
+        pool.release(conn)
+        self.assertEqual(ldap_pool.search_base(self.source,
+            u'uid=john,dc=example,dc=com'), {'uid': ['john']})
+        conn.result = ldap.NO_SUCH_OBJECT()
+        self.assertEqual(ldap_pool.search_base(self.source,
+            u'uid=jane,dc=example,dc=com'), None)
+        self.assertEqual([c for c, released in pool.idle], [conn])
+
+    def test_reconnect_after_server_down(self):
+        pool = ldap_pool.get_pool(self.source)
+        conn = pool.acquire()
+        conn.result = ldap.SERVER_DOWN()
+        pool.release(conn)
+        self.assertRaises(ldap.SERVER_DOWN, ldap_pool.search_base,
+            self.source, 'uid=john,dc=example,dc=com')
+        self.assertTrue(conn.unbound)
+        self.assertEqual(pool.idle, [])
+        self.assertEqual(ldap_pool.search_base(self.source,
+            'uid=john,dc=example,dc=com'), None)
+        self.assertEqual(len(self.connections), 2)
+        self.assertEqual([c for c, released in pool.idle],
+            [self.connections[1]])
+
+    def test_stale_connection_checked(self):
+        pool = ldap_pool.get_pool(self.source)
+        conn = pool.acquire()
+        conn.result = ldap.SERVER_DOWN()
+        pool.idle.append((conn, 0))
+        new = pool.acquire()
+        self.assertFalse(new is conn)
+        self.assertTrue(conn.unbound)
+
+    def test_exhaustion(self):
+        pool = ldap_pool.get_pool(self.source)
+        conns = [pool.acquire() for i in range(ldap_pool.POOL_SIZE + 2)]
+        self.assertEqual(len(set(map(id, conns))), ldap_pool.POOL_SIZE + 2)
+        for conn in conns:
+            pool.release(conn)
+        self.assertEqual(len(pool.idle), ldap_pool.POOL_SIZE)
+        self.assertEqual([conn.unbound for conn in conns],
+            [False] * ldap_pool.POOL_SIZE + [True, True])
+
+    def test_configuration_change(self):
+        pool = ldap_pool.get_pool(self.source)
+        conn = pool.acquire()
+        pool.release(conn)
+        self.source.password = 'changed'
+        new_pool = ldap_pool.get_pool(self.source)
+        self.assertFalse(new_pool is pool)
+        self.assertTrue(conn.unbound)
+        self.assertEqual(pool.idle, [])
+
+
+CERTIFICATE = u'''-----BEGIN CERTIFICATE-----
+MIIBszCCAV2gAwIBAgIJAK
+-----END CERTIFICATE-----
+'''
+
+
+@unittest.skipIf(ldap_pool is None, 'python-ldap is not installed')
+class LdapCaFileTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.saved = ldap_pool.CA_DIR, ldap_pool._ca_dir
+        ldap_pool.CA_DIR = os.path.join(self.directory, 'ca')
+        ldap_pool._ca_dir = None
+
+    def tearDown(self):
+        ldap_pool.CA_DIR, ldap_pool._ca_dir = self.saved
+        shutil.rmtree(self.directory)
+
+    def read(self, path):
+        f = open(path)
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def test_private_directory(self):
+        path = ldap_pool.get_ca_file(CERTIFICATE)
+        self.assertEqual(os.path.dirname(path), ldap_pool.CA_DIR)
+        self.assertEqual(os.stat(ldap_pool.CA_DIR).st_mode & 077, 0)
+        self.assertEqual(self.read(path), CERTIFICATE)
+        self.assertEqual(ldap_pool.get_ca_file(CERTIFICATE), path)
+
+    def test_replace_tampered_file(self):
+        path = ldap_pool.get_ca_file(CERTIFICATE)
+        f = open(path, 'w')
+        f.write('another CA')
+        f.close()
+        self.assertEqual(ldap_pool.get_ca_file(CERTIFICATE), path)
+        self.assertEqual(self.read(path), CERTIFICATE)
+        os.chmod(path, 0666)
+        ldap_pool.get_ca_file(CERTIFICATE)
+        self.assertEqual(os.stat(path).st_mode & 077, 0)
+
+    def test_shared_directory(self):
+        os.chmod(self.directory, 0777)
+        ldap_pool.CA_DIR = self.directory
+        self.assertRaises(ldap.LOCAL_ERROR, ldap_pool.get_ca_file,
+            CERTIFICATE)
+
+
+class IndexesTest(TestCase):
+    def test_lookups_do_not_leak_the_indexes(self):
+        defs = core.get_def_names_matching('2.5.4.3')
+        self.assertEqual(defs, ['cn'])
+        defs.append('sn')
+        self.assertEqual(core.get_def_names_matching('2.5.4.3'), ['cn'])
+        indexes = core.build_indexes(core.ATTRIBUTE_MAPPING)
+        for content in indexes.values():
+            for defs in content.values():
+                self.assertTrue(isinstance(defs, tuple))
+
+
+def answer(**kwargs):
+    return threading.current_thread()
+
+
+def answer_slowly(**kwargs):
+    time.sleep(1)
+    return threading.current_thread()
+
+
+def fail(**kwargs):
+    raise ValueError('failure')
+
+
+class SendConcurrentlyTest(TestCase):
+    def setUp(self):
+        self.signal = ConcurrentSignal(providing_args=['user'])
+        self.signal.connect(fail)
+        self.signal.connect(answer)
+        self.saved = (executor.workers_share_database,
+            executor.SOURCE_TIMEOUT, executor.SOURCE_TIMEOUTS)
+
+    def tearDown(self):
+        executor.workers_share_database, executor.SOURCE_TIMEOUT, \
+            executor.SOURCE_TIMEOUTS = self.saved
+
+    def test_synchronous(self):
+        # test cases run in a managed transaction, the workers would not
+        # see their rows
+        self.assertEqual(list(executor.send_concurrently(self.signal,
+            sender=None, user=None)),
+            [(answer, threading.current_thread())])
+
+    def test_receiver_timeout(self):
+        executor.workers_share_database = lambda: True
+        executor.SOURCE_TIMEOUT = 0.2
+        executor.SOURCE_TIMEOUTS = {}
+        self.signal.connect(answer_slowly)
+        start = time.time()
+        responses = list(executor.send_concurrently(self.signal,
+            sender=None, user=None))
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual([receiver for receiver, response in responses],
+            [answer])
+        self.assertNotEqual(responses[0][1], threading.current_thread())
@@ -12,7 +12,8 @@ from authentic2.saml.common import \
     lookup_federation_by_name_id_and_provider_id, add_federation, \
     get_idp_options_policy
 from authentic2.saml.models import LIBERTY_SESSION_DUMP_KIND_SP, \
-    LibertySessionDump, LibertyProvider
+    LibertyProvider
+from authentic2.saml import session_store
 from authentic2.authsaml2.models import SAML2TransientUser
 
 logger = logging.getLogger('authentic2.authsaml2.backends')
@@ -25,18 +26,17 @@ class AuthenticationError(Exception):
 class AuthSAML2Backend:
     def logout_list(self, request):
         pid = None
-        q = LibertySessionDump. \
-            objects.filter(django_session_key=request.session.session_key,
-                    kind=LIBERTY_SESSION_DUMP_KIND_SP)
-        if not q:
-            logger.debug('logout_list: no LibertySessionDump found')
+        session_dumps = session_store.get_session_dumps(
+                [request.session.session_key], LIBERTY_SESSION_DUMP_KIND_SP)
+        if not session_dumps:
+            logger.debug('logout_list: no session found')
             return []
         '''
             We deal with a single IdP session
         '''
         try:
             provider_id = lasso.Session(). \
-                newFromDump(q[0].session_dump.encode('utf-8')). \
+                newFromDump(session_dumps[0].encode('utf-8')). \
                     get_assertions().keys()[0]
         except:
             return []
@@ -41,13 +41,14 @@ from authentic2.saml.common import get_idp_list, load_provider, \
     AUTHENTIC_STATUS_CODE_UNAUTHORIZED, \
     get_sp_options_policy
 from authentic2.saml.models import LibertyProvider, LibertyFederation, \
-    LibertySessionSP, LibertySessionDump, LIBERTY_SESSION_DUMP_KIND_SP, \
+    LibertySessionSP, LIBERTY_SESSION_DUMP_KIND_SP, \
     save_key_values, NAME_ID_FORMATS, LibertySession
 from authentic2.idp.saml.saml2_endpoints import return_logout_error
 from authentic2.authsaml2.utils import error_page, register_next_target, \
     register_request_id, get_registered_url, \
     check_response_id, save_federation_temp, load_federation_temp
 from authentic2.authsaml2 import signals
+from authentic2.saml import session_store
 from authentic2.authsaml2.backends import AuthSAML2PersistentBackend
 from authentic2.utils import cache_and_validate
 
@@ -1074,14 +1075,14 @@ def logout(request):
             logger=logger)
     load_session(request, logout, kind=LIBERTY_SESSION_DUMP_KIND_SP)
     # Lookup for the Identity provider from session
-    q = LibertySessionDump. \
-        objects.filter(django_session_key=request.session.session_key)
-    if not q:
+    session_dumps = session_store.get_session_dumps(
+            [request.session.session_key])
+    if not session_dumps:
         return error_page(request,
             _('logout: No session for global logout.'),
             logger=logger)
     try:
-        pid = lasso.Session().newFromDump(q[0].session_dump). \
+        pid = lasso.Session().newFromDump(session_dumps[0]). \
             get_assertions().keys()[0]
         LibertyProvider.objects.get(entity_id=pid)
     except:
@@ -1401,9 +1402,9 @@ def singleLogoutSOAP(request):
 #                session = session_candidate
 
     if session:
-        q = LibertySessionDump. \
-            objects.filter(django_session_key=session.django_session_key)
-        if not q:
+        session_dumps = session_store.get_session_dumps(
+                [session.django_session_key])
+        if not session_dumps:
             logger.warning('singleLogoutSOAP: \
                 No session dump for this session')
             return logout, return_logout_error(request, logout,
@@ -1414,13 +1415,13 @@ def singleLogoutSOAP(request):
         try:
             #XXX: manage creation = models.DateTimeField(auto_now_add=True)
             #to user q.latest('creation')
-            logout.setSessionFromDump(q[0].session_dump.encode('utf8'))
+            logout.setSessionFromDump(session_dumps[0].encode('utf8'))
         except:
-            q.delete()
+            session_store.delete_sessions([session.django_session_key])
             logger.error('singleLogoutSOAP: unable to set session from dump')
             return logout, return_logout_error(request, logout,
                     lasso.LOGOUT_ERROR_UNKNOWN_PRINCIPAL)
-        q.delete()
+        session_store.delete_sessions([session.django_session_key])
     else:
         logger.warning('singleLogoutSOAP: No Liberty session found')
         return logout, return_logout_error(request, logout,
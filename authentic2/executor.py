@@ -0,0 +1,115 @@
+'''Bounded pools of threads running blocking calls concurrently
+
+   Used to query the attribute sources and to relay SOAP logout requests to
+   the service providers in parallel. Workers use their own database
+   connections: they do not see the rows written by the caller in a
+   transaction not yet committed, nor a sqlite in-memory database. Callers
+   whose tasks use the database check workers_share_database() first.
+'''
+
+import logging
+import threading
+import time
+import Queue
+
+from django.db import connection, transaction
+
+logger = logging.getLogger('authentic2.executor')
+
+
+def workers_share_database():
+    '''
+        Return whether the workers see the database as the calling thread
+        does: not inside a managed transaction, which may not be committed
+        yet, nor with sqlite, whose in-memory databases are private to each
+        connection.
+    '''
+    return connection.vendor != 'sqlite' and not transaction.is_managed()
+
+
+class Executor(object):
+    '''
+        Bounded pool of daemon threads, started on first use.
+    '''
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.jobs = Queue.Queue()
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def worker(self):
+        while True:
+            func, args, kwargs, key, results = self.jobs.get()
+            start = time.time()
+            try:
+                try:
+                    result = func(*args, **kwargs)
+                except Exception, err:
+                    logger.exception('worker: %s failed' % key)
+                    results.put((key, None, err, time.time() - start))
+                else:
+                    results.put((key, result, None, time.time() - start))
+            finally:
+                # Database connections are per thread, do not keep one open
+                # between jobs
+                connection.close()
+
+    def submit(self, func, args, kwargs, key, results):
+        self.lock.acquire()
+        try:
+            if len(self.threads) < self.max_workers:
+                thread = threading.Thread(target=self.worker)
+                thread.setDaemon(True)
+                thread.start()
+                self.threads.append(thread)
+        finally:
+            self.lock.release()
+        self.jobs.put((func, args, kwargs, key, results))
+
+
+def run_concurrently(tasks, deadline, executor, slow=None):
+    '''
+        Run tasks on the executor and yield (key, result) as they complete.
+
+        tasks is a list of (key, func, args, kwargs, timeout), timeout is
+        the time given to the task, deadline if None. Results of tasks
+        which failed, timed out or did not complete before the deadline are
+        dropped and logged, as well as tasks slower than slow seconds.
+
+        Tasks running on the pool must use their own executor to run
+        tasks concurrently, so that they cannot wait for workers busy
+        with their parents.
+    '''
+    start = time.time()
+    global_deadline = start + deadline
+    results = Queue.Queue()
+    pending = dict()
+    for key, func, args, kwargs, timeout in tasks:
+        if timeout is None:
+            timeout = deadline
+        pending[key] = start + timeout
+        executor.submit(func, args, kwargs, key, results)
+    while pending:
+        now = time.time()
+        for key, task_deadline in pending.items():
+            if task_deadline <= now or global_deadline <= now:
+                logger.warning('run_concurrently: %s timed out after '
+                    '%.2f seconds' % (key, now - start))
+                del pending[key]
+        if not pending:
+            break
+        wait = min(min(pending.values()), global_deadline) - now
+        try:
+            key, result, err, duration = results.get(timeout=wait)
+        except Queue.Empty:
+            continue
+        if key not in pending:
+            # result of a task already given up
+            continue
+        del pending[key]
+        if slow is not None and duration > slow:
+            logger.warning('run_concurrently: %s is slow, answered in '
+                '%.2f seconds' % (key, duration))
+        if err is None:
+            yield key, result
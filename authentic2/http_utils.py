@@ -17,19 +17,48 @@ def get_ssl_context():
         __SSL_CONTEXT.load_verify_locations(cafile=cafile, capath=capath)
     return __SSL_CONTEXT
 
-def get_url(url):
-    '''Does a simple GET on an URL, if the URL uses TLS, M2Crypto is used to
-       check the certificate'''
-
-    if url.startswith('https'):
+def urlopen(request, timeout=None):
+    '''Open an URL or an urllib2.Request, if the URL uses TLS, M2Crypto is used
+       to check the certificate'''
+    if isinstance(request, basestring):
+        request = urllib2.Request(request)
+    if timeout is None:
+        timeout = getattr(settings, 'HTTP_TIMEOUT', 30)
+    if request.get_full_url().startswith('https'):
         if not M2Crypto:
             raise urllib2.URLError('https is unsupported without M2Crypto')
         try:
-            return M2Crypto.m2urllib2.build_opener(get_ssl_context()).open(url).read()
+            opener = M2Crypto.m2urllib2.build_opener(get_ssl_context())
+            return opener.open(request, timeout=timeout)
         except M2Crypto.SSL.Checker.SSLVerificationError, e:
             # Wrap error
             raise urllib2.URLError('SSL Verification error %s' % e)
-    return urllib2.urlopen(url).read()
+    return urllib2.urlopen(request, timeout=timeout)
+
+def get_url(url):
+    '''Does a simple GET on an URL, if the URL uses TLS, M2Crypto is used to
+       check the certificate'''
+    return urlopen(url).read()
+
+def get_url_conditional(url, etag=None, last_modified=None):
+    '''Does a conditional GET on an URL using the validators of a previous
+       response.
+
+       Return a tuple (content, headers), content is None if the resource
+       was not modified.
+    '''
+    request = urllib2.Request(url)
+    if etag:
+        request.add_header('If-None-Match', etag)
+    if last_modified:
+        request.add_header('If-Modified-Since', last_modified)
+    try:
+        response = urlopen(request)
+    except urllib2.HTTPError, e:
+        if e.code == 304:
+            return None, e.info()
+        raise
+    return response.read(), response.info()
 
 if __name__ == '__main__':
     print get_url('https://dev.entrouvert.org')
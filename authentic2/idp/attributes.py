@@ -32,6 +32,7 @@ from authentic2.attribute_aggregator.core import get_def_name_from_oid, \
 from authentic2.attribute_aggregator.utils import oid_to_urn, urn_to_oid
 
 from authentic2.saml.models import LibertyProvider
+from authentic2.saml import provider_cache
 
 from authentic2.idp.models import get_attribute_policy
 
@@ -179,23 +180,25 @@ def add_data_to_dic(attributes, name, values,
     logger.debug('add_data_to_dic: dic is now %s' % attributes)
 
 
-def provide_attributes_at_sso(request, user, audience, **kwargs):
+def provide_attributes_at_sso(request, user, audience, attribute_policy=None,
+        **kwargs):
     '''This function is called by a service provider asynrhonous binding at
     sso login. The call is made by the signal add_attributes_to_response.
-    In parameter, the service provider id and the user authenticated.'''
+    In parameter, the service provider id and the user authenticated.
+    Services which are not providers, like CAS services, give their
+    attribute policy.'''
     if not user or not audience:
         return None
     logger.debug('provide_attributes_at_sso: search attribute for %s' \
                     % user)
     logger.debug('provide_attributes_at_sso: attributes for %s' \
                     % audience)
-    provider = None
-    try:
-        provider = LibertyProvider.objects.get(entity_id=audience)
-    except:
-        logger.debug('provide_attributes_at_sso: Provider with name %s not \
-            found' % audience)
-    attribute_policy = get_attribute_policy(provider)
+    if attribute_policy is None:
+        provider = provider_cache.get(audience)
+        if provider is None:
+            logger.debug('provide_attributes_at_sso: Provider with name %s \
+                not found' % audience)
+        attribute_policy = get_attribute_policy(provider)
     if not attribute_policy:
         logger.debug('provide_attributes_at_sso: no attribute policy found \
             for %s' % audience)
@@ -219,7 +222,7 @@ def provide_attributes_at_sso(request, user, audience, **kwargs):
     else:
         logger.debug('provide_attributes_at_sso: found attribute list named \
             %s' % list_pull.name)
-        l = list_pull.attributes.all()
+        l = list_pull.attributes
         if not l:
             logger.debug('provide_attributes_at_sso: The list is empty')
         else:
@@ -287,8 +290,7 @@ def provide_attributes_at_sso(request, user, audience, **kwargs):
         logger.debug('provide_attributes_at_sso: attributes is session are \
             %s' % str(request.session['multisource_attributes']))
         attrs = {}
-        sources = \
-                attribute_policy.source_filter_for_sso_from_push_sources.all()
+        sources = attribute_policy.source_filter_for_sso_from_push_sources
         if sources:
             s_names = [s.name for s in sources]
             logger.debug('provide_attributes_at_sso: filter attributes from \
@@ -411,8 +413,7 @@ def provide_attributes_at_sso(request, user, audience, **kwargs):
 
             if attribute_policy.attribute_filter_for_sso_from_push_sources:
                 att_l = attribute_policy.\
-                    attribute_filter_for_sso_from_push_sources.\
-                        attributes.all()
+                    attribute_filter_for_sso_from_push_sources.attributes
                 if att_l:
                     for att in att_l:
                         d = None
@@ -439,7 +440,7 @@ def provide_attributes_at_sso(request, user, audience, **kwargs):
                                 namespace_out = \
                                     attribute_policy.output_namespace
                                 name_format_out = \
-                                    attribute_policy.attribute_name_format
+                                    attribute_policy.output_name_format
                             logger.debug('provide_attributes_at_sso: \
                                 output namespace %s' % namespace_out)
                             logger.debug('provide_attributes_at_sso: \
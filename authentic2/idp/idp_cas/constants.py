@@ -15,6 +15,9 @@ USERNAME_FIELD   = 'username' # unused
 PASSWORD_FIELD   = 'password' # unused
 LT_FIELD         = 'lt'       # unused
 SERVICE_TICKET_PREFIX = 'ST-'
+PROXY_TICKET_PREFIX = 'PT-'
+PROXY_GRANTING_TICKET_PREFIX = 'PGT-'
+PROXY_GRANTING_TICKET_IOU_PREFIX = 'PGTIOU-'
 ID_PARAM         = 'id'
 CANCEL_PARAM     = 'cancel'
 
@@ -53,6 +56,28 @@ CAS20_VALIDATION_FAILURE = '''<cas:serviceResponse xmlns:cas='http://www.yale.ed
 </cas:serviceResponse>'''
 CAS20_VALIDATION_SUCCESS = '''<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
     <cas:authenticationSuccess>
-        <cas:user>%s</cas:user>
+        <cas:user>%s</cas:user>%s
     </cas:authenticationSuccess>
 </cas:serviceResponse>'''
+CAS20_ATTRIBUTES = '''
+        <cas:attributes>%s
+        </cas:attributes>'''
+CAS20_ATTRIBUTE = '''
+            <cas:%s>%s</cas:%s>'''
+CAS20_PGT = '''
+        <cas:proxyGrantingTicket>%s</cas:proxyGrantingTicket>'''
+CAS20_PROXIES = '''
+        <cas:proxies>%s
+        </cas:proxies>'''
+CAS20_PROXY = '''
+            <cas:proxy>%s</cas:proxy>'''
+CAS20_PROXY_FAILURE = '''<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+    <cas:proxyFailure code="%s">
+        %s
+    </cas:proxyFailure>
+</cas:serviceResponse>'''
+CAS20_PROXY_SUCCESS = '''<cas:serviceResponse xmlns:cas='http://www.yale.edu/tp/cas'>
+    <cas:proxySuccess>
+        <cas:proxyTicket>%s</cas:proxyTicket>
+    </cas:proxySuccess>
+</cas:serviceResponse>'''
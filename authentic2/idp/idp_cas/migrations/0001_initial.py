@@ -0,0 +1,45 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+
+        # Adding model 'CasTicket'
+        db.create_table('idp_cas_casticket', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('ticket_id', self.gf('django.db.models.fields.CharField')(max_length=64)),
+            ('renew', self.gf('django.db.models.fields.BooleanField')(default=False)),
+            ('validity', self.gf('django.db.models.fields.BooleanField')(default=False)),
+            ('service', self.gf('django.db.models.fields.CharField')(max_length=256)),
+            ('user', self.gf('django.db.models.fields.CharField')(max_length=128, null=True, blank=True)),
+            ('creation', self.gf('django.db.models.fields.DateTimeField')(auto_now_add=True, blank=True)),
+            ('expire', self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True)),
+        ))
+        db.send_create_signal('idp_cas', ['CasTicket'])
+
+
+    def backwards(self, orm):
+
+        # Deleting model 'CasTicket'
+        db.delete_table('idp_cas_casticket')
+
+
+    models = {
+        'idp_cas.casticket': {
+            'Meta': {'object_name': 'CasTicket'},
+            'creation': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'expire': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'renew': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'service': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'ticket_id': ('django.db.models.fields.CharField', [], {'max_length': '64'}),
+            'user': ('django.db.models.fields.CharField', [], {'max_length': '128', 'null': 'True', 'blank': 'True'}),
+            'validity': ('django.db.models.fields.BooleanField', [], {'default': 'False'})
+        }
+    }
+
+    complete_apps = ['idp_cas']
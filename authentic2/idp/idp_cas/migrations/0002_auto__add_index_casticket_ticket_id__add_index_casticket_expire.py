@@ -0,0 +1,41 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+
+        # Adding index on 'CasTicket', fields ['ticket_id']
+        db.create_index('idp_cas_casticket', ['ticket_id'])
+
+        # Adding index on 'CasTicket', fields ['expire']
+        db.create_index('idp_cas_casticket', ['expire'])
+
+
+    def backwards(self, orm):
+
+        # Removing index on 'CasTicket', fields ['expire']
+        db.delete_index('idp_cas_casticket', ['expire'])
+
+        # Removing index on 'CasTicket', fields ['ticket_id']
+        db.delete_index('idp_cas_casticket', ['ticket_id'])
+
+
+    models = {
+        'idp_cas.casticket': {
+            'Meta': {'object_name': 'CasTicket'},
+            'creation': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'expire': ('django.db.models.fields.DateTimeField', [], {'db_index': 'True', 'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'renew': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'service': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'ticket_id': ('django.db.models.fields.CharField', [], {'max_length': '64', 'db_index': 'True'}),
+            'user': ('django.db.models.fields.CharField', [], {'max_length': '128', 'null': 'True', 'blank': 'True'}),
+            'validity': ('django.db.models.fields.BooleanField', [], {'default': 'False'})
+        }
+    }
+
+    complete_apps = ['idp_cas']
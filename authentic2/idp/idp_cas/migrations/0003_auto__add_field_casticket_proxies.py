@@ -0,0 +1,36 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+
+        # Adding field 'CasTicket.proxies'
+        db.add_column('idp_cas_casticket', 'proxies', self.gf('django.db.models.fields.TextField')(default='', blank=True), keep_default=False)
+
+
+    def backwards(self, orm):
+
+        # Deleting field 'CasTicket.proxies'
+        db.delete_column('idp_cas_casticket', 'proxies')
+
+
+    models = {
+        'idp_cas.casticket': {
+            'Meta': {'object_name': 'CasTicket'},
+            'creation': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'expire': ('django.db.models.fields.DateTimeField', [], {'db_index': 'True', 'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'proxies': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            'renew': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'service': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'ticket_id': ('django.db.models.fields.CharField', [], {'max_length': '64', 'db_index': 'True'}),
+            'user': ('django.db.models.fields.CharField', [], {'max_length': '128', 'null': 'True', 'blank': 'True'}),
+            'validity': ('django.db.models.fields.BooleanField', [], {'default': 'False'})
+        }
+    }
+
+    complete_apps = ['idp_cas']
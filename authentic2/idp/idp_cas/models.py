@@ -1,4 +1,8 @@
+import json
+
+from django.conf import settings
 from django.db import models
+from django.db.models import Q
 
 from datetime import datetime, timedelta
 
@@ -7,24 +11,60 @@ class CasTicketManager(models.Manager):
         '''
            Remove expired tickets.
         '''
-        self.filter(expire__gte=datetime.now()).delete()
+        self.filter(expire__lt=datetime.now()).delete()
 
-    def cleanup(self):
-        # Keep them 4 minutes
+    def cleanup(self, chunk_size=1000):
+        '''Delete the expired tickets by chunks, return their number'''
+        now = datetime.now()
+        # Keep the tickets without expiration 4 minutes
         expire = getattr(settings, 'CAS_TICKET_EXPIRATION', 240)
-        self.filter(when__lt=date.today()-timedelta(seconds=expire)).delete()
+        qs = self.filter(Q(expire__lt=now) | Q(expire__isnull=True,
+            creation__lt=now-timedelta(seconds=expire)))
+        deleted = 0
+        while True:
+            pks = list(qs.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            self.filter(pk__in=pks).delete()
+            deleted += len(pks)
+        return deleted
 
 class CasTicket(models.Model):
     '''Session ticket with a CAS 1.0 or 2.0 consumer'''
 
-    ticket_id  = models.CharField(max_length=64)
+    ticket_id  = models.CharField(max_length=64, db_index=True)
     renew   = models.BooleanField(default=False)
     validity   = models.BooleanField(default=False)
     service = models.CharField(max_length=256)
     user    = models.CharField(max_length=128,blank=True,null=True)
     creation = models.DateTimeField(auto_now_add=True)
     '''Duration length for the ticket as seconds'''
-    expire = models.DateTimeField(blank=True, null=True)
+    expire = models.DateTimeField(blank=True, null=True, db_index=True)
+    '''Proxy callback URLs the ticket went through, most recent first, one
+       per line'''
+    proxies = models.TextField(blank=True, default='')
+    '''Attributes released to the service, computed when the ticket is
+       emitted, as a JSON dictionary of names to lists of values'''
+    attributes = models.TextField(blank=True, default='')
+
+    objects = CasTicketManager()
+
+    def get_proxies(self):
+        return [proxy for proxy in self.proxies.split('\n') if proxy]
+
+    def set_proxies(self, proxies):
+        self.proxies = '\n'.join(proxies)
+
+    def get_attributes(self):
+        if not self.attributes:
+            return {}
+        return json.loads(self.attributes)
+
+    def set_attributes(self, attributes):
+        if attributes:
+            self.attributes = json.dumps(attributes)
+        else:
+            self.attributes = ''
 
     def valid(self):
         return self.validity and not self.expired()
@@ -0,0 +1,170 @@
+import BaseHTTPServer
+import datetime
+import os.path
+import ssl
+import threading
+import urlparse
+
+from django.test import TestCase
+from django.test.client import RequestFactory
+
+from models import CasTicket
+from ticket_store import save_ticket, get_ticket, ModelTicketStore
+from views import CasProvider
+from constants import PGT_PARAM, TARGET_SERVICE_PARAM, PGT_ID_PARAM, \
+    PGT_IOU_PARAM, INVALID_REQUEST_ERROR, PROXY_GRANTING_TICKET_PREFIX, \
+    PROXY_GRANTING_TICKET_IOU_PREFIX, SERVICE_TICKET_PREFIX
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'data')
+CERTIFICATE = os.path.join(DATA_DIR, 'certificate.pem')
+PRIVATE_KEY = os.path.join(DATA_DIR, 'private-key.pem')
+
+
+class CallbackHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.queries.append(dict(urlparse.parse_qsl(
+            urlparse.urlparse(self.path).query)))
+        self.send_response(self.server.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPSCallbackStandIn(object):
+    '''Proxy callback served over HTTPS from a thread, with the self-signed
+       certificate of the data directory'''
+
+    def __init__(self, status=200):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                CallbackHandler)
+        self.server.socket = ssl.wrap_socket(self.server.socket,
+                keyfile=PRIVATE_KEY, certfile=CERTIFICATE, server_side=True)
+        self.server.status = status
+        self.server.queries = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return 'https://127.0.0.1:%d/callback' % self.server.server_port
+
+    @property
+    def queries(self):
+        return self.server.queries
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_ticket(prefix, service):
+    ticket = CasTicket(ticket_id=CasProvider().make_id(prefix=prefix),
+        service=service, validity=True, user='john',
+        expire=datetime.datetime.now() + datetime.timedelta(seconds=60))
+    save_ticket(ticket)
+    return ticket
+
+
+class ModelTicketStoreTest(TestCase):
+    def setUp(self):
+        self.store = ModelTicketStore()
+
+    def test_pop(self):
+        st = make_ticket(SERVICE_TICKET_PREFIX, 'https://service.example.com/')
+        self.assertNumQueries(2, lambda: self.assertEqual(
+            self.store.pop(st.ticket_id).pk, st.pk))
+        self.assertEqual(self.store.pop(st.ticket_id), None)
+        # a login cannot make the consumed ticket valid again
+        consumed = self.store.get(st.ticket_id)
+        consumed.validity = True
+        self.assertFalse(consumed.valid())
+
+    def test_pop_invalid(self):
+        st = make_ticket(SERVICE_TICKET_PREFIX, 'https://service.example.com/')
+        st.validity = False
+        self.store.save(st)
+        self.assertEqual(self.store.pop(st.ticket_id), None)
+        self.assertNotEqual(self.store.get(st.ticket_id), None)
+
+
+class ProxyTest(TestCase):
+    def setUp(self):
+        self.provider = CasProvider()
+        self.factory = RequestFactory()
+        self.pgt = make_ticket(PROXY_GRANTING_TICKET_PREFIX,
+                'https://proxy.example.com/callback')
+
+    def proxy(self, target_service):
+        request = self.factory.get('/idp/cas/proxy', {
+            PGT_PARAM: self.pgt.ticket_id,
+            TARGET_SERVICE_PARAM: target_service})
+        return self.provider.proxy(request)
+
+    def test_invalid_target_service(self):
+        for target_service in ('javascript:alert(1)', '/relative',
+                'ftp://ftp.example.com/', 'https:///path'):
+            response = self.proxy(target_service)
+            self.assertTrue(INVALID_REQUEST_ERROR in response.content,
+                    target_service)
+            self.assertFalse('proxySuccess' in response.content)
+
+    def test_target_service(self):
+        response = self.proxy('https://service.example.com/')
+        self.assertTrue('proxySuccess' in response.content)
+
+
+class ProxyCallbackTest(TestCase):
+    def setUp(self):
+        self.provider = CasProvider()
+        self.st = make_ticket(SERVICE_TICKET_PREFIX,
+                'https://proxy.example.com/')
+        self.stand_in = None
+        # the stand-in certificate is self-signed, the Python versions
+        # checking certificates provide a way to disable the check
+        self.default_context = getattr(ssl,
+                '_create_default_https_context', None)
+        if self.default_context is not None:
+            ssl._create_default_https_context = ssl._create_unverified_context
+
+    def tearDown(self):
+        if self.default_context is not None:
+            ssl._create_default_https_context = self.default_context
+        if self.stand_in is not None:
+            self.stand_in.stop()
+
+    def test_callback(self):
+        self.stand_in = HTTPSCallbackStandIn()
+        pgt_iou = self.provider.create_proxy_granting_ticket(self.st,
+                self.stand_in.url)
+        self.assertTrue(pgt_iou.startswith(PROXY_GRANTING_TICKET_IOU_PREFIX))
+        self.assertEqual(len(self.stand_in.queries), 1)
+        query = self.stand_in.queries[0]
+        self.assertEqual(query[PGT_IOU_PARAM], pgt_iou)
+        pgt = get_ticket(query[PGT_ID_PARAM])
+        self.assertEqual(pgt.service, self.stand_in.url)
+        self.assertEqual(pgt.user, 'john')
+        self.assertTrue(pgt.valid())
+
+    def test_callback_error(self):
+        self.stand_in = HTTPSCallbackStandIn(status=404)
+        self.assertEqual(self.provider.create_proxy_granting_ticket(self.st,
+            self.stand_in.url), None)
+        query = self.stand_in.queries[0]
+        self.assertEqual(get_ticket(query[PGT_ID_PARAM]), None)
+
+    def test_http_callback(self):
+        self.assertEqual(self.provider.create_proxy_granting_ticket(self.st,
+            'http://proxy.example.com/callback'), None)
+
+    def test_untrusted_certificate(self):
+        if self.default_context is None:
+            # this Python does not check certificates
+            return
+        ssl._create_default_https_context = self.default_context
+        self.stand_in = HTTPSCallbackStandIn()
+        self.assertEqual(self.provider.create_proxy_granting_ticket(self.st,
+            self.stand_in.url), None)
+        self.assertEqual(self.stand_in.queries, [])
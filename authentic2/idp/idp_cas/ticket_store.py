@@ -0,0 +1,133 @@
+'''Storage of the CAS service tickets
+
+   A service ticket is written when it is emitted, or once the user has
+   authenticated, and read once by its validation. The store is chosen by
+   the CAS_TICKET_STORE setting, the dotted path of one of:
+
+    - ModelTicketStore, the default, keeps the tickets as CasTicket rows,
+      expired ones are removed by the cleanup command,
+    - CacheTicketStore keeps them in the Django cache named by the
+      CAS_TICKET_CACHE setting, which expires them itself; the cache must be
+      shared by all the nodes.
+'''
+
+import datetime
+import logging
+
+from django.conf import settings
+from django.core.cache import get_cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.importlib import import_module
+
+from models import CasTicket
+
+logger = logging.getLogger('authentic2.idp.idp_cas.ticket_store')
+
+STORE = getattr(settings, 'CAS_TICKET_STORE',
+        'authentic2.idp.idp_cas.ticket_store.ModelTicketStore')
+CACHE = getattr(settings, 'CAS_TICKET_CACHE', 'default')
+EXPIRATION = getattr(settings, 'CAS_TICKET_EXPIRATION', 240)
+
+
+class ModelTicketStore(object):
+    def save(self, ticket):
+        ticket.save()
+
+    def get(self, ticket_id):
+        try:
+            return CasTicket.objects.get(ticket_id=ticket_id)
+        except CasTicket.DoesNotExist:
+            return None
+
+    def pop(self, ticket_id):
+        ticket = self.get(ticket_id)
+        if ticket is None or not ticket.validity:
+            return None
+        # only one validation can claim the valid ticket; it is also expired
+        # so that it cannot be validated again by a login, the cleanup
+        # removes it
+        consumed = CasTicket.objects.filter(pk=ticket.pk, validity=True) \
+                .update(validity=False, expire=datetime.datetime.now())
+        if not consumed:
+            logger.warning('pop: ticket %r already validated' % ticket_id)
+            return None
+        return ticket
+
+    def delete(self, ticket):
+        CasTicket.objects.filter(ticket_id=ticket.ticket_id).delete()
+
+
+class CacheTicketStore(object):
+    def __init__(self):
+        self.cache = get_cache(CACHE)
+
+    def get_keys(self, ticket_id):
+        if isinstance(ticket_id, unicode):
+            ticket_id = ticket_id.encode('utf8')
+        return 'cas-ticket-%s' % ticket_id, 'cas-ticket-used-%s' % ticket_id
+
+    def get_timeout(self, ticket):
+        if ticket.expire:
+            delta = ticket.expire - datetime.datetime.now()
+            return max(delta.days * 86400 + delta.seconds, 1)
+        return EXPIRATION
+
+    def save(self, ticket):
+        key, used_key = self.get_keys(ticket.ticket_id)
+        self.cache.set(key, ticket, self.get_timeout(ticket))
+
+    def get(self, ticket_id):
+        key, used_key = self.get_keys(ticket_id)
+        return self.cache.get(key)
+
+    def pop(self, ticket_id):
+        key, used_key = self.get_keys(ticket_id)
+        ticket = self.cache.get(key)
+        if ticket is None:
+            return None
+        # add() is atomic, only one validation of a ticket can succeed
+        if not self.cache.add(used_key, True, self.get_timeout(ticket)):
+            logger.warning('pop: ticket %r already validated' % ticket_id)
+            return None
+        self.cache.delete(key)
+        return ticket
+
+    def delete(self, ticket):
+        key, used_key = self.get_keys(ticket.ticket_id)
+        self.cache.delete(key)
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        package, name = STORE.rsplit('.', 1)
+        try:
+            store_class = getattr(import_module(package), name)
+        except (ImportError, AttributeError):
+            raise ImproperlyConfigured('CAS ticket store %r could not be '
+                    'imported' % STORE)
+        _store = store_class()
+    return _store
+
+
+def save_ticket(ticket):
+    '''Store a new ticket, or the changes of a ticket'''
+    get_store().save(ticket)
+
+
+def get_ticket(ticket_id):
+    '''Return a ticket, None if it is unknown or expired'''
+    return get_store().get(ticket_id)
+
+
+def pop_ticket(ticket_id):
+    '''Return a ticket and forget it, None if it is unknown, expired or
+       already validated'''
+    return get_store().pop(ticket_id)
+
+
+def delete_ticket(ticket):
+    get_store().delete(ticket)
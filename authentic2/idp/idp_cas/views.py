@@ -1,17 +1,23 @@
 import logging
 import random
 import datetime
+import re
 import string
+import urlparse
+from xml.sax.saxutils import escape
 
 from django.http import HttpResponseRedirect, HttpResponseBadRequest, \
     HttpResponse
 from django.core.urlresolvers import reverse
 from django.contrib.auth.views import redirect_to_login, logout
 from django.utils.http import urlquote, urlencode
+from django.utils.encoding import force_unicode
 from django.conf.urls.defaults import patterns, url
 from django.conf import settings
 
 from models import CasTicket
+from ticket_store import save_ticket, get_ticket, pop_ticket, \
+    delete_ticket
 from authentic2.auth2_auth.views import redirect_to_login as \
     auth2_redirect_to_login
 import authentic2.auth2_auth.models as auth2_auth_models
@@ -19,12 +25,41 @@ from constants import SERVICE_PARAM, RENEW_PARAM, GATEWAY_PARAM, ID_PARAM, \
     CANCEL_PARAM, SERVICE_TICKET_PREFIX, TICKET_PARAM, \
     CAS10_VALIDATION_FAILURE, CAS10_VALIDATION_SUCCESS, PGT_URL_PARAM, \
     INVALID_REQUEST_ERROR, INVALID_TICKET_ERROR, INVALID_SERVICE_ERROR, \
-    INTERNAL_ERROR, CAS20_VALIDATION_FAILURE, CAS20_VALIDATION_SUCCESS
+    INTERNAL_ERROR, CAS20_VALIDATION_FAILURE, CAS20_VALIDATION_SUCCESS, \
+    PROXY_TICKET_PREFIX, PROXY_GRANTING_TICKET_PREFIX, \
+    PROXY_GRANTING_TICKET_IOU_PREFIX, PGT_PARAM, PGT_ID_PARAM, PGT_IOU_PARAM, \
+    TARGET_SERVICE_PARAM, BAD_PGT_ERROR, CAS20_PGT, CAS20_PROXIES, \
+    CAS20_PROXY, CAS20_PROXY_FAILURE, CAS20_PROXY_SUCCESS, CAS20_ATTRIBUTES, \
+    CAS20_ATTRIBUTE
+from authentic2.idp.attributes import provide_attributes_at_sso
+from authentic2.idp.models import get_compiled_attribute_policy
+from authentic2.saml.soap_pool import Pool
 
 logger = logging.getLogger('authentic2.idp.idp_cas')
 
 ALPHABET = string.letters+string.digits+'-'
 
+# Default lifetime in seconds of the service and proxy tickets
+TICKET_DURATION = 5*60
+# Lifetime in seconds of the proxy granting tickets
+PGT_EXPIRATION = getattr(settings, 'CAS_PGT_EXPIRATION', 7200)
+# Timeout in seconds to connect to a proxy callback, and for its answer
+PROXY_CALLBACK_TIMEOUT = getattr(settings, 'CAS_PROXY_CALLBACK_TIMEOUT', 5)
+
+# Attribute policies applying to the CAS services, by prefix of their URLs,
+# no attribute is released to other services
+ATTRIBUTE_POLICIES = getattr(settings, 'CAS_ATTRIBUTE_POLICIES', {})
+# Valid names of the elements of the released attributes
+ATTRIBUTE_NAME_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_.-]*$')
+
+_callback_pool = Pool(connect_timeout=PROXY_CALLBACK_TIMEOUT,
+        read_timeout=PROXY_CALLBACK_TIMEOUT)
+
+def is_http_url(url):
+    '''Return whether url is an absolute HTTP or HTTPS URL'''
+    parsed = urlparse.urlparse(url)
+    return parsed.scheme in ('http', 'https') and bool(parsed.netloc)
+
 class CasProvider(object):
     def get_url(self):
         return patterns('cas',
@@ -32,6 +67,8 @@ class CasProvider(object):
                 url('^continue$', self.continue_cas),
                 url('^validate$', self.validate),
                 url('^serviceValidate$', self.service_validate),
+                url('^proxyValidate$', self.proxy_validate),
+                url('^proxy$', self.proxy),
                 url('^logout$', self.logout))
     url = property(get_url)
 
@@ -41,15 +78,18 @@ class CasProvider(object):
         return prefix + ''.join(content)
 
     def create_service_ticket(self, service, renew=False, validity=True,
-            expire=None, user=None):
+            expire=None, user=None, attributes=None):
         '''Create a fresh service ticket'''
         validity = validity and not renew
-        return CasTicket.objects.create(ticket_id=self.make_id(prefix='ST-'),
+        st = CasTicket(ticket_id=self.make_id(prefix='ST-'),
             service=service,
             renew=renew,
             validity=validity,
-            expire=None,
+            expire=expire,
             user=user)
+        st.set_attributes(attributes)
+        save_ticket(st)
+        return st
 
     def check_authentication(self, request, st):
         '''
@@ -109,7 +149,7 @@ class CasProvider(object):
 renew:%s and gateway:%s' % (service, renew, gateway))
 
         if duration is None or duration < 0:
-            duration = 5*60
+            duration = TICKET_DURATION
         if duration:
             expire = datetime.datetime.now() + \
                 datetime.timedelta(seconds=duration)
@@ -121,13 +161,14 @@ renew:%s and gateway:%s' % (service, renew, gateway))
             return self.authenticate(request, st, passive=gateway)
         else:
             st = self.create_service_ticket(service, expire=expire,
-                    user=self.get_cas_user(request))
+                    user=self.get_cas_user(request),
+                    attributes=self.get_cas_attributes(request, service))
             return self.handle_login_after_authentication(request, st)
 
     def cas_failure(self, request, st, reason):
         logger.debug('%s, redirecting without ticket to %r' % (reason, \
             st.service))
-        st.delete()
+        delete_ticket(st)
         return HttpResponseRedirect(st.service)
 
     def authenticate(self, request, st, passive=False):
@@ -159,9 +200,8 @@ renew:%s and gateway:%s' % (service, renew, gateway))
             return self.failure(request, 'missing ticket id')
         if not ticket_id.startswith(SERVICE_TICKET_PREFIX):
             return self.failure(request, 'invalid ticket id')
-        try:
-            st = CasTicket.objects.get(ticket_id=ticket_id)
-        except CasTicket.DoesNotExist:
+        st = get_ticket(ticket_id)
+        if st is None:
             return self.failure(request, 'unknown ticket id')
         if cancel:
             return self.cas_failure(request, st, 'login cancelled')
@@ -177,8 +217,9 @@ renew:%s and gateway:%s' % (service, renew, gateway))
         else:
             # normal login
             st.user = self.get_cas_user(request)
+            st.set_attributes(self.get_cas_attributes(request, st.service))
             st.validity = True
-            st.save()
+            save_ticket(st)
         return self.handle_login_after_authentication(request, st)
 
     def handle_login_after_authentication(self, request, st):
@@ -200,15 +241,11 @@ renew:%s and gateway:%s' % (service, renew, gateway))
         renew = request.GET.get(RENEW_PARAM) is not None
         if service is None:
             return self.failure(request, 'service parameter is missing')
-        if service is None:
+        if ticket is None:
             return self.failure(request, 'ticket parameter is missing')
         if not ticket.startswith(SERVICE_TICKET_PREFIX):
             return self.failure(request, 'invalid ticket prefix')
-        try:
-            st = CasTicket.objects.get(ticket_id=ticket)
-            st.delete()
-        except CasTicket.DoesNotExist:
-            st = None
+        st = pop_ticket(ticket)
         if st is None \
                 or not st.valid() \
                 or (st.renew ^ renew) \
@@ -228,36 +265,140 @@ renew:%s and gateway:%s' % (service, renew, gateway))
         '''
            CAS 2.0 serviceValidate endpoint.
         '''
+        return self.handle_validate(request, (SERVICE_TICKET_PREFIX,))
+
+    def proxy_validate(self, request):
+        '''
+           CAS 2.0 proxyValidate endpoint, it also accepts proxy tickets.
+        '''
+        return self.handle_validate(request, (SERVICE_TICKET_PREFIX,
+            PROXY_TICKET_PREFIX))
+
+    def handle_validate(self, request, prefixes):
         try:
             if request.method != 'GET':
-                return self.failure('Only GET HTTP verb is accepted')
+                return self.failure(request, 'Only GET HTTP verb is accepted')
             service = request.GET.get(SERVICE_PARAM)
             ticket = request.GET.get(TICKET_PARAM)
             renew = request.GET.get(RENEW_PARAM) is not None
             pgt_url = request.GET.get(PGT_URL_PARAM)
             if service is None:
                 return self.cas20_error(request, INVALID_REQUEST_ERROR)
-            if service is None:
+            if ticket is None:
                 return self.cas20_error(request, INVALID_REQUEST_ERROR)
-            if not ticket.startswith(SERVICE_TICKET_PREFIX):
+            if not ticket.startswith(prefixes):
                 return self.cas20_error(request, INVALID_TICKET_ERROR)
-            try:
-                st = CasTicket.objects.get(ticket_id=ticket)
-                st.delete()
-            except CasTicket.DoesNotExist:
-                st = None
+            st = pop_ticket(ticket)
             if st is None \
                     or not st.valid() \
                     or (st.renew ^ renew):
                 return self.cas20_error(request, INVALID_TICKET_ERROR)
             if st.service != service:
                 return self.cas20_error(request, INVALID_SERVICE_ERROR)
+            extra = ''
+            attributes = st.get_attributes()
+            if attributes:
+                extra += CAS20_ATTRIBUTES % ''.join(CAS20_ATTRIBUTE % (name,
+                    escape(value), name) for name, values
+                    in sorted(attributes.iteritems()) for value in values)
             if pgt_url:
-                raise NotImplementedError(
-                        'CAS 2.0 pgtUrl parameter is not handled')
-            return HttpResponse(CAS20_VALIDATION_SUCCESS % st.user)
+                pgt_iou = self.create_proxy_granting_ticket(st, pgt_url)
+                if pgt_iou:
+                    extra += CAS20_PGT % pgt_iou
+            proxies = st.get_proxies()
+            if proxies:
+                extra += CAS20_PROXIES % ''.join(CAS20_PROXY % escape(proxy)
+                        for proxy in proxies)
+            return HttpResponse(CAS20_VALIDATION_SUCCESS % (escape(st.user),
+                extra))
         except Exception:
-            return self.cas20_error(INTERNAL_ERROR)
+            logger.exception('handle_validate: validation failed')
+            return self.cas20_error(request, INTERNAL_ERROR)
+
+    def create_proxy_granting_ticket(self, st, pgt_url):
+        '''
+           Emit a proxy granting ticket for the user of a validated ticket,
+           and give it to the proxy callback pgt_url. Return the IOU of the
+           ticket, None if the callback failed.
+        '''
+        if not pgt_url.startswith('https://'):
+            logger.warning('create_proxy_granting_ticket: proxy callback %r '
+                    'is not an HTTPS URL' % pgt_url)
+            return None
+        expire = datetime.datetime.now() + \
+            datetime.timedelta(seconds=PGT_EXPIRATION)
+        pgt = CasTicket(ticket_id=self.make_id(
+                prefix=PROXY_GRANTING_TICKET_PREFIX, length=64),
+            service=pgt_url,
+            validity=True,
+            expire=expire,
+            user=st.user)
+        pgt.set_proxies(st.get_proxies())
+        pgt_iou = self.make_id(prefix=PROXY_GRANTING_TICKET_IOU_PREFIX,
+                length=64)
+        if not self.send_proxy_granting_ticket(pgt_url, pgt.ticket_id,
+                pgt_iou):
+            return None
+        save_ticket(pgt)
+        return pgt_iou
+
+    def send_proxy_granting_ticket(self, pgt_url, pgt_id, pgt_iou):
+        '''
+           Call the proxy callback with the ticket and its IOU, the callback
+           must answer with a 200 status. The certificate of the callback
+           is checked by the ssl module of Python 2.7.9 and later.
+        '''
+        query = urlencode({PGT_ID_PARAM: pgt_id, PGT_IOU_PARAM: pgt_iou})
+        if '?' in pgt_url:
+            url = '%s&%s' % (pgt_url, query)
+        else:
+            url = '%s?%s' % (pgt_url, query)
+        try:
+            status, data = _callback_pool.get(url)
+        except Exception, e:
+            logger.warning('send_proxy_granting_ticket: proxy callback %r '
+                    'failed: %s' % (pgt_url, e))
+            return False
+        if status != 200:
+            logger.warning('send_proxy_granting_ticket: proxy callback %r '
+                    'answered with status %s' % (pgt_url, status))
+            return False
+        return True
+
+    def proxy(self, request):
+        '''
+           CAS 2.0 proxy endpoint, emit a proxy ticket for a target service
+           from a proxy granting ticket.
+        '''
+        if request.method != 'GET':
+            return self.failure(request, 'Only GET HTTP verb is accepted')
+        pgt_id = request.GET.get(PGT_PARAM)
+        target_service = request.GET.get(TARGET_SERVICE_PARAM)
+        if not pgt_id or not target_service:
+            return self.cas20_proxy_error(request, INVALID_REQUEST_ERROR)
+        if not is_http_url(target_service):
+            logger.warning('proxy: target service %r is not an HTTP or HTTPS '
+                    'URL' % target_service)
+            return self.cas20_proxy_error(request, INVALID_REQUEST_ERROR)
+        if not pgt_id.startswith(PROXY_GRANTING_TICKET_PREFIX):
+            return self.cas20_proxy_error(request, BAD_PGT_ERROR)
+        pgt = get_ticket(pgt_id)
+        if pgt is None or not pgt.valid():
+            return self.cas20_proxy_error(request, BAD_PGT_ERROR)
+        expire = datetime.datetime.now() + \
+            datetime.timedelta(seconds=TICKET_DURATION)
+        pt = CasTicket(ticket_id=self.make_id(prefix=PROXY_TICKET_PREFIX),
+            service=target_service,
+            validity=True,
+            expire=expire,
+            user=pgt.user)
+        pt.set_proxies([pgt.service] + pgt.get_proxies())
+        save_ticket(pt)
+        return HttpResponse(CAS20_PROXY_SUCCESS % pt.ticket_id)
+
+    def cas20_proxy_error(self, request, code):
+        message = self.get_cas20_error_message(code)
+        return HttpResponse(CAS20_PROXY_FAILURE % (code, message))
 
     def logout(self, request):
         next = request.GET.get('url')
@@ -284,8 +425,55 @@ is possible''')
             ae = auth2_auth_models.AuthenticationEvent.objects \
                     .get(nonce=st.ticket_id)
             st.user = ae.who
+            st.set_attributes(self.get_cas_attributes(request, st.service))
             st.validity = True
-            st.save()
+            save_ticket(st)
             return True
         except auth2_auth_models.AuthenticationEvent.DoesNotExist:
             return False
+
+    def get_attribute_policy(self, service):
+        '''
+           Return the attribute policy named in CAS_ATTRIBUTE_POLICIES by
+           the longest prefix of the service URL, None if there is none.
+        '''
+        prefixes = [prefix for prefix in ATTRIBUTE_POLICIES
+                if service.startswith(prefix)]
+        if not prefixes:
+            return None
+        name = ATTRIBUTE_POLICIES[max(prefixes, key=len)]
+        return get_compiled_attribute_policy(name=name, enabled=True)
+
+    def get_cas_attributes(self, request, service):
+        '''
+           Release the attributes given by the attribute policy of the
+           service, as computed for a SAML service provider at SSO, as a
+           dictionary of attribute names to lists of values. Attributes are
+           named by their friendly name if they have one. They are computed
+           when the service ticket is emitted and stored with it.
+        '''
+        policy = self.get_attribute_policy(service)
+        if policy is None:
+            return {}
+        try:
+            dic = provide_attributes_at_sso(request, request.user, service,
+                    attribute_policy=policy)
+        except Exception:
+            logger.exception('get_cas_attributes: attributes of %s for %s '
+                    'could not be computed' % (request.user, service))
+            return {}
+        attributes = {}
+        for key, values in ((dic or {}).get('attributes') or {}).iteritems():
+            if isinstance(key, basestring):
+                name = key
+            elif len(key) > 2:
+                name = key[2]
+            else:
+                name = key[0]
+            if not ATTRIBUTE_NAME_RE.match(name):
+                logger.debug('get_cas_attributes: attribute %r cannot be '
+                        'released over CAS' % name)
+                continue
+            attributes.setdefault(name, []).extend(force_unicode(value)
+                    for value in values)
+        return attributes
@@ -0,0 +1,148 @@
+'''Cache of the OpenID associations used by DjangoOpenIDStore
+
+   Associations looked up by handle are kept in an in-process LRU cache and,
+   if the OPENID_ASSOCIATION_CACHE setting names a Django cache, in this
+   shared cache. Associations never change, but they can be removed: the
+   issue time of an association is also stored alone in the shared cache and
+   removed with it, so that every process forgets it.
+
+   Associations of the stateless mode (dumb mode) are removed by the first
+   check_authentication request, to prevent its replay, so they are never
+   kept in the in-process cache.
+'''
+
+import hashlib
+import logging
+import time
+
+import openid.association
+from django.conf import settings
+from django.core.cache import get_cache
+
+from authentic2.utils import LRUCache
+
+import models
+
+logger = logging.getLogger('authentic2.idp.idp_openid.association_cache')
+
+# Name of the Django cache shared between processes, None to only use the
+# in-process cache
+SHARED_CACHE = getattr(settings, 'OPENID_ASSOCIATION_CACHE', None)
+# Number of associations kept in the in-process cache
+LOCAL_CACHE_SIZE = getattr(settings, 'OPENID_ASSOCIATION_CACHE_SIZE', 1000)
+# Lifetime of the cached entries in seconds, without a shared cache it
+# bounds the time an association removed by another process is still used
+TIMEOUT = getattr(settings, 'OPENID_ASSOCIATION_CACHE_TIMEOUT', 300)
+
+_local = LRUCache(LOCAL_CACHE_SIZE, TIMEOUT)
+
+
+def get_shared_cache():
+    if SHARED_CACHE:
+        return get_cache(SHARED_CACHE)
+    return None
+
+
+def get_keys(server_url, handle):
+    '''Return the keys of the version and of the entry of an association in
+       the shared cache'''
+    if isinstance(handle, unicode):
+        handle = handle.encode('utf8')
+    digest = hashlib.sha1('%s\0%s' % (models.hash_server_url(server_url),
+        handle)).hexdigest()
+    return 'openid-association-version-%s' % digest, \
+        'openid-association-%s' % digest
+
+
+def to_entry(association):
+    return (association.handle, association.secret, association.issued,
+            association.lifetime, association.assoc_type)
+
+
+def to_association(entry):
+    handle, secret, issued, lifetime, assoc_type = entry
+    return openid.association.Association(handle=handle, secret=secret,
+            issued=issued, lifetime=lifetime, assoc_type=assoc_type)
+
+
+def get_timeout(entry):
+    '''Cache an entry until its association expires, TIMEOUT at most'''
+    handle, secret, issued, lifetime, assoc_type = entry
+    return max(min(int(issued + lifetime - time.time()), TIMEOUT), 1)
+
+
+def use_local_cache(server_url):
+    '''Return whether the associations of server_url can be kept in the
+       in-process cache, python-openid marks the server URL of the
+       associations of the stateless mode with a |dumb suffix'''
+    return not server_url.endswith('|dumb')
+
+
+def expired(entry):
+    handle, secret, issued, lifetime, assoc_type = entry
+    return issued + lifetime <= time.time()
+
+
+def get(server_url, handle=None):
+    '''Return the association of server_url with handle, or the last one
+       issued if handle is None, None if there is none or it expired.'''
+    if handle is None:
+        return models.Association.get_association(server_url)
+    local_key = (server_url, handle)
+    shared = get_shared_cache()
+    version = None
+    if shared is not None:
+        version_key, entry_key = get_keys(server_url, handle)
+        version = shared.get(version_key)
+    local = use_local_cache(server_url)
+    entry = None
+    if local:
+        entry = _local.get(local_key)
+    if entry is not None and (shared is None or entry[2] == version):
+        if expired(entry):
+            return None
+        return to_association(entry)
+    if version is not None:
+        entry = shared.get(entry_key)
+        if entry is not None and entry[2] == version:
+            if local:
+                _local.set(local_key, entry, get_timeout(entry))
+            if expired(entry):
+                return None
+            return to_association(entry)
+    association = models.Association.get_association(server_url, handle)
+    if association is None:
+        return None
+    put(server_url, association)
+    return association
+
+
+def put(server_url, association):
+    entry = to_entry(association)
+    timeout = get_timeout(entry)
+    if use_local_cache(server_url):
+        _local.set((server_url, association.handle), entry, timeout)
+    shared = get_shared_cache()
+    if shared is not None:
+        version_key, entry_key = get_keys(server_url, association.handle)
+        shared.set_many({version_key: entry[2], entry_key: entry}, timeout)
+
+
+def invalidate(server_url, handle):
+    _local.delete((server_url, handle))
+    shared = get_shared_cache()
+    if shared is not None:
+        shared.delete_many(get_keys(server_url, handle))
+
+
+def store_association(server_url, association):
+    models.Association.store_association(server_url, association)
+    put(server_url, association)
+
+
+def remove_association(server_url, handle):
+    '''Remove an association, return whether it existed'''
+    # delete the row first, so that a concurrent get() cannot cache it again
+    removed = models.Association.remove_association(server_url, handle)
+    invalidate(server_url, handle)
+    return removed
@@ -0,0 +1,61 @@
+# encoding: utf-8
+import datetime
+import hashlib
+import pickle
+from south.db import db
+from south.v2 import DataMigration
+from django.db import models
+
+class Migration(DataMigration):
+
+    def forwards(self, orm):
+        "Store the secrets base64 encoded instead of pickled, hash the server URLs"
+        for association in orm['idp_openid.Association'].objects.all():
+            server_url = association.server_url
+            if isinstance(server_url, unicode):
+                server_url = server_url.encode('utf8')
+            association.server_url_hash = hashlib.sha1(server_url).hexdigest()
+            association.secret = pickle.loads(str(association.secret)) \
+                    .encode('base64')
+            association.save()
+
+
+    def backwards(self, orm):
+        "Store the secrets pickled"
+        for association in orm['idp_openid.Association'].objects.all():
+            association.secret = pickle.dumps(
+                    str(association.secret).decode('base64'))
+            association.save()
+
+
+    models = {
+        'idp_openid.association': {
+            'Meta': {'unique_together': "(('server_url', 'handle'),)", 'object_name': 'Association'},
+            'assoc_type': ('django.db.models.fields.CharField', [], {'max_length': '64'}),
+            'expire': ('django.db.models.fields.DateTimeField', [], {}),
+            'handle': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'issued': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'lifetime': ('django.db.models.fields.IntegerField', [], {}),
+            'secret': ('django.db.models.fields.TextField', [], {}),
+            'server_url': ('django.db.models.fields.CharField', [], {'max_length': '2047'}),
+            'server_url_hash': ('django.db.models.fields.CharField', [], {'max_length': '40', 'db_index': 'True'})
+        },
+        'idp_openid.nonce': {
+            'Meta': {'unique_together': "(('server_url', 'salt'),)", 'object_name': 'Nonce'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'salt': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'server_url': ('django.db.models.fields.CharField', [], {'max_length': '2047'}),
+            'timestamp': ('django.db.models.fields.IntegerField', [], {})
+        },
+        'idp_openid.trustedroot': {
+            'Meta': {'object_name': 'TrustedRoot'},
+            'choices': ('authentic2.saml.fields.PickledObjectField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'trust_root': ('django.db.models.fields.CharField', [], {'max_length': '200'}),
+            'user': ('django.db.models.fields.CharField', [], {'max_length': '255'})
+        }
+    }
+
+    complete_apps = ['idp_openid']
+    symmetrical = True
@@ -0,0 +1,56 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+
+        # Adding index on 'Association', fields ['expire']
+        db.create_index('idp_openid_association', ['expire'])
+
+        # Adding index on 'Nonce', fields ['timestamp']
+        db.create_index('idp_openid_nonce', ['timestamp'])
+
+
+    def backwards(self, orm):
+
+        # Removing index on 'Nonce', fields ['timestamp']
+        db.delete_index('idp_openid_nonce', ['timestamp'])
+
+        # Removing index on 'Association', fields ['expire']
+        db.delete_index('idp_openid_association', ['expire'])
+
+
+    models = {
+        'idp_openid.association': {
+            'Meta': {'unique_together': "(('server_url', 'handle'),)", 'object_name': 'Association'},
+            'assoc_type': ('django.db.models.fields.CharField', [], {'max_length': '64'}),
+            'expire': ('django.db.models.fields.DateTimeField', [], {'db_index': 'True'}),
+            'handle': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'issued': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'lifetime': ('django.db.models.fields.IntegerField', [], {}),
+            'secret': ('django.db.models.fields.TextField', [], {}),
+            'server_url': ('django.db.models.fields.CharField', [], {'max_length': '2047'}),
+            'server_url_hash': ('django.db.models.fields.CharField', [], {'max_length': '40', 'db_index': 'True'})
+        },
+        'idp_openid.nonce': {
+            'Meta': {'unique_together': "(('server_url', 'salt'),)", 'object_name': 'Nonce'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'salt': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'server_url': ('django.db.models.fields.CharField', [], {'max_length': '2047'}),
+            'timestamp': ('django.db.models.fields.IntegerField', [], {'db_index': 'True'})
+        },
+        'idp_openid.trustedroot': {
+            'Meta': {'object_name': 'TrustedRoot'},
+            'choices': ('authentic2.saml.fields.PickledObjectField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'trust_root': ('django.db.models.fields.CharField', [], {'max_length': '200'}),
+            'user': ('django.db.models.fields.CharField', [], {'max_length': '255'})
+        }
+    }
+
+    complete_apps = ['idp_openid']
@@ -2,6 +2,7 @@
 # vim: set ts=4 sw=4 : */
 
 import datetime
+import hashlib
 import time
 import calendar
 
@@ -19,10 +20,34 @@ class TrustedRoot(models.Model):
     def __unicode__(self):
         return unicode(self.trust_root)
 
+class AssociationManager(models.Manager):
+    def cleanup(self, chunk_size=1000):
+        '''Delete the expired associations by chunks, return their number'''
+        now = datetime.datetime.utcnow()
+        deleted = 0
+        while True:
+            pks = list(self.filter(expire__lt=now)
+                    .values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            self.filter(pk__in=pks).delete()
+            deleted += len(pks)
+        return deleted
+
+def hash_server_url(server_url):
+    '''Return the SHA-1 of a server URL, associations are looked up by this
+       indexed hash instead of the long URL'''
+    if isinstance(server_url, unicode):
+        server_url = server_url.encode('utf8')
+    return hashlib.sha1(server_url).hexdigest()
+
 class Association(models.Model):
     server_url = models.CharField(max_length=2047, blank=False)
+    server_url_hash = models.CharField(max_length=40, db_index=True,
+            editable=False)
     handle = models.CharField(max_length=255, blank=False)
-    secret = PickledObjectField(editable=False)
+    '''The secret bytes, base64 encoded'''
+    secret = models.TextField(editable=False)
     issued = models.DateTimeField(editable=False,
             verbose_name="Issue time for this association, as seconds \
 since EPOCH")
@@ -30,16 +55,21 @@ since EPOCH")
             verbose_name="Lifetime of this association as seconds since \
 the issued time")
     expire = models.DateTimeField("After this time, the association will \
-be expired")
+be expired", db_index=True)
     assoc_type = models.CharField(max_length=64, blank=False)
 
+    objects = AssociationManager()
+
     class Meta:
         unique_together = ('server_url', 'handle')
 
     def save(self, *args, **kwargs):
-        '''Overload default save() method to compute the expire field'''
-        self.issued = datetime.datetime.today()
+        '''Overload default save() method to compute the expire and
+           server_url_hash fields, times are UTC'''
+        if self.issued is None:
+            self.issued = datetime.datetime.utcnow()
         self.expire = self.issued + datetime.timedelta(seconds=self.lifetime)
+        self.server_url_hash = hash_server_url(self.server_url)
         super(Association, self).save(*args, **kwargs)
 
     def to_association(self):
@@ -47,15 +77,21 @@ be expired")
            library.
         '''
         return openid.association.Association(handle=self.handle,
-                secret=self.secret,
+                secret=self.secret.decode('base64'),
                 issued=calendar.timegm(self.issued.utctimetuple()),
                 lifetime=self.lifetime,
                 assoc_type=self.assoc_type)
 
+    @classmethod
+    def filter_server_url(cls, server_url):
+        return cls.objects.filter(
+                server_url_hash=hash_server_url(server_url),
+                server_url=server_url)
+
     @classmethod
     def get_association(cls, server_url, handle=None):
         try:
-            filter = cls.objects.filter(server_url=server_url,
+            filter = cls.filter_server_url(server_url).filter(
                 expire__gt=datetime.datetime.utcnow())
             if handle is not None:
                 filter = filter.filter(handle=handle)
@@ -65,37 +101,45 @@ be expired")
 
     @classmethod
     def cleanup_associations(cls):
-        filter = cls.objects.filter(expire__lt=datetime.datetime.utcnow())
-        count = filter.count()
-        filter.delete()
-        return count
+        return cls.objects.cleanup()
 
     @classmethod
     def remove_association(cls, server_url, handle=None):
-        filter = cls.objects.filter(server_url=server_url)
+        filter = cls.filter_server_url(server_url)
         if handle is not None:
             filter = filter.filter(handle=handle)
-        filter.delete()
+        pks = list(filter.values_list('pk', flat=True))
+        cls.objects.filter(pk__in=pks).delete()
+        return bool(pks)
 
     @classmethod
     def store_association(cls, server_url, association):
         Association(server_url=server_url,
                 handle=association.handle,
-                secret=association.secret,
+                secret=association.secret.encode('base64'),
                 issued=datetime.datetime.utcfromtimestamp(association.issued),
                 lifetime=association.lifetime,
                 assoc_type=association.assoc_type).save()
 
 class NonceManager(models.Manager):
-    def cleanup(self):
+    def cleanup(self, chunk_size=1000):
+        '''Delete the nonces older than the allowed clock skew by chunks,
+           return their number'''
         expire = openid.store.nonce.SKEW
-        now = calendar.timegm(datetime.datetime.now().utctimetuple())
-        self.filter(timestamp__lt=now-expire).delete()
+        qs = self.filter(timestamp__lt=int(time.time())-expire)
+        deleted = 0
+        while True:
+            pks = list(qs.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            self.filter(pk__in=pks).delete()
+            deleted += len(pks)
+        return deleted
 
 class Nonce(models.Model):
     salt = models.CharField(max_length=40)
     server_url = models.CharField(max_length=2047)
-    timestamp = models.IntegerField()
+    timestamp = models.IntegerField(db_index=True)
 
     objects = NonceManager()
 
@@ -117,8 +161,4 @@ class Nonce(models.Model):
 
     @classmethod
     def cleanup_nonces(cls):
-        filter = cls.objects.filter(
-                timestamp_lt=time.time()-openid.store.nonce.SKEW)
-        count = filter.count()
-        filter.delete()
-        return count
+        return cls.objects.cleanup()
@@ -7,6 +7,7 @@ import openid.store.interface
 from django.conf import settings
 
 import models
+import association_cache
 from authentic2 import nonce
 
 
@@ -21,13 +22,13 @@ class DjangoOpenIDStore(openid.store.interface.OpenIDStore):
         nonce.cleanup_nonces()
 
     def storeAssociation(self, server_url, association):
-        return models.Association.store_association(server_url, association)
+        return association_cache.store_association(server_url, association)
 
     def getAssociation(self, server_url, handle=None):
-        return models.Association.get_association(server_url, handle)
+        return association_cache.get(server_url, handle)
 
     def removeAssociation(self, server_url, handle):
-        return models.Association.remove_association(server_url, handle)
+        return association_cache.remove_association(server_url, handle)
 
     def useNonce(self, server_url, timestamp, salt):
         now = time.time()
@@ -1,15 +1,19 @@
 import datetime
+import logging
 import sys
+import time
 
 from django.core.management.base import NoArgsCommand
 from django.db import models
 import django.core.management.commands.cleanup as cleanup
 
+logger = logging.getLogger('authentic2.idp.cleanup')
+
 class Command(NoArgsCommand):
     help = """Can be run as a cronjob or directly to clean out old data from the \
 database. It calls the cleanup() method of manager classes."""
 
-    def cleanup(self):
+    def cleanup(self, verbosity=1):
         all_models = [ ]
         for app in models.get_apps():
             all_models += [ m for m in models.get_models(app) ]
@@ -19,8 +23,21 @@ database. It calls the cleanup() method of manager classes."""
                 continue
             cleanup = getattr(manager, 'cleanup', None)
             if callable(cleanup):
-                manager.cleanup()
+                start = time.time()
+                deleted = manager.cleanup()
+                duration = time.time() - start
+                name = '%s.%s' % (model._meta.app_label,
+                        model._meta.object_name)
+                if deleted is None:
+                    message = '%s cleaned in %.2f seconds' % (name, duration)
+                else:
+                    message = '%s: %d rows deleted in %.2f seconds ' \
+                        '(%.0f rows/s)' % (name, deleted, duration,
+                                deleted / max(duration, 0.001))
+                logger.info('cleanup: %s' % message)
+                if verbosity > 1:
+                    print message
 
     def handle_noargs(self, **options):
-        self.cleanup()
+        self.cleanup(int(options.get('verbosity', 1)))
         cleanup.Command().execute(**options)
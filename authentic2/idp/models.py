@@ -1,6 +1,12 @@
+import threading
+import time
+from collections import namedtuple
+
 import lasso
 
+from django.conf import settings
 from django.db import models
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
@@ -242,19 +248,141 @@ class AttributePolicy(models.Model):
         return self.name
 
 
-def get_attribute_policy(provider):
+# Time in seconds the resolved attribute policies are kept, it bounds the
+# time a policy modified by another process stays stale
+POLICY_CACHE_TIMEOUT = getattr(settings, 'ATTRIBUTE_POLICY_CACHE_TIMEOUT', 60)
+
+# Read-only views of the attribute policies, attribute lists are resolved
+# into tuples of CompiledAttributeItem
+CompiledAttributeItem = namedtuple('CompiledAttributeItem',
+    'attribute_name output_name_format output_namespace required source')
+CompiledAttributeList = namedtuple('CompiledAttributeList',
+    'pk name attributes')
+CompiledAttributePolicy = namedtuple('CompiledAttributePolicy',
+    'pk name enabled ask_consent_attributes allow_attributes_selection '
+    'attribute_list_for_sso_from_pull_sources '
+    'forward_attributes_from_push_sources map_attributes_from_push_sources '
+    'output_name_format output_namespace '
+    'source_filter_for_sso_from_push_sources '
+    'attribute_filter_for_sso_from_push_sources '
+    'filter_source_of_filtered_attributes '
+    'map_attributes_of_filtered_attributes '
+    'send_error_and_no_attrs_if_missing_required_attrs')
+
+_policies_lock = threading.Lock()
+# lookup -> (version, expiration time, CompiledAttributePolicy or None)
+_policies = dict()
+_policies_version = 0
+
+
+def compile_attribute_list(attribute_list):
+    if attribute_list is None:
+        return None
+    return CompiledAttributeList(pk=attribute_list.pk,
+        name=attribute_list.name,
+        attributes=tuple(CompiledAttributeItem(
+                attribute_name=item.attribute_name,
+                output_name_format=item.output_name_format,
+                output_namespace=item.output_namespace,
+                required=item.required,
+                source=item.source)
+            for item in attribute_list.attributes.select_related('source')))
+
+
+def compile_attribute_policy(policy):
+    '''
+        Resolve an attribute policy, its lists and its sources into a
+        CompiledAttributePolicy.
+    '''
+    return CompiledAttributePolicy(pk=policy.pk,
+        name=policy.name,
+        enabled=policy.enabled,
+        ask_consent_attributes=policy.ask_consent_attributes,
+        allow_attributes_selection=policy.allow_attributes_selection,
+        attribute_list_for_sso_from_pull_sources=compile_attribute_list(
+            policy.attribute_list_for_sso_from_pull_sources),
+        forward_attributes_from_push_sources=\
+            policy.forward_attributes_from_push_sources,
+        map_attributes_from_push_sources=\
+            policy.map_attributes_from_push_sources,
+        output_name_format=policy.output_name_format,
+        output_namespace=policy.output_namespace,
+        source_filter_for_sso_from_push_sources=tuple(
+            policy.source_filter_for_sso_from_push_sources.all()),
+        attribute_filter_for_sso_from_push_sources=compile_attribute_list(
+            policy.attribute_filter_for_sso_from_push_sources),
+        filter_source_of_filtered_attributes=\
+            policy.filter_source_of_filtered_attributes,
+        map_attributes_of_filtered_attributes=\
+            policy.map_attributes_of_filtered_attributes,
+        send_error_and_no_attrs_if_missing_required_attrs=policy.\
+            send_error_and_no_attrs_if_missing_required_attrs)
+
+
+def get_compiled_attribute_policy(**lookup):
+    '''
+        Return the compiled attribute policy matching the lookup, or None,
+        from the cache if its version is current.
+    '''
+    key = tuple(sorted(lookup.items()))
+    now = time.time()
+    version = _policies_version
+    entry = _policies.get(key)
+    if entry is not None and entry[0] == version and entry[1] > now:
+        return entry[2]
     try:
-        return AttributePolicy.objects.get(name='All', enabled=True)
+        policy = AttributePolicy.objects.select_related(
+            'attribute_list_for_sso_from_pull_sources',
+            'attribute_filter_for_sso_from_push_sources').get(**lookup)
+        compiled = compile_attribute_policy(policy)
     except AttributePolicy.DoesNotExist:
-        pass
+        compiled = None
+    _policies_lock.acquire()
+    try:
+        # do not cache a policy modified while it was compiled
+        if version == _policies_version:
+            _policies[key] = (version, now + POLICY_CACHE_TIMEOUT, compiled)
+    finally:
+        _policies_lock.release()
+    return compiled
+
+
+def invalidate_attribute_policies(sender=None, **kwargs):
+    global _policies_version
+    _policies_lock.acquire()
+    try:
+        _policies_version += 1
+        _policies.clear()
+    finally:
+        _policies_lock.release()
+
+
+def get_attribute_policy(provider):
+    '''
+        Return the compiled attribute policy applying to a provider: the
+        policy named 'All' if enabled, else the policy of the service
+        provider if it follows one, else the policy named 'Default' if
+        enabled.
+    '''
+    policy = get_compiled_attribute_policy(name='All', enabled=True)
+    if policy:
+        return policy
     try:
         if provider.service_provider.enable_following_attribute_policy:
-            if provider.service_provider.attribute_policy:
-                return provider.service_provider.attribute_policy
+            if provider.service_provider.attribute_policy_id:
+                return get_compiled_attribute_policy(
+                    pk=provider.service_provider.attribute_policy_id)
     except:
         pass
-    try:
-        return AttributePolicy.objects.get(name='Default', enabled=True)
-    except AttributePolicy.DoesNotExist:
-        pass
-    return None
+    return get_compiled_attribute_policy(name='Default', enabled=True)
+
+
+for model in (AttributePolicy, AttributeList, AttributeItem, AttributeSource):
+    post_save.connect(invalidate_attribute_policies, sender=model,
+            dispatch_uid='attribute_policy_%s_saved' % model.__name__)
+    post_delete.connect(invalidate_attribute_policies, sender=model,
+            dispatch_uid='attribute_policy_%s_deleted' % model.__name__)
+for through in (AttributeList.attributes.through,
+        AttributePolicy.source_filter_for_sso_from_push_sources.through):
+    m2m_changed.connect(invalidate_attribute_policies, sender=through,
+            dispatch_uid='attribute_policy_%s_changed' % through.__name__)
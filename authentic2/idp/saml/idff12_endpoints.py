@@ -13,7 +13,7 @@ from django.core.urlresolvers import reverse
 from django.contrib.auth.models import User
 from django.conf import settings
 
-from authentic2.saml.models import LibertyArtifact
+from authentic2.saml import artifact_store
 from authentic2.saml.common import get_idff12_metadata, create_idff12_server, \
     load_provider, load_federation, load_session, save_federation, \
     save_session, return_idff12_response, get_idff12_request_message, \
@@ -58,9 +58,8 @@ def metadata(request):
             mimetype = 'text/xml')
 
 def save_artifact(request, login):
-    LibertyArtifact(artifact = login.assertionArtifact,
-            django_session_key = request.session.session_key,
-            provider_id = login.remoteProviderId).save()
+    artifact_store.save_artifact(login.assertionArtifact, '',
+            request.session.session_key, login.remoteProviderId)
 
 # TODO: handle cancellation, by retrieving a login event and looking for
 # cancelled flag
@@ -162,8 +161,9 @@ def sso_after_process_request(request, login,
         do_federation = True
     # 5. Lookup the federations
     if do_federation:
-        load_federation(request, login, user)
-        load_session(request, login)
+        load_federation(request, login, user,
+                provider_ids=[login.remoteProviderId])
+        load_session(request, login, provider_ids=[login.remoteProviderId])
         # 3. Build and assertion, fill attributes
         build_assertion(request, login)
     return finish_sso(request, login, user = user, save = save)
@@ -199,21 +199,20 @@ def artifact_resolve(request, soap_message):
     except:
         raise
     logging.debug('ID-FFv1.2 artifact resolve %r' % soap_message)
-    liberty_artifact = LibertyArtifact.objects.get(
-            artifact = login.assertionArtifact)
-    if liberty_artifact:
-        liberty_artifact.delete()
-        provider_id = liberty_artifact.provider_id
+    entry = artifact_store.pop_artifact(login.assertionArtifact)
+    if entry:
+        content, session_key, provider_id = entry
         load_provider(request, provider_id, server=login.server)
-        load_session(request, login,
-                session_key = liberty_artifact.django_session_key)
+        load_session(request, login, session_key = session_key,
+                provider_ids=[provider_id])
         logging.info('ID-FFv1.2 artifact resolve from %r for artifact %r' % (
                         provider_id, login.assertionArtifact))
     else:
          logging.warning('ID-FFv1.2 no artifact found for %r' % login.assertionArtifact)
          provider_id = None
+         session_key = None
     return finish_artifact_resolve(request, login, provider_id,
-            session_key = liberty_artifact.django_session_key)
+            session_key = session_key)
 
 def finish_artifact_resolve(request, login, provider_id, session_key = None):
     '''Finish artifact resolver processing:
@@ -270,7 +269,7 @@ def idp_sso(request, provider_id, user_id = None):
             return HttpResponseForbidden('You must be superuser to log as another user')
     else:
         user = request.user
-    load_federation(request, login, user)
+    load_federation(request, login, user, provider_ids=[provider_id])
     if not liberty_provider:
         message = _('ID-FFv1.2: provider %r unknown') % provider_id
         logging.warning('ID-FFv1.2: provider %r unknown' % provider_id)
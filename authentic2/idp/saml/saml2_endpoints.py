@@ -38,9 +38,11 @@ from django.utils.encoding import smart_unicode
 
 import authentic2.idp as idp
 import authentic2.idp.views as idp_views
+from authentic2.saml import artifact_store
+from authentic2.saml import session_store
 from authentic2.idp.models import get_attribute_policy
-from authentic2.saml.models import LibertyAssertion, LibertyArtifact, \
-    LibertySession, LibertyFederation, LibertySessionDump, \
+from authentic2.saml.models import LibertyAssertion, \
+    LibertySession, LibertyFederation, \
     nameid2kwargs, saml2_urn_to_nidformat, LIBERTY_SESSION_DUMP_KIND_SP, \
     nidformat_to_saml2_urn, save_key_values, get_and_delete_key_values, \
     LibertyProvider
@@ -57,10 +59,12 @@ from authentic2.saml.common import redirect_next, asynchronous_bindings, \
     AUTHENTIC_STATUS_CODE_UNKNOWN_SESSION, \
     AUTHENTIC_STATUS_CODE_INTERNAL_SERVER_ERROR, \
     AUTHENTIC_STATUS_CODE_UNAUTHORIZED, \
-    send_soap_request, get_saml2_query_request, \
+    send_soap_request, soap_call, get_saml2_query_request, \
     get_saml2_request_message_async_binding, create_saml2_server, \
-    get_saml2_metadata, get_sp_options_policy, get_idp_options_policy
+    get_saml2_metadata, get_sp_options_policy, get_idp_options_policy, \
+    get_entity_id
 import authentic2.saml.saml2utils as saml2utils
+from authentic2.saml import server_pool
 from authentic2.auth2_auth.models import AuthenticationEvent
 from common import redirect_to_login, kill_django_sessions
 from authentic2.auth2_auth import NONCE_FIELD_NAME
@@ -71,9 +75,18 @@ from authentic2.idp import signals as idp_signals
 
 from authentic2.authsaml2.models import SAML2TransientUser
 from authentic2.utils import cache_and_validate
+from authentic2 import executor
 
 logger = logging.getLogger('authentic2.idp.saml')
 
+# Relay SOAP logout requests to the service providers in parallel, each
+# provider is given SAML_SLO_SOAP_TIMEOUT seconds to answer
+SLO_SOAP_CONCURRENT = getattr(settings, 'SAML_SLO_SOAP_CONCURRENT', False)
+SLO_SOAP_TIMEOUT = getattr(settings, 'SAML_SLO_SOAP_TIMEOUT', 10)
+SLO_SOAP_WORKERS = getattr(settings, 'SAML_SLO_SOAP_WORKERS', 10)
+
+_slo_executor = executor.Executor(SLO_SOAP_WORKERS)
+
 metadata_map = (
         (saml2utils.Saml2Metadata.SINGLE_SIGN_ON_SERVICE,
             asynchronous_bindings, '/sso'),
@@ -343,7 +356,29 @@ def sso(request):
             "query string")
     logger.debug('sso: processing sso request %r' % message)
     policy = None
+    # The provider may already be resident in the pooled server, check it
+    # and set the signature check hint of its policy before processing the
+    # request
+    provider_id = lasso.profileGetIssuer(message)
     while True:
+        if provider_id and not policy:
+            logger.debug('sso: loading provider %s' % provider_id)
+            provider_loaded = load_provider(request, provider_id,
+                    server=login.server, autoload=True)
+            if not provider_loaded:
+                message = _('sso: fail to load unknown provider %s' \
+                    % provider_id)
+                return error_page(request, message, logger=logger)
+            policy = get_sp_options_policy(provider_loaded)
+            if not policy:
+                logger.error('sso: No policy defined')
+                return error_page(request, _('sso: No SP policy defined'),
+                    logger=logger)
+            logger.info('sso: provider %s loaded with success' \
+                % provider_id)
+            login.setSignatureVerifyHint(
+                    provider_loaded.service_provider.policy \
+                            .authn_request_signature_check_hint)
         try:
             login.processAuthnRequestMsg(message)
             break
@@ -370,25 +405,16 @@ def sso(request):
                 lasso.ProfileUnknownProviderError):
             logger.debug('sso: processAuthnRequestMsg not successful')
             log_info_authn_request_details(login)
-            provider_id = login.remoteProviderId
-            logger.debug('sso: loading provider %s' % provider_id)
-            provider_loaded = load_provider(request, provider_id,
-                    server=login.server, autoload=True)
-            if not provider_loaded:
+            if policy or not login.remoteProviderId:
+                # the issuer of the message is not the provider loaded
                 message = _('sso: fail to load unknown provider %s' \
-                    % provider_id)
+                    % login.remoteProviderId)
                 return error_page(request, message, logger=logger)
-            else:
-                policy = get_sp_options_policy(provider_loaded)
-                if not policy:
-                    logger.error('sso: No policy defined')
-                    return error_page(request, _('sso: No SP policy defined'),
-                        logger=logger)
-                logger.info('sso: provider %s loaded with success' \
-                    % provider_id)
-            login.setSignatureVerifyHint(
-                    provider_loaded.service_provider.policy \
-                            .authn_request_signature_check_hint)
+            provider_id = login.remoteProviderId
+    if not policy:
+        message = _('sso: fail to load unknown provider %s' \
+            % login.remoteProviderId)
+        return error_page(request, message, logger=logger)
     if not check_destination(request, login.request):
         logger.error('sso: wrong or absent destination')
         return return_login_error(request, login,
@@ -750,8 +776,10 @@ def sso_after_process_request(request, login, consent_obtained=False,
     try:
         if not transient:
             logger.debug('sso_after_process_request: load identity dump')
-            load_federation(request, login, user)
-        load_session(request, login)
+            load_federation(request, login, user,
+                    provider_ids=[login.remoteProviderId])
+        load_session(request, login,
+                provider_ids=[login.remoteProviderId])
         logger.debug('sso_after_process_request: load session')
         login.validateRequestMsg(not user.is_anonymous(), consent_obtained)
         logger.debug('sso_after_process_request: validateRequestMsg %s' \
@@ -827,24 +855,20 @@ def finish_sso(request, login, user=None, save=False):
 
 def save_artifact(request, login):
     '''Remember an artifact message for later retrieving'''
-    LibertyArtifact(artifact=login.artifact,
-            content=login.artifactMessage.decode('utf-8'),
-            django_session_key=request.session.session_key,
-            provider_id=login.remoteProviderId).save()
+    artifact_store.save_artifact(login.artifact,
+            login.artifactMessage.decode('utf-8'),
+            request.session.session_key, login.remoteProviderId)
     logger.debug('save_artifact: artifact saved')
 
 
 def reload_artifact(login):
-    try:
-        art = LibertyArtifact.objects.get(artifact=login.artifact)
-        logger.debug('reload_artifact: artifact found')
-        login.artifactMessage = art.content.encode('utf-8')
-        logger.debug('reload_artifact: artifact loaded')
-        art.delete()
-        logger.debug('reload_artifact: artifact deleted')
-    except ObjectDoesNotExist:
+    entry = artifact_store.pop_artifact(login.artifact)
+    if entry is None:
         logger.debug('reload_artifact: no artifact found')
-        pass
+        return
+    content, session_key, provider_id = entry
+    login.artifactMessage = content.encode('utf-8')
+    logger.debug('reload_artifact: artifact loaded')
 
 
 @csrf_exempt
@@ -857,21 +881,28 @@ def artifact(request):
     server = create_server(request)
     login = lasso.Login(server)
     try:
-        login.processRequestMsg(soap_message)
-    except (lasso.ProfileUnknownProviderError, lasso.ParamError):
-        if not load_provider(request, login.remoteProviderId,
-                server=login.server):
-            logger.error('artifact: provider loading failure')
         try:
             login.processRequestMsg(soap_message)
-        except lasso.DsError, e:
-            logger.error('artifact: signature error for %s: %s'
-                    % (e, login.remoteProviderId))
-        else:
-            logger.info('artifact: reloading artifact')
-            reload_artifact(login)
+        except (lasso.ProfileUnknownProviderError, lasso.ParamError):
+            if not load_provider(request, login.remoteProviderId,
+                    server=login.server):
+                logger.error('artifact: provider loading failure')
+            login.processRequestMsg(soap_message)
+    except lasso.DsError, e:
+        logger.error('artifact: signature error for %s: %s'
+                % (e, login.remoteProviderId))
     except:
         logger.exception('artifact: resolve error')
+    else:
+        # the provider may be resident in a pooled server, check that it is
+        # still enabled
+        if load_provider(request, login.remoteProviderId,
+                server=login.server):
+            logger.info('artifact: reloading artifact')
+            reload_artifact(login)
+        else:
+            logger.error('artifact: provider %s is not enabled'
+                    % login.remoteProviderId)
     try:
         login.buildResponseMsg(None)
         logger.debug('artifact: resolve response %s' % login.msgBody)
@@ -925,7 +956,7 @@ def idp_sso(request, provider_id, user_id=None, nid_format=None):
     else:
         user = request.user
         logger.info('idp_sso: sso by %r' % user.username)
-    load_federation(request, login, user)
+    load_federation(request, login, user, provider_ids=[provider_id])
     logger.debug('idp_sso: federation loaded')
     login.initIdpInitiatedAuthnRequest(provider_id)
     # Control assertion consumer binding
@@ -1024,6 +1055,15 @@ def process_logout_request(request, message, binding):
                 return logout, return_logout_error(request, logout,
                         AUTHENTIC_STATUS_CODE_UNKNOWN_PROVIDER)
             logout.processRequestMsg(message)
+        else:
+            # the provider was resident in a pooled server, check that it is
+            # still enabled
+            if not load_provider(request, logout.remoteProviderId,
+                    server=logout.server):
+                logger.error('process_logout_request: '
+                    'slo from disabled provider %s' % logout.remoteProviderId)
+                return logout, return_logout_error(request, logout,
+                        AUTHENTIC_STATUS_CODE_UNKNOWN_PROVIDER)
     except lasso.DsError:
         logger.error('process_logout_request: '
             'slo signature error on request %s' % message)
@@ -1090,18 +1130,22 @@ def get_only_last_session(name_id, session_indexes, but_provider):
     """
     logger.debug('get_only_last_session: %s %s' % (name_id.dump(),
         session_indexes))
-    lib_session1 = LibertySession.get_for_nameid_and_session_indexes(
-            name_id, session_indexes)
+    lib_session1 = list(LibertySession.get_for_nameid_and_session_indexes(
+            name_id, session_indexes))
     django_session_keys = [s.django_session_key for s in lib_session1]
-    lib_session = LibertySession.objects.filter(
-            django_session_key__in=django_session_keys)
-    providers = set([s.provider_id for s in lib_session])
+    # keep the most recent session of each provider, sessions are ordered by
+    # creation so later ones override earlier ones
+    latest = dict()
+    for pk, provider_id in LibertySession.objects \
+            .filter(django_session_key__in=django_session_keys) \
+            .exclude(provider_id=but_provider) \
+            .order_by('creation', 'pk') \
+            .values_list('pk', 'provider_id'):
+        latest[provider_id] = pk
     result = []
-    for provider in providers:
-        if provider != but_provider:
-            x = lib_session.filter(provider_id=provider)
-            latest = x.latest('creation')
-            result.append(latest)
+    if latest:
+        result = list(LibertySession.objects.select_related('assertion') \
+                .filter(pk__in=latest.values()))
     if lib_session1:
         logger.debug('get_only_last_session: last session %s' % lib_session1)
     return lib_session1, result, django_session_keys
@@ -1131,6 +1175,78 @@ def set_session_dump_from_liberty_sessions(profile, lib_sessions):
         % profile.session.dump())
 
 
+def relay_logout_sequentially(request, logout, lib_sessions):
+    '''Relay a logout request to the providers of lib_sessions one after
+       the other, with the logout profile of the initiating provider'''
+    for lib_session in lib_sessions:
+        try:
+            logger.info('slo_soap: slo, relaying logout to provider %s' \
+                % lib_session.provider_id)
+            '''
+                As we are in a synchronous binding, we need SOAP support
+            '''
+            logout.initRequest(lib_session.provider_id,
+                lasso.HTTP_METHOD_SOAP)
+            logout.buildRequestMsg()
+            if logout.msgBody:
+                logger.info('slo_soap: slo by SOAP')
+                soap_response = send_soap_request(request, logout)
+                logout.processResponseMsg(soap_response)
+            else:
+                logger.info('slo_soap: Provider does not support SOAP')
+        except:
+            logger.exception('slo_soap: slo, relaying to %s failed ' %
+                    lib_session.provider_id)
+
+
+def relay_logout_concurrently(request, logout, lib_sessions):
+    '''Relay a logout request to the providers of lib_sessions in parallel,
+       and return the list of the providers which did not confirm it.
+
+       Each provider gets its own logout profile holding its assertion. The
+       requests are built and the responses processed in the calling thread,
+       only the SOAP calls run on the worker threads, each given
+       SAML_SLO_SOAP_TIMEOUT seconds.'''
+    failed = []
+    profiles = dict()
+    tasks = []
+    for lib_session in lib_sessions:
+        provider_id = lib_session.provider_id
+        try:
+            sp_logout = lasso.Logout(logout.server)
+            set_session_dump_from_liberty_sessions(sp_logout, [lib_session])
+            sp_logout.initRequest(provider_id, lasso.HTTP_METHOD_SOAP)
+            sp_logout.buildRequestMsg()
+        except:
+            logger.exception('slo_soap: slo, building the request to %s '
+                'failed' % provider_id)
+            failed.append(provider_id)
+            continue
+        if not sp_logout.msgUrl or not sp_logout.msgBody:
+            logger.info('slo_soap: Provider %s does not support SOAP' \
+                % provider_id)
+            continue
+        logger.info('slo_soap: slo, relaying logout to provider %s' \
+            % provider_id)
+        profiles[provider_id] = sp_logout
+        tasks.append((provider_id, soap_call,
+            (sp_logout.msgUrl, sp_logout.msgBody, None), {},
+            SLO_SOAP_TIMEOUT))
+    answered = set()
+    for provider_id, soap_response in executor.run_concurrently(tasks,
+            SLO_SOAP_TIMEOUT, _slo_executor):
+        try:
+            profiles[provider_id].processResponseMsg(soap_response)
+        except:
+            logger.exception('slo_soap: slo, bad response from %s' \
+                % provider_id)
+            continue
+        answered.add(provider_id)
+    failed.extend(provider_id for provider_id in profiles
+        if provider_id not in answered)
+    return failed
+
+
 @csrf_exempt
 def slo_soap(request):
     """Endpoint for receiveing saml2:AuthnRequest by SOAP"""
@@ -1174,12 +1290,14 @@ def slo_soap(request):
         logger.debug('slo_soap: no third SP session found')
     else:
         logger.info('slo_soap: begin SP sessions processing...')
+        forwarded_sessions = []
         for lib_session in lib_sessions:
             p = load_provider(request, lib_session.provider_id,
                     server=logout.server)
             if not p:
                 logger.error('slo_soap: slo cannot logout provider %s, it is '
                     'no more known.' % lib_session.provider_id)
+                forwarded_sessions.append(lib_session)
                 continue
             else:
                 logger.info('slo_soap: provider %s loaded' % str(p))
@@ -1190,8 +1308,9 @@ def slo_soap(request):
                 elif not policy.forward_slo:
                     logger.info('slo_soap: %s configured to not reveive slo' \
                         % lib_session.provider_id)
-                if not policy or not policy.forward_slo:
-                    lib_sessions.remove(lib_session)
+                if policy and policy.forward_slo:
+                    forwarded_sessions.append(lib_session)
+        lib_sessions = forwarded_sessions
         set_session_dump_from_liberty_sessions(logout,
             found[0:1] + lib_sessions)
         try:
@@ -1207,47 +1326,38 @@ def slo_soap(request):
             logger.exception('slo_soap: slo, unknown error %s' % str(e))
             logout.buildResponseMsg()
             return return_saml2_response(request, logout)
-        for lib_session in lib_sessions:
-            try:
-                logger.info('slo_soap: slo, relaying logout to provider %s' \
-                    % lib_session.provider_id)
-                '''
-                    As we are in a synchronous binding, we need SOAP support
-                '''
-                logout.initRequest(lib_session.provider_id,
-                    lasso.HTTP_METHOD_SOAP)
-                logout.buildRequestMsg()
-                if logout.msgBody:
-                    logger.info('slo_soap: slo by SOAP')
-                    soap_response = send_soap_request(request, logout)
-                    logout.processResponseMsg(soap_response)
-                else:
-                    logger.info('slo_soap: Provider does not support SOAP')
-            except:
-                logger.exception('slo_soap: slo, relaying to %s failed ' %
-                        lib_session.provider_id)
+        if SLO_SOAP_CONCURRENT:
+            failed = relay_logout_concurrently(request, logout, lib_sessions)
+            if failed:
+                logger.warning('slo_soap: partial logout, relaying to %s '
+                    'failed' % ', '.join(failed))
+            if failed and logout.response:
+                set_saml2_response_responder_status_code(logout.response,
+                    lasso.SAML2_STATUS_CODE_PARTIAL_LOGOUT)
+        else:
+            relay_logout_sequentially(request, logout, lib_sessions)
 
     #Send SLO to IdP
     pid = None
-    q = LibertySessionDump. \
-            objects.filter(django_session_key__in=django_session_keys,
-                    kind=LIBERTY_SESSION_DUMP_KIND_SP)
-    if not q:
+    session_dumps = session_store.get_session_dumps(django_session_keys,
+            LIBERTY_SESSION_DUMP_KIND_SP)
+    if not session_dumps:
         logger.info('slo_soap: No session found for a third IdP')
     else:
         from authentic2.authsaml2 import saml2_endpoints
         server = saml2_endpoints.create_server(request)
         logout2 = lasso.Logout(server)
-        for s in q:
+        for session_dump in session_dumps:
             try:
-                lib_session = lasso.Session().newFromDump(s.session_dump)
+                lib_session = lasso.Session().newFromDump(session_dump)
             except:
-                logger.debug('slo_soap: Unable to load session %s' % s)
+                logger.debug('slo_soap: Unable to load session %s' \
+                    % session_dump)
             else:
                 try:
                     pid = lib_session.get_assertions().keys()[0]
                     logger.debug('slo_soap: SLO to %s' % pid)
-                    logout2.setSessionFromDump(s.session_dump.encode('utf8'))
+                    logout2.setSessionFromDump(session_dump.encode('utf8'))
                     provider = load_provider(request, pid,
                         server=server, sp_or_idp='idp')
                     policy = get_idp_options_policy(provider)
@@ -1532,24 +1642,18 @@ def get_metadata(request, provider_id=None):
             options=metadata_options)
 
 
-__cached_server = None
-
-
 def create_server(request, provider_id=None):
     '''Build a lasso.Server object using current settings for the IdP
 
-    The built lasso.Server is cached for later use it should work until
-    multithreading is used, then thread local storage should be used.
+    The built lasso.Server is kept by the server pool of the current thread,
+    with the providers already loaded into it, for later use.
     '''
-    global __cached_server
-    if __cached_server:
-        # clear loaded providers
-        __cached_server.providers = {}
-        return __cached_server
     provider_id, options = get_provider_id_and_options(request, provider_id)
-    __cached_server = create_saml2_server(request, provider_id,
-            idp_map=metadata_map, options=options)
-    return __cached_server
+    def factory():
+        return create_saml2_server(request, provider_id,
+                idp_map=metadata_map, options=options)
+    return server_pool.get_server(('saml2-idp',
+        get_entity_id(request, provider_id)), factory)
 
 
 def log_info_authn_request_details(login):
@@ -0,0 +1,182 @@
+import BaseHTTPServer
+import SocketServer
+import threading
+import time
+
+import lasso
+
+from django.test import TestCase
+from django.test.client import RequestFactory
+
+from authentic2.idp.saml import saml2_endpoints
+
+
+SUCCESS = '<Envelope><LogoutResponse status="Success"/></Envelope>'
+
+
+class SOAPStandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''Answer SOAP logout requests like a service provider, by path:
+       /ok answers at once, /slow answers after SLOW seconds and /fail
+       answers with a SOAP fault'''
+    SLOW = 2
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        status, body = 200, SUCCESS
+        if self.path == '/slow':
+            time.sleep(self.SLOW)
+        elif self.path == '/fail':
+            status, body = 500, '<Envelope><Fault/></Envelope>'
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+        BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class FakeLogout(object):
+    '''Logout profile of one service provider, its SOAP endpoint is the URL
+       of the stand-in given by its provider id'''
+
+    def __init__(self, server):
+        self.server = server
+        self.msgUrl = self.msgBody = None
+
+    def initRequest(self, provider_id, method):
+        self.msgUrl = self.server[provider_id]
+
+    def buildRequestMsg(self):
+        self.msgBody = '<Envelope><LogoutRequest/></Envelope>'
+
+    def processResponseMsg(self, message):
+        if message != SUCCESS:
+            raise lasso.Error('bad logout response')
+
+
+class FakeLibertySession(object):
+    def __init__(self, provider_id):
+        self.provider_id = provider_id
+
+
+class RelayLogoutConcurrentlyTest(TestCase):
+    TIMEOUT = 0.5
+
+    def setUp(self):
+        self.stand_in = ThreadingHTTPServer(('127.0.0.1', 0),
+                SOAPStandInHandler)
+        thread = threading.Thread(target=self.stand_in.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        self.saved = (lasso.Logout,
+                saml2_endpoints.set_session_dump_from_liberty_sessions,
+                saml2_endpoints.SLO_SOAP_TIMEOUT)
+        lasso.Logout = FakeLogout
+        saml2_endpoints.set_session_dump_from_liberty_sessions = \
+                lambda profile, lib_sessions: None
+        saml2_endpoints.SLO_SOAP_TIMEOUT = self.TIMEOUT
+
+    def tearDown(self):
+        lasso.Logout, saml2_endpoints.set_session_dump_from_liberty_sessions, \
+                saml2_endpoints.SLO_SOAP_TIMEOUT = self.saved
+        self.stand_in.shutdown()
+        self.stand_in.server_close()
+
+    def test_slow_and_failing_providers(self):
+        base = 'http://127.0.0.1:%d' % self.stand_in.server_port
+        endpoints = {
+            'https://ok.example.com/': base + '/ok',
+            'https://slow.example.com/': base + '/slow',
+            'https://fail.example.com/': base + '/fail',
+        }
+        # the IdP logout profile only lends its server to the profiles of
+        # the service providers
+        logout = FakeLogout(endpoints)
+        lib_sessions = [FakeLibertySession(provider_id)
+                for provider_id in sorted(endpoints)]
+        start = time.time()
+        failed = saml2_endpoints.relay_logout_concurrently(None, logout,
+                lib_sessions)
+        duration = time.time() - start
+        self.assertEqual(sorted(failed), ['https://fail.example.com/',
+            'https://slow.example.com/'])
+        # the slow provider was given up after SLO_SOAP_TIMEOUT
+        self.assertTrue(duration >= self.TIMEOUT)
+        self.assertTrue(duration < SOAPStandInHandler.SLOW)
+
+
+SP = 'https://sp.example.com/metadata'
+
+
+class FakeLogin(object):
+    '''Login profile recording the signature check hint used to process
+       each request'''
+    instances = []
+
+    def __init__(self, server):
+        self.server = server
+        self.hint = lasso.PROFILE_SIGNATURE_VERIFY_HINT_MAYBE
+        self.processed = []
+        self.remoteProviderId = None
+        self.request = None
+        self.instances.append(self)
+
+    def setSignatureVerifyHint(self, hint):
+        self.hint = hint
+
+    def processAuthnRequestMsg(self, message):
+        self.processed.append(self.hint)
+        self.remoteProviderId = SP
+
+
+class FakeObject(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class SsoSignatureHintTest(TestCase):
+    NAMES = ('get_saml2_request_message', 'create_server', 'load_provider',
+            'get_sp_options_policy', 'check_destination',
+            'return_login_error')
+
+    def setUp(self):
+        self.saved = [getattr(saml2_endpoints, name) for name in self.NAMES]
+        self.saved_lasso = (lasso.Login, lasso.profileGetIssuer)
+        self.loaded = []
+        hint = lasso.PROFILE_SIGNATURE_VERIFY_HINT_IGNORE
+        provider = FakeObject(service_provider=FakeObject(
+            policy=FakeObject(authn_request_signature_check_hint=hint)))
+        def load_provider(request, provider_id, server=None, autoload=False):
+            self.loaded.append(provider_id)
+            return provider
+        saml2_endpoints.get_saml2_request_message = lambda request: 'message'
+        saml2_endpoints.create_server = lambda request: 'server'
+        saml2_endpoints.load_provider = load_provider
+        saml2_endpoints.get_sp_options_policy = lambda provider: 'policy'
+        # stop after the processing of the request
+        saml2_endpoints.check_destination = lambda request, request_: False
+        saml2_endpoints.return_login_error = \
+                lambda request, login, error: login
+        FakeLogin.instances = []
+        lasso.Login = FakeLogin
+        lasso.profileGetIssuer = lambda message: SP
+
+    def tearDown(self):
+        for name, value in zip(self.NAMES, self.saved):
+            setattr(saml2_endpoints, name, value)
+        lasso.Login, lasso.profileGetIssuer = self.saved_lasso
+
+    def test_hint_set_before_processing(self):
+        request = RequestFactory().get('/idp/saml2/sso')
+        login = saml2_endpoints.sso(request)
+        self.assertEqual(FakeLogin.instances, [login])
+        self.assertEqual(self.loaded, [SP])
+        self.assertEqual(login.processed,
+                [lasso.PROFILE_SIGNATURE_VERIFY_HINT_IGNORE])
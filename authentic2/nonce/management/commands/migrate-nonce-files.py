@@ -0,0 +1,24 @@
+import datetime as dt
+import time
+
+from django.conf import settings
+from django.core.management.base import NoArgsCommand, CommandError
+
+from authentic2.nonce import utils
+
+
+class Command(NoArgsCommand):
+    '''Move the nonce files into the sharded layout'''
+    help = 'Move the nonces kept by previous versions of the filesystem ' \
+        'storage into its sharded directory layout'
+
+    def handle_noargs(self, **options):
+        mode = getattr(settings, 'NONCE_STORAGE', utils.STORAGE_MODEL)
+        if not mode.startswith(utils.STORAGE_FILESYSTEM):
+            raise CommandError('NONCE_STORAGE is not a filesystem storage')
+        start = time.time()
+        moved = utils.migrate_nonces_file_storage(
+                mode[len(utils.STORAGE_FILESYSTEM):], dt.datetime.now())
+        if int(options.get('verbosity', 1)) > 0:
+            print 'Moved %d nonces in %.2f seconds' % (moved,
+                    time.time() - start)
@@ -0,0 +1,37 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+
+        # Adding model 'Nonce'
+        db.create_table('nonce_nonce', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('value', self.gf('django.db.models.fields.CharField')(max_length=256)),
+            ('context', self.gf('django.db.models.fields.CharField')(max_length=256, null=True, blank=True)),
+            ('not_on_or_after', self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True)),
+        ))
+        db.send_create_signal('nonce', ['Nonce'])
+
+
+    def backwards(self, orm):
+
+        # Deleting model 'Nonce'
+        db.delete_table('nonce_nonce')
+
+
+    models = {
+        'nonce.nonce': {
+            'Meta': {'object_name': 'Nonce'},
+            'context': ('django.db.models.fields.CharField', [], {'max_length': '256', 'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'not_on_or_after': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'value': ('django.db.models.fields.CharField', [], {'max_length': '256'})
+        }
+    }
+
+    complete_apps = ['nonce']
@@ -0,0 +1,73 @@
+# encoding: utf-8
+import datetime
+import hashlib
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+def get_digest(value, context):
+    # frozen copy of authentic2.nonce.models.get_digest
+    if isinstance(value, unicode):
+        value = value.encode('utf8')
+    context = context or ''
+    if isinstance(context, unicode):
+        context = context.encode('utf8')
+    return hashlib.sha1('%s\0%s' % (value, context)).hexdigest()
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+
+        # Nonces without a context are now stored with an empty context
+        db.execute("UPDATE nonce_nonce SET context = '' WHERE context IS NULL")
+
+        # Adding field 'Nonce.digest'
+        db.add_column('nonce_nonce', 'digest', self.gf('django.db.models.fields.CharField')(default='', max_length=40), keep_default=False)
+
+        if not db.dry_run:
+            Nonce = orm['nonce.Nonce']
+            Nonce.objects.filter(not_on_or_after__lt=datetime.datetime.now()) \
+                    .delete()
+            for pk, value, context in Nonce.objects \
+                    .values_list('id', 'value', 'context').iterator():
+                Nonce.objects.filter(pk=pk) \
+                        .update(digest=get_digest(value, context))
+            # Keep the last of duplicated nonces
+            duplicates = Nonce.objects.values('digest') \
+                    .annotate(models.Count('id'), models.Max('id')) \
+                    .filter(id__count__gt=1)
+            for duplicate in duplicates:
+                Nonce.objects.filter(digest=duplicate['digest'],
+                        id__lt=duplicate['id__max']).delete()
+
+        # Adding unique constraint on 'Nonce', fields ['digest']
+        db.create_unique('nonce_nonce', ['digest'])
+
+        # Adding index on 'Nonce', fields ['not_on_or_after']
+        db.create_index('nonce_nonce', ['not_on_or_after'])
+
+
+    def backwards(self, orm):
+
+        # Removing index on 'Nonce', fields ['not_on_or_after']
+        db.delete_index('nonce_nonce', ['not_on_or_after'])
+
+        # Removing unique constraint on 'Nonce', fields ['digest']
+        db.delete_unique('nonce_nonce', ['digest'])
+
+        # Deleting field 'Nonce.digest'
+        db.delete_column('nonce_nonce', 'digest')
+
+
+    models = {
+        'nonce.nonce': {
+            'Meta': {'object_name': 'Nonce'},
+            'context': ('django.db.models.fields.CharField', [], {'max_length': '256', 'null': 'True', 'blank': 'True'}),
+            'digest': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '40'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'not_on_or_after': ('django.db.models.fields.DateTimeField', [], {'db_index': 'True', 'null': 'True', 'blank': 'True'}),
+            'value': ('django.db.models.fields.CharField', [], {'max_length': '256'})
+        }
+    }
+
+    complete_apps = ['nonce']
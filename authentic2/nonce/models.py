@@ -1,4 +1,5 @@
 import datetime as dt
+import hashlib
 
 from django.db import models
 
@@ -6,18 +7,45 @@ __all__ = ('Nonce',)
 
 _NONCE_LENGTH_CONSTANT = 256
 
+def get_digest(value, context):
+    '''Return the SHA-1 identifying a nonce in its context'''
+    if isinstance(value, unicode):
+        value = value.encode('utf8')
+    context = context or ''
+    if isinstance(context, unicode):
+        context = context.encode('utf8')
+    return hashlib.sha1('%s\0%s' % (value, context)).hexdigest()
+
 class NonceManager(models.Manager):
-    def cleanup(self, now=None):
+    def cleanup(self, now=None, chunk_size=1000):
+        '''Delete the expired nonces by chunks, return their number'''
         now = now or dt.datetime.now()
-        self.filter(not_on_or_after__lt=now).delete()
+        deleted = 0
+        while True:
+            pks = list(self.filter(not_on_or_after__lt=now)
+                    .values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            self.filter(pk__in=pks).delete()
+            deleted += len(pks)
+        return deleted
 
 class Nonce(models.Model):
     value = models.CharField(max_length=_NONCE_LENGTH_CONSTANT)
     context = models.CharField(max_length=_NONCE_LENGTH_CONSTANT, blank=True,
             null=True)
-    not_on_or_after = models.DateTimeField(blank=True, null=True)
+    not_on_or_after = models.DateTimeField(blank=True, null=True,
+            db_index=True)
+    # get_digest() of value and context, accept_nonce_model() relies on its
+    # unique constraint; a constraint on (value, context) would exceed the
+    # maximum key length of MySQL
+    digest = models.CharField(max_length=40, unique=True)
 
     objects  = NonceManager()
 
+    def save(self, *args, **kwargs):
+        self.digest = get_digest(self.value, self.context)
+        super(Nonce, self).save(*args, **kwargs)
+
     def __unicode__(self):
         return self.value
@@ -2,10 +2,11 @@ import os.path
 import datetime as dt
 from calendar import timegm
 import tempfile
-import glob
 import errno
 
 from django.conf import settings
+from django.core.cache import get_cache
+from django.db import transaction, IntegrityError
 
 import models
 
@@ -13,6 +14,7 @@ __all__ = ('accept_nonce', 'cleanup_nonces')
 
 STORAGE_MODEL = 'model'
 STORAGE_FILESYSTEM = 'fs:'
+STORAGE_CACHE = 'cache:'
 
 def compute_not_on_or_after(now, not_on_or_after):
     try: # first try integer semantic
@@ -37,15 +39,85 @@ def unlink_if_exists(path):
         if e.errno != errno.ENOENT:
             raise
 
+def makedirs_if_not_exist(path):
+    try:
+        os.makedirs(path)
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
+
+# The filesystem storage keeps each nonce in a file named by the hash of its
+# value and context, under two levels of directories named by the first
+# characters of the hash, so that no directory grows too large:
+#
+#     <path>/nonces/ab/cd/abcdef...
+#
+# The last modification time of the file is its expiration timestamp. A
+# nonce which expires is also linked into the bucket of its expiration time,
+# so that cleanup only visits the buckets which have expired:
+#
+#     <path>/buckets/<timestamp of the start of the bucket>/abcdef...
+#
+# Nonces without expiration are kept forever and are not put in a bucket.
+
+NONCES_DIR = 'nonces'
+BUCKETS_DIR = 'buckets'
+# Duration in seconds covered by an expiration bucket
+BUCKET_DURATION = getattr(settings, 'NONCE_FILESYSTEM_BUCKET_DURATION', 3600)
+# Expiration timestamp of the nonces without expiration
+NEVER = 0x7FFFFFFF
+
+# the storages identify a nonce by the same digest
+nonce_hash = models.get_digest
+
+def nonce_file_path(path, name):
+    return os.path.join(path, NONCES_DIR, name[:2], name[2:4], name)
+
+def bucket_path(path, mtime):
+    bucket = int(mtime) - int(mtime) % BUCKET_DURATION
+    return os.path.join(path, BUCKETS_DIR, str(bucket))
+
+def store_nonce_file(path, name, mtime):
+    '''
+       Create the file of a nonce expiring at mtime, return False if it
+       already exists.
+    '''
+    file_path = nonce_file_path(path, name)
+    shard_path = os.path.dirname(file_path)
+    makedirs_if_not_exist(shard_path)
+    # the file is created then linked, so that the nonce appears atomically
+    # with its expiration time
+    temp_file = tempfile.NamedTemporaryFile(dir=shard_path, delete=False)
+    temp_file.close()
+    try:
+        os.utime(temp_file.name, (mtime, mtime))
+        try:
+            os.link(temp_file.name, file_path)
+        except OSError, e:
+            if e.errno == errno.EEXIST:
+                return False
+            raise
+        if mtime != NEVER:
+            bucket = bucket_path(path, mtime)
+            makedirs_if_not_exist(bucket)
+            try:
+                os.link(temp_file.name, os.path.join(bucket, name))
+            except OSError, e:
+                # an expired nonce is still linked into its bucket
+                if e.errno != errno.EEXIST:
+                    raise
+    finally:
+        unlink_if_exists(temp_file.name)
+    return True
+
 def accept_nonce_file_storage(path, now, value, context=None,
         not_on_or_after=None):
     '''
        Use a directory as a storage for nonce-context values. The last
        modification time is used to store the expiration timestamp.
     '''
-    now = dt.datetime.now()
-    filename = '%s_%s' % (value.encode('base64'), context.encode('base64'))
-    file_path = os.path.join(path, filename)
+    name = nonce_hash(value, context)
+    file_path = nonce_file_path(path, name)
     # test if the file exists
     try:
         stat = os.stat(file_path)
@@ -62,55 +134,142 @@ def accept_nonce_file_storage(path, now, value, context=None,
             # not too old, the nonce is unacceptable
             return False
 
-    temp_file = tempfile.NamedTemporaryFile(dir=path, delete=False)
-    temp_file.close()
-
     if not_on_or_after:
         not_on_or_after = compute_not_on_or_after(now, not_on_or_after)
         mtime = timegm(not_on_or_after.utctimetuple())
     else:
-        mtime = 0x7FFF
-    try:
-        os.utime(temp_file.name, (mtime, mtime))
-    except OSError:
-        unlink_if_exists(temp_file.name)
-        raise
-    try:
-        os.link(temp_file.name, file_path)
-    except OSError, e:
-        if e.eerno == errno.EEXIST:
-            unlink_if_exists(temp_file.name)
-        return False
-    return True
+        mtime = NEVER
+    return store_nonce_file(path, name, mtime)
 
 def accept_nonce_model(now, value, context=None, not_on_or_after=None):
+    '''
+       Insert the nonce, the unique constraint on the digest of (value,
+       context) rejects replays. An expired nonce is taken over by an update
+       conditioned on its expiration, so that only one concurrent request
+       can succeed.
+    '''
     if not_on_or_after:
         not_on_or_after = compute_not_on_or_after(now, not_on_or_after)
-    nonce, created = models.Nonce.objects.get_or_create(value=value,
-            context=context)
-    if created or (nonce.not_on_or_after and nonce.not_on_or_after < now):
-        nonce.not_on_or_after = not_on_or_after
-        nonce.save()
-        return True
+    context = context or ''
+    sid = transaction.savepoint()
+    try:
+        models.Nonce(value=value, context=context,
+                not_on_or_after=not_on_or_after).save(force_insert=True)
+    except IntegrityError:
+        transaction.savepoint_rollback(sid)
     else:
-        return False
+        transaction.savepoint_commit(sid)
+        return True
+    return models.Nonce.objects.filter(
+            digest=models.get_digest(value, context),
+            not_on_or_after__lt=now) \
+                    .update(not_on_or_after=not_on_or_after) == 1
+
+# Longest timeout of the cache storage, memcached interprets longer timeouts
+# as absolute timestamps
+MAX_CACHE_TIMEOUT = 30 * 86400
+
+def accept_nonce_cache(cache_name, now, value, context=None,
+        not_on_or_after=None):
+    '''
+       Use a Django cache shared by all the nodes as a storage, add() is
+       atomic so only the first request adding a nonce succeeds. The cache
+       expires the nonces itself, nonces without expiration are kept for
+       MAX_CACHE_TIMEOUT seconds at most.
+    '''
+    timeout = MAX_CACHE_TIMEOUT
+    if not_on_or_after:
+        delta = compute_not_on_or_after(now, not_on_or_after) - now
+        timeout = min(delta.days * 86400 + delta.seconds, timeout)
+        if timeout <= 0:
+            # the nonce has already expired
+            return True
+    cache = get_cache(cache_name or 'default')
+    return cache.add('nonce-%s' % nonce_hash(value, context), True, timeout)
 
 def cleanup_nonces_file_storage(dir_path, now):
-    for nonce_path in glob.iglob(os.path.join(dir_path, '*')):
-        now_time = timegm(now.utctimetuple())
+    '''
+       Remove the buckets which have expired, and the expired nonces linked
+       into them. Nonces accepted again since are linked into a later bucket
+       and have a later expiration, they are kept.
+    '''
+    now_time = timegm(now.utctimetuple())
+    buckets_path = os.path.join(dir_path, BUCKETS_DIR)
+    try:
+        buckets = os.listdir(buckets_path)
+    except OSError, e:
+        if e.errno == errno.ENOENT:
+            return
+        raise
+    for bucket in buckets:
         try:
-            stat = os.stat(nonce_path)
+            if int(bucket) + BUCKET_DURATION > now_time:
+                continue
+        except ValueError:
+            continue
+        bucket = os.path.join(buckets_path, bucket)
+        try:
+            names = os.listdir(bucket)
         except OSError, e:
             if e.errno == errno.ENOENT:
                 continue
             raise
-        if stat.st_mtime < now_time:
+        for name in names:
+            nonce_path = nonce_file_path(dir_path, name)
             try:
-                os.unlink(nonce_path)
+                stat = os.stat(nonce_path)
+            except OSError, e:
+                if e.errno != errno.ENOENT:
+                    raise
+            else:
+                if stat.st_mtime < now_time:
+                    unlink_if_exists(nonce_path)
+            unlink_if_exists(os.path.join(bucket, name))
+        try:
+            os.rmdir(bucket)
+        except OSError, e:
+            # a nonce was linked into the bucket meanwhile, it will be
+            # removed by the next cleanup
+            if e.errno not in (errno.ENOENT, errno.ENOTEMPTY, errno.EEXIST):
+                raise
+
+def migrate_nonces_file_storage(dir_path, now):
+    '''
+       Move the nonces kept by previous versions as files directly in
+       dir_path, named by the base64 encoding of their value and context,
+       into the sharded layout. Expired nonces and temporary files left
+       behind are removed. Return the number of nonces moved.
+    '''
+    now_time = timegm(now.utctimetuple())
+    moved = 0
+    for filename in os.listdir(dir_path):
+        file_path = os.path.join(dir_path, filename)
+        if not os.path.isfile(file_path):
+            continue
+        if filename.endswith('\n') and '\n_' in filename:
+            value, context = filename.split('\n_', 1)
+            try:
+                value = (value + '\n').decode('base64')
+                context = context.decode('base64')
+            except Exception:
+                continue
+            try:
+                mtime = int(os.stat(file_path).st_mtime)
             except OSError, e:
                 if e.errno == errno.ENOENT:
                     continue
                 raise
+            if mtime == 0x7FFF:
+                # previous versions used this expiration for nonces kept
+                # forever
+                mtime = NEVER
+            if mtime >= now_time and store_nonce_file(dir_path,
+                    nonce_hash(value, context), mtime):
+                moved += 1
+        elif not filename.startswith('tmp'):
+            continue
+        unlink_if_exists(file_path)
+    return moved
 
 def cleanup_nonces(now=None):
     '''
@@ -127,9 +286,12 @@ def cleanup_nonces(now=None):
     models.Nonce.objects.cleanup(now)
     if mode == STORAGE_MODEL:
         pass
-    if mode.startswith(STORAGE_FILESYSTEM):
+    elif mode.startswith(STORAGE_FILESYSTEM):
         dir_path = mode[len(STORAGE_FILESYSTEM):]
         return cleanup_nonces_file_storage(dir_path, now)
+    elif mode.startswith(STORAGE_CACHE):
+        # the cache expires the nonces itself
+        pass
     else:
         raise ValueError('Invalid NONCE_STORAGE setting: %r' % mode)
 
@@ -143,6 +305,10 @@ def accept_nonce(value, context=None, not_on_or_after=None, now=None):
        acceptable length for the value and the context. For example the model
        storage backend limits the length of those strings to 256 bytes.
 
+       The storage is chosen by the NONCE_STORAGE setting: 'model', the
+       default, 'fs:<directory path>' or 'cache:<cache name>', the cache
+       name defaulting to 'default'.
+
        :param value:
            a string representing a nonce value.
        :param context:
@@ -171,5 +337,9 @@ def accept_nonce(value, context=None, not_on_or_after=None, now=None):
         dir_path = mode[len(STORAGE_FILESYSTEM):]
         return accept_nonce_file_storage(dir_path, now, value,
                 context=context, not_on_or_after=not_on_or_after)
+    elif mode.startswith(STORAGE_CACHE):
+        cache_name = mode[len(STORAGE_CACHE):]
+        return accept_nonce_cache(cache_name, now, value, context=context,
+                not_on_or_after=not_on_or_after)
     else:
         raise ValueError('Invalid NONCE_STORAGE setting: %r' % mode)
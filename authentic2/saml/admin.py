@@ -13,10 +13,11 @@ from authentic2.saml.models import LibertyIdentityProvider, IdPOptionsSPPolicy
 from authentic2.saml.models import SPOptionsIdPPolicy
 from authentic2.saml.models import AuthorizationSPPolicy, AuthorizationAttributeMap
 from authentic2.saml.models import AuthorizationAttributeMapping, LibertyProviderPolicy
-from authentic2.saml.models import LibertySessionDump, LibertyIdentityDump, LibertyFederation
+from authentic2.saml.models import LibertySessionDump, LibertyIdentityDump, LibertyFederation, \
+    LibertySessionAssertion, LibertyFederationDump
 from authentic2.saml.models import LibertyAssertion, LibertySessionSP, KeyValue
 from authentic2.saml.models import LibertySession
-from authentic2.http_utils import get_url
+from authentic2.saml import metadata_refresh
 
 logger = logging.getLogger(__name__)
 
@@ -140,11 +141,8 @@ def update_metadata(modeladmin, request, queryset):
     for provider in queryset:
         if provider.entity_id.startswith('http'):
             try:
-                data = get_url(provider.entity_id)
-                if data != provider.metadata:
-                    provider.metadata = data
+                if metadata_refresh.refresh_provider(provider, force=True):
                     updated.append(provider.entity_id)
-                    provider.save()
             except (urllib2.URLError, IOError), e:
                 messages.error(request, _('Failure to resolve %s: %s') %
                         (provider.entity_id, e))
@@ -190,7 +188,9 @@ admin.site.register(LibertyProviderPolicy, LibertyProviderPolicyAdmin)
 
 if settings.DEBUG:
     admin.site.register(LibertySessionDump)
+    admin.site.register(LibertySessionAssertion)
     admin.site.register(LibertyIdentityDump)
+    admin.site.register(LibertyFederationDump)
     admin.site.register(LibertyFederation)
     admin.site.register(LibertySession)
     admin.site.register(LibertyAssertion)
@@ -0,0 +1,98 @@
+'''Storage of the SAML 2.0 and ID-FF 1.2 artifacts until their resolution
+
+   Artifacts are read once, a few seconds after their emission. The store is
+   chosen by the SAML_ARTIFACT_STORE setting, the dotted path of one of:
+
+    - ModelArtifactStore, the default, keeps the artifacts as LibertyArtifact
+      rows, expired ones are removed by the cleanup command,
+    - CacheArtifactStore keeps them in the Django cache named by the
+      SAML_ARTIFACT_CACHE setting, which expires them itself.
+
+   Artifacts expire after SAML2_ARTIFACT_EXPIRATION seconds.
+'''
+
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import get_cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.importlib import import_module
+
+from authentic2.saml.models import LibertyArtifact
+
+logger = logging.getLogger('authentic2.saml.artifact_store')
+
+STORE = getattr(settings, 'SAML_ARTIFACT_STORE',
+        'authentic2.saml.artifact_store.ModelArtifactStore')
+CACHE = getattr(settings, 'SAML_ARTIFACT_CACHE', 'default')
+EXPIRATION = getattr(settings, 'SAML2_ARTIFACT_EXPIRATION', 600)
+
+
+class ModelArtifactStore(object):
+    def save(self, artifact, content, session_key, provider_id):
+        LibertyArtifact(artifact=artifact, content=content,
+                django_session_key=session_key,
+                provider_id=provider_id).save()
+
+    def pop(self, artifact):
+        try:
+            liberty_artifact = LibertyArtifact.objects.get(artifact=artifact)
+        except LibertyArtifact.DoesNotExist:
+            return None
+        liberty_artifact.delete()
+        return (liberty_artifact.content,
+                liberty_artifact.django_session_key,
+                liberty_artifact.provider_id)
+
+
+class CacheArtifactStore(object):
+    def __init__(self):
+        self.cache = get_cache(CACHE)
+
+    def get_keys(self, artifact):
+        if isinstance(artifact, unicode):
+            artifact = artifact.encode('utf8')
+        digest = hashlib.sha1(artifact).hexdigest()
+        return 'saml-artifact-%s' % digest, 'saml-artifact-used-%s' % digest
+
+    def save(self, artifact, content, session_key, provider_id):
+        key, used_key = self.get_keys(artifact)
+        self.cache.set(key, (content, session_key, provider_id), EXPIRATION)
+
+    def pop(self, artifact):
+        key, used_key = self.get_keys(artifact)
+        # add() is atomic, only one resolution of an artifact can succeed
+        if not self.cache.add(used_key, True, EXPIRATION):
+            logger.warning('pop: artifact %r already resolved' % artifact)
+            return None
+        entry = self.cache.get(key)
+        self.cache.delete(key)
+        return entry
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        package, name = STORE.rsplit('.', 1)
+        try:
+            store_class = getattr(import_module(package), name)
+        except (ImportError, AttributeError):
+            raise ImproperlyConfigured('SAML artifact store %r could not be '
+                    'imported' % STORE)
+        _store = store_class()
+    return _store
+
+
+def save_artifact(artifact, content, session_key, provider_id):
+    '''Remember an artifact and the message it references'''
+    get_store().save(artifact, content, session_key, provider_id)
+
+
+def pop_artifact(artifact):
+    '''Return the (content, session key, provider id) of an artifact and
+       forget it, None if it is unknown, expired or already resolved'''
+    return get_store().pop(artifact)
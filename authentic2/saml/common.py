@@ -1,7 +1,5 @@
 import urlparse
 import os.path
-import urllib
-import httplib
 import logging
 import re
 import datetime
@@ -17,8 +15,8 @@ from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.core.exceptions import ObjectDoesNotExist
 
-from authentic2.saml.models import LibertyFederation, LibertyIdentityDump, LibertyProvider, \
-    LibertyManageDump, LibertySessionDump, LibertyServiceProvider, \
+from authentic2.saml.models import LibertyFederation, LibertyProvider, \
+    LibertyManageDump, LibertyServiceProvider, \
     LibertyIdentityProvider, LibertySessionSP, IdPOptionsSPPolicy, \
     SPOptionsIdPPolicy, \
     AuthorizationSPPolicy, AuthorizationAttributeMapping, \
@@ -26,9 +24,14 @@ from authentic2.saml.models import LibertyFederation, LibertyIdentityDump, Liber
 from authentic2.saml import models
 from authentic2.saml import saml2utils
 from authentic2.saml import saml11utils
+from authentic2.saml import server_pool
+from authentic2.saml import provider_cache
+from authentic2.saml import metadata_refresh
+from authentic2.saml import soap_pool
+from authentic2.saml import session_store
+from authentic2.saml import identity_store
 
 from authentic2.authsaml2 import signals
-from authentic2.http_utils import get_url
 from .. import nonce
 
 AUTHENTIC_STATUS_CODE_NS = "http://authentic.entrouvert.org/status_code/"
@@ -265,45 +268,32 @@ def return_idff12_request(request, profile, title = ''):
 # LassoSession) holding all the datas, to manipulate them at row Level with
 # LibertyFederation and LibertyAssertion objects.
 
-def load_federation(request, login, user = None):
-    '''Load an identity dump from the database'''
+def load_federation(request, login, user = None, provider_ids=None):
+    '''Load an identity from the database, only with the federations with
+       provider_ids if not None'''
     if not user:
         user = request.user
     logger.debug('load_federation: user is %s' %user.username)
-    try:
-        q = LibertyIdentityDump.objects.get(user = user)
-        logger.debug('load_federation: identity dump found %s' %q.identity_dump.encode('utf8'))
-    except ObjectDoesNotExist:
-        pass
-    else:
-        login.setIdentityFromDump(q.identity_dump.encode('utf8'))
+    identity_store.load_identity(login, user, provider_ids)
+    if login.identity:
         logger.debug('load_federation: set identity from dump done %s' %login.identity.dump())
 
 def load_session(request, login, session_key = None,
-        kind=LIBERTY_SESSION_DUMP_KIND_IDP):
-    '''Load a session dump from the database'''
+        kind=LIBERTY_SESSION_DUMP_KIND_IDP, provider_ids=None):
+    '''Load a session from the database, only with the assertions of
+       provider_ids if not None'''
     if not session_key:
         session_key = request.session.session_key
-    try:
-        q = LibertySessionDump.objects.get(django_session_key=session_key,
-                kind=kind)
-        logger.debug('load_session: session dump found %s' %q.session_dump.encode('utf8'))
-        login.setSessionFromDump(q.session_dump.encode('utf8'))
+    session_store.load_session(login, session_key, kind, provider_ids)
+    if login.session:
         logger.debug('load_session: set session from dump done %s' %login.session.dump())
-    except ObjectDoesNotExist:
-        pass
 
 def save_federation(request, login, user = None):
     '''Save identity dump to database'''
     if not user:
         user = request.user
     if login.isIdentityDirty:
-        q, creation = LibertyIdentityDump.objects.get_or_create(user = user)
-        if login.identity:
-            q.identity_dump = login.identity.dump()
-        else:
-            q.identity_dump = None
-        q.save()
+        identity_store.save_identity(login, user)
 
 def save_session(request, login, session_key=None,
         kind=LIBERTY_SESSION_DUMP_KIND_IDP):
@@ -311,19 +301,12 @@ def save_session(request, login, session_key=None,
     if not session_key:
         session_key = request.session.session_key
     if login.isSessionDirty:
-        q, creation = LibertySessionDump.objects.get_or_create(
-                django_session_key=session_key, kind=kind)
-        if login.session:
-            q.session_dump = login.session.dump()
-        else:
-            q.session_dump = None
-        q.save()
+        session_store.save_session(login, session_key, kind)
 
 def delete_session(request):
     '''Delete all liberty sessions for a django session'''
     try:
-        LibertySessionDump.objects.\
-            filter(django_session_key = request.session.session_key).delete()
+        session_store.delete_sessions([request.session.session_key])
     except Exception, e:
         logger.error('delete_session: Exception %s' % str(e))
 
@@ -346,19 +329,20 @@ def retrieve_metadata_and_create(request, provider_id, sp_or_idp):
         logger.debug('not an http url, failing')
         return None
     # Try the WKL
+    source = metadata_refresh.get_source(provider_id)
+    # forget the validators, the content is needed even if unchanged
+    source.etag = source.last_modified = source.digest = ''
     try:
-        metadata = get_url(provider_id)
+        metadata = metadata_refresh.fetch(source)
+    except UnicodeDecodeError:
+        logging.error('SAML metadata autoload: retrieved metadata \
+for entity id %r is not UTF-8' % provider_id)
+        return None
     except Exception, e:
         logging.error('SAML metadata autoload: failure to retrieve metadata '
                 'for entity id %r: %s' % (provider_id, e))
         return None
-    logger.debug('loaded %d bytes' % len(metadata))
-    try:
-        metadata = unicode(metadata, 'utf8')
-    except:
-        logging.error('SAML metadata autoload: retrieved metadata \
-for entity id %r is not UTF-8' % provider_id)
-        return None
+    logger.debug('loaded %d characters' % len(metadata))
     p = LibertyProvider(metadata=metadata)
     try:
         p.full_clean(exclude=['entity_id','protocol_conformance'])
@@ -370,6 +354,7 @@ for entity id %r are invalid, %s' % (provider_id, e.args))
         logging.exception('SAML metadata autoload: retrieved metadata validation raised an unknown exception')
         return None
     p.save()
+    source.save()
     logger.debug('%s saved' % p)
     if sp_or_idp == 'sp':
         s = LibertyServiceProvider(liberty_provider=p, enabled=True)
@@ -392,36 +377,30 @@ def load_provider(request, provider_id, server=None, sp_or_idp='sp',
        sp_or_idp -- kind of the provider we are looking for, can be 'sp' or 'idp',
        default to 'sp'
     '''
-    try:
-        liberty_provider = LibertyProvider.objects.get(entity_id=provider_id)
-    except LibertyProvider.DoesNotExist:
+    liberty_provider = provider_cache.get(provider_id)
+    if liberty_provider is None:
         autoload = getattr(settings, 'SAML_METADATA_AUTOLOAD', 'none')
         if autoload and (autoload == 'sp' or autoload == 'both'):
             liberty_provider = retrieve_metadata_and_create(request, provider_id, sp_or_idp)
             if not liberty_provider:
                 return False
+            liberty_provider = provider_cache.get(liberty_provider.entity_id)
+            if liberty_provider is None:
+                return False
         else:
             return False
     if sp_or_idp == 'sp':
-        try:
-            service_provider = liberty_provider.service_provider
-        except LibertyServiceProvider.DoesNotExist:
-            return False
-        if not service_provider.enabled:
+        if not provider_cache.has_role(liberty_provider, 'sp'):
             return False
         if server:
-            server.addProviderFromBuffer(lasso.PROVIDER_ROLE_SP,
-                    liberty_provider.metadata.encode('utf8'))
+            server_pool.add_provider(server, lasso.PROVIDER_ROLE_SP,
+                    liberty_provider)
     elif sp_or_idp == 'idp':
-        try:
-            identity_provider = liberty_provider.identity_provider
-        except LibertyIdentityProvider.DoesNotExist:
-            return False
-        if not identity_provider.enabled:
+        if not provider_cache.has_role(liberty_provider, 'idp'):
             return False
         if server:
-            server.addProviderFromBuffer(lasso.PROVIDER_ROLE_IDP,
-                    liberty_provider.metadata.encode('utf8'))
+            server_pool.add_provider(server, lasso.PROVIDER_ROLE_IDP,
+                    liberty_provider)
     else:
         raise Exception('unsupported option sp_or_idp = %r' % sp_or_idp)
 
@@ -606,32 +585,17 @@ class SOAPException(Exception):
         self.url = url
 
 def soap_call(url, msg, client_cert = None):
-    if url.startswith('http://'):
-        host, query = urllib.splithost(url[5:])
-        conn = httplib.HTTPConnection(host)
-    else:
-        host, query = urllib.splithost(url[6:])
-        conn = httplib.HTTPSConnection(host,
-                key_file = client_cert, cert_file = client_cert)
-    logger.debug('soap_call: host %s' % host)
-    logger.debug('soap_call: query %s' % query)
+    logger.debug('soap_call: url %s' % url)
     logger.debug('soap_call: msg %s' % msg)
     try:
-        conn.request('POST', query, msg, {'Content-Type': 'text/xml'})
-        response = conn.getresponse()
-    except Exception, err:
-        logging.error('SOAP error (on %s): %s' % (url, err))
-        raise SOAPException(url)
-    logger.debug('soap_call: response %s' % str(response))
-    try:
-        data = response.read()
+        status, data = soap_pool.post(url, msg, {'Content-Type': 'text/xml'},
+                client_cert=client_cert)
     except Exception, err:
         logging.error('SOAP error (on %s): %s' % (url, err))
         raise SOAPException(url)
     logger.debug('soap_call: data %s' % str(data))
-    conn.close()
-    if response.status not in (200, 204): # 204 ok for federation termination
-        logging.warning('SOAP error (%s) (on %s)' % (response.status, url))
+    if status not in (200, 204): # 204 ok for federation termination
+        logging.warning('SOAP error (%s) (on %s)' % (status, url))
         raise SOAPException(url)
     return data
 
@@ -0,0 +1,54 @@
+'''Split lasso session and identity dumps by remote provider
+
+   The row session and identity stores keep the children of the root
+   element of a dump in one row per remote provider. The children are
+   serialized with their original namespace prefixes, and the namespace
+   declarations they inherited from the root are copied on them, so they
+   can be put back under a new root element as they were.
+'''
+
+from xml.dom import minidom
+
+LASSO_NS = 'http://www.entrouvert.org/namespaces/lasso/0.0'
+
+
+def split_dump(dump, key_attributes=('RemoteProviderID',)):
+    '''Return a dictionary mapping the remote provider ids of the children
+       of the root of a dump to their concatenated XML. The provider id of
+       a child is the value of the first of key_attributes it carries,
+       children without one are kept with the empty provider id.'''
+    if isinstance(dump, unicode):
+        dump = dump.encode('utf8')
+    document = minidom.parseString(dump)
+    try:
+        root = document.documentElement
+        # the default namespace is declared again by build_dump()
+        declarations = [(name, value)
+                for name, value in root.attributes.items()
+                if name.startswith('xmlns:')
+                or (name == 'xmlns' and value != LASSO_NS)]
+        parts = dict()
+        for child in root.childNodes:
+            if child.nodeType != child.ELEMENT_NODE:
+                continue
+            for name, value in declarations:
+                if not child.hasAttribute(name):
+                    child.setAttribute(name, value)
+            key = u''
+            for attribute in key_attributes:
+                if child.getAttribute(attribute):
+                    key = child.getAttribute(attribute)
+                    break
+            parts[key] = parts.get(key, u'') + child.toxml()
+        return parts
+    finally:
+        document.unlink()
+
+
+def build_dump(root, parts):
+    '''Build a dump whose root element is root from parts returned by
+       split_dump()'''
+    dump = [u'<%s xmlns="%s" Version="2">' % (root, LASSO_NS)]
+    dump.extend(parts)
+    dump.append(u'</%s>' % root)
+    return u''.join(dump)
@@ -0,0 +1,128 @@
+'''Storage of the lasso identities of the users
+
+   The store is chosen by the SAML_IDENTITY_STORE setting, the dotted path
+   of one of:
+
+    - DumpIdentityStore, the default, keeps the whole dump of the lasso
+      identity of a user in a LibertyIdentityDump row, rewritten each time
+      one of its federations changes,
+    - RowIdentityStore keeps each federation of a lasso identity in its own
+      LibertyFederationDump row, a lasso identity is rebuilt from the
+      federations needed by a profile, and only the federations added,
+      changed or removed are written back.
+
+   The migrate-identity-dumps command copies the LibertyIdentityDump rows
+   into LibertyFederationDump rows.
+'''
+
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.importlib import import_module
+
+from authentic2.saml.models import LibertyIdentityDump, LibertyFederationDump
+from authentic2.saml.dumputils import split_dump, build_dump
+
+logger = logging.getLogger('authentic2.saml.identity_store')
+
+STORE = getattr(settings, 'SAML_IDENTITY_STORE',
+        'authentic2.saml.identity_store.DumpIdentityStore')
+
+
+def split_identity_dump(identity_dump):
+    '''Return a dictionary mapping the remote provider ids of the
+       federations of an identity dump to the dumps of the federations,
+       elements which are not federations are kept with the empty provider
+       id, and always loaded'''
+    return split_dump(identity_dump)
+
+
+def build_identity_dump(federation_dumps):
+    return build_dump('Identity', federation_dumps)
+
+
+def get_digest(federation_dump):
+    return hashlib.sha1(federation_dump.encode('utf8')).hexdigest()
+
+
+class DumpIdentityStore(object):
+    def load(self, profile, user, provider_ids=None):
+        try:
+            q = LibertyIdentityDump.objects.get(user=user)
+        except LibertyIdentityDump.DoesNotExist:
+            return
+        profile.setIdentityFromDump(q.identity_dump.encode('utf8'))
+
+    def save(self, profile, user):
+        q, creation = LibertyIdentityDump.objects.get_or_create(user=user)
+        if profile.identity:
+            q.identity_dump = profile.identity.dump()
+        else:
+            q.identity_dump = None
+        q.save()
+
+
+class RowIdentityStore(object):
+    def load(self, profile, user, provider_ids=None):
+        qs = LibertyFederationDump.objects.filter(user=user)
+        if provider_ids is not None:
+            qs = qs.filter(provider_id__in=list(provider_ids) + [''])
+        federation_dumps = list(qs.values_list('federation_dump', flat=True))
+        try:
+            # remember which federations the profile may have removed
+            profile._identity_store_loaded = provider_ids
+        except (AttributeError, TypeError):
+            pass
+        if federation_dumps:
+            profile.setIdentityFromDump(
+                    build_identity_dump(federation_dumps).encode('utf8'))
+
+    def save(self, profile, user):
+        federations = dict()
+        if profile.identity:
+            federations = split_identity_dump(profile.identity.dump())
+        qs = LibertyFederationDump.objects.filter(user=user)
+        loaded = getattr(profile, '_identity_store_loaded', ())
+        if loaded is not None:
+            qs = qs.filter(provider_id__in=set(loaded) | set(federations))
+        digests = dict(qs.values_list('provider_id', 'digest'))
+        for provider_id, federation_dump in federations.iteritems():
+            digest = get_digest(federation_dump)
+            if provider_id not in digests:
+                LibertyFederationDump(user=user, provider_id=provider_id,
+                        federation_dump=federation_dump, digest=digest).save()
+            elif digests[provider_id] != digest:
+                qs.filter(provider_id=provider_id) \
+                        .update(federation_dump=federation_dump, digest=digest)
+        removed = [provider_id for provider_id in digests
+                if provider_id not in federations]
+        if removed:
+            qs.filter(provider_id__in=removed).delete()
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        package, name = STORE.rsplit('.', 1)
+        try:
+            store_class = getattr(import_module(package), name)
+        except (ImportError, AttributeError):
+            raise ImproperlyConfigured('SAML identity store %r could not be '
+                    'imported' % STORE)
+        _store = store_class()
+    return _store
+
+
+def load_identity(profile, user, provider_ids=None):
+    '''Load the lasso identity of a user into a profile, with the federations
+       with provider_ids only if not None'''
+    get_store().load(profile, user, provider_ids)
+
+
+def save_identity(profile, user):
+    get_store().save(profile, user)
@@ -0,0 +1,83 @@
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from authentic2.saml.models import LibertyIdentityDump, LibertyFederationDump
+from authentic2.saml import identity_store
+
+
+class Command(BaseCommand):
+    '''Copy the identity dumps into one federation dump per provider'''
+    can_import_django_settings = True
+    requires_model_validation = True
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size',
+            dest='batch_size',
+            default=500,
+            type='int',
+            help='Number of identity dumps converted per transaction'),
+        make_option('--delete',
+            action='store_true',
+            dest='delete',
+            default=False,
+            help='Delete the identity dumps once converted'),
+        )
+    help = 'Split the LibertyIdentityDump rows into LibertyFederationDump ' \
+        'rows, for the RowIdentityStore'
+
+    def handle(self, *args, **options):
+        start = time.time()
+        batch_size = options['batch_size']
+        verbosity = int(options['verbosity'])
+        converted = federations = errors = 0
+        last_pk = 0
+        while True:
+            batch = list(LibertyIdentityDump.objects.filter(pk__gt=last_pk)
+                    .order_by('pk')[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            counts = self.convert(batch, options['delete'])
+            converted += counts[0]
+            federations += counts[1]
+            errors += counts[2]
+            if verbosity > 1:
+                print 'Converted %d identity dumps' % converted
+        if verbosity > 0:
+            print 'Converted %d identity dumps into %d federation dumps ' \
+                '(%d errors) in %.2f seconds' % (converted, federations,
+                    errors, time.time() - start)
+
+    @transaction.commit_on_success
+    def convert(self, batch, delete):
+        errors = 0
+        converted = []
+        rows = []
+        for identity_dump in batch:
+            if not identity_dump.identity_dump:
+                converted.append(identity_dump)
+                continue
+            try:
+                dumps = identity_store.split_identity_dump(
+                        identity_dump.identity_dump)
+            except Exception, e:
+                print 'Unable to parse the identity dump of user %s: %s' \
+                    % (identity_dump.user_id, e)
+                errors += 1
+                continue
+            for provider_id, federation_dump in dumps.iteritems():
+                rows.append(LibertyFederationDump(user_id=identity_dump.user_id,
+                        provider_id=provider_id,
+                        federation_dump=federation_dump,
+                        digest=identity_store.get_digest(federation_dump)))
+            converted.append(identity_dump)
+        # converting again replaces the previous conversion
+        LibertyFederationDump.objects.filter(user__in=[identity_dump.user_id
+            for identity_dump in converted]).delete()
+        LibertyFederationDump.objects.bulk_create(rows)
+        if delete:
+            LibertyIdentityDump.objects.filter(pk__in=[identity_dump.pk
+                for identity_dump in converted]).delete()
+        return len(converted), len(rows), errors
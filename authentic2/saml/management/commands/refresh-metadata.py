@@ -0,0 +1,93 @@
+from optparse import make_option
+import sys
+import time
+import threading
+import Queue
+
+from django.core.management.base import BaseCommand
+
+from authentic2.saml.models import LibertyProvider, MetadataSource
+from authentic2.saml import metadata_refresh
+
+
+def worker(jobs, results):
+    '''Fetch metadata until a None job is received, the database is only
+       accessed by the main thread'''
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        provider, source = job
+        try:
+            results.put((provider, source, metadata_refresh.fetch(source), None))
+        except Exception, e:
+            results.put((provider, source, None, e))
+
+
+class Command(BaseCommand):
+    '''Refresh the metadata of the providers whose entity ID is an HTTP URL'''
+    can_import_django_settings = True
+    requires_model_validation = True
+    option_list = BaseCommand.option_list + (
+        make_option('--workers',
+            dest='workers',
+            default=4,
+            type='int',
+            help='Number of metadata downloaded concurrently'),
+        make_option('--force',
+            action='store_true',
+            dest='force',
+            default=False,
+            help='Refresh metadata even if they have not expired'),
+        make_option('--source',
+            dest='source',
+            default=None,
+            help='Only refresh the providers loaded with this source tag'),
+        )
+    args = '[<entity_id> ...]'
+    help = 'Refresh the metadata of the providers using conditional GETs'
+
+    def handle(self, *args, **options):
+        start = time.time()
+        providers = LibertyProvider.objects.filter(entity_id__startswith='http')
+        if args:
+            providers = providers.filter(entity_id__in=args)
+        if options['source']:
+            providers = providers.filter(federation_source=options['source'])
+        sources = dict((source.url, source)
+                for source in MetadataSource.objects.all())
+        jobs = Queue.Queue()
+        results = Queue.Queue()
+        count = 0
+        for provider in providers:
+            source = sources.get(provider.entity_id)
+            if source is None:
+                source = MetadataSource(url=provider.entity_id)
+            elif not options['force'] and not metadata_refresh.is_due(source):
+                continue
+            jobs.put((provider, source))
+            count += 1
+        threads = []
+        for i in range(max(1, min(options['workers'], count))):
+            jobs.put(None)
+            thread = threading.Thread(target=worker, args=(jobs, results))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        updated, errors = 0, 0
+        for i in range(count):
+            provider, source, metadata, error = results.get()
+            if error is not None:
+                errors += 1
+                print >>sys.stderr, 'Unable to refresh %s: %s' % (
+                        provider.entity_id, error)
+                continue
+            if metadata_refresh.save_refresh(provider, source, metadata):
+                updated += 1
+                if str(options['verbosity']) == '2':
+                    print 'Updated', provider.entity_id
+        for thread in threads:
+            thread.join()
+        print 'Refreshed %d providers in %.2f seconds: %d updated, ' \
+                '%d unchanged, %d errors' % (count, time.time() - start,
+                        updated, count - updated - errors, errors)
@@ -1,5 +1,7 @@
 from optparse import make_option
 import sys
+import time
+import hashlib
 import xml.etree.ElementTree as etree
 
 import lasso
@@ -7,6 +9,7 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 
 from authentic2.saml.models import *
+from authentic2.saml import provider_cache
 
 
 def md_element_name(tag_name):
@@ -27,9 +30,18 @@ def check_support_saml2(tree):
         return True
     return False
 
-def load_one_entity(tree, options, sp_policy=None, idp_policy=None):
-    '''Load or update an EntityDescriptor into the database'''
+def entity_digest(name, metadata, federation_source):
+    h = hashlib.sha1()
+    for value in (name, metadata, federation_source or ''):
+        h.update(value.encode('utf8'))
+        h.update('\0')
+    return h.hexdigest()
+
+def parse_entity(tree, options):
+    '''Extract the entity ID, name, metadata and roles of an EntityDescriptor'''
     entity_id = tree.get(ENTITY_ID)
+    if not entity_id:
+        raise ValueError('EntityDescriptor without an entityID attribute')
     organization = tree.find(ORGANIZATION)
     name, org = None, None
     if organization:
@@ -40,47 +52,188 @@ def load_one_entity(tree, options, sp_policy=None, idp_policy=None):
             name = org.text
     if not name:
         name = entity_id
-    idp, sp = False, False
     idp = check_support_saml2(tree.find(IDP_SSO_DESCRIPTOR_TN))
     sp = check_support_saml2(tree.find(SP_SSO_DESCRIPTOR_TN))
     if options.get('idp'):
         sp = False
     if options.get('sp'):
         idp = False
-    if options.get('delete'):
-        LibertyProvider.objects.filter(entity_id=entity_id).delete()
-        print 'Deleted', entity_id
-        return
-    if idp or sp:
-        provider, created = LibertyProvider.objects.get_or_create(entity_id=entity_id,
-                protocol_conformance=3)
-        if options['verbosity'] == '2':
-            if created:
-                what = 'Creating'
-            else:
-                what = 'Updating'
-            print '%(what)s %(name)s, %(id)s' % { 'what': what,
-                    'name': name.encode('utf8'), 'id': entity_id}
-        provider.name = name
-        provider.metadata = etree.tostring(tree, encoding='utf-8').decode('utf-8').strip()
-        provider.protocol_conformance = 3
-        provider.federation_source = options['source']
-        provider.save()
-        options['count'] = options.get('count', 0) + 1
-        if idp:
-            identity_provider, created = LibertyIdentityProvider.objects.get_or_create(
-                    liberty_provider=provider)
-            identity_provider.enabled = True
-            if idp_policy:
-                identity_provider.idp_options_policy = idp_policy
-            identity_provider.save()
-        if sp:
-            service_provider, created = LibertyServiceProvider.objects.get_or_create(
-                    liberty_provider=provider)
-            service_provider.enabled = True
-            if sp_policy:
-                service_provider.sp_options_policy = sp_policy
-            service_provider.save()
+    metadata = etree.tostring(tree, encoding='utf-8').decode('utf-8').strip()
+    return entity_id, name, metadata, idp, sp
+
+def iter_entities(metadata_file):
+    '''Stream the EntityDescriptor elements of a metadata file, the root
+       element itself if it is an EntityDescriptor or its children if it is an
+       EntitiesDescriptor. Processed elements are cleared to keep memory usage
+       bounded, including the subtrees of nested EntitiesDescriptor elements
+       whose entities are not loaded.'''
+    # elements being parsed, from the root
+    stack = []
+    for event, element in etree.iterparse(metadata_file, events=('start', 'end')):
+        if event == 'start':
+            if not stack and element.tag not in (ENTITY_DESCRIPTOR_TN, ENTITIES_DESCRIPTOR_TN):
+                raise CommandError('%s is not a SAMLv2 metadata file' % metadata_file.name)
+            stack.append(element)
+            continue
+        stack.pop()
+        if not stack:
+            if element.tag == ENTITY_DESCRIPTOR_TN:
+                yield element
+        elif stack[0].tag != ENTITIES_DESCRIPTOR_TN:
+            # part of the root EntityDescriptor
+            continue
+        elif len(stack) == 1:
+            if element.tag == ENTITY_DESCRIPTOR_TN:
+                yield element
+            stack[0].clear()
+        elif stack[-1].tag == ENTITIES_DESCRIPTOR_TN:
+            # child of a nested EntitiesDescriptor, dropped as soon as it is
+            # parsed
+            stack[-1].remove(element)
+
+class MetadataLoader(object):
+    '''Diff the entities of a metadata file against the existing providers
+       and write the changes using batched queries'''
+    def __init__(self, options, sp_policy=None, idp_policy=None):
+        self.options = options
+        self.source = options['source']
+        self.sp_policy = sp_policy
+        self.idp_policy = idp_policy
+        self.batch_size = int(options.get('batch_size') or 500)
+        self.verbose = str(options.get('verbosity')) == '2'
+        self.counts = dict.fromkeys(('created', 'updated', 'unchanged', 'deleted'), 0)
+        self.seen = set()
+        self.to_create = []
+        self.to_update = []
+        # entity_id -> (pk, digest, federation_source)
+        self.existing = {}
+        for pk, entity_id, name, metadata, federation_source in \
+                LibertyProvider.objects.values_list('pk', 'entity_id',
+                        'name', 'metadata', 'federation_source').iterator():
+            self.existing[entity_id] = (pk,
+                    entity_digest(name, metadata, federation_source),
+                    federation_source)
+        # provider pk -> (enabled, options policy id)
+        self.sp_roles = dict((pk, (enabled, policy_id)) for pk, enabled, policy_id in
+                LibertyServiceProvider.objects.values_list('liberty_provider',
+                    'enabled', 'sp_options_policy'))
+        self.idp_roles = dict((pk, (enabled, policy_id)) for pk, enabled, policy_id in
+                LibertyIdentityProvider.objects.values_list('liberty_provider',
+                    'enabled', 'idp_options_policy'))
+
+    def role_unchanged(self, roles, pk, policy):
+        if pk not in roles:
+            return False
+        enabled, policy_id = roles[pk]
+        return enabled and (policy is None or policy_id == policy.pk)
+
+    def add(self, tree):
+        entity_id, name, metadata, idp, sp = parse_entity(tree, self.options)
+        self.seen.add(entity_id)
+        if self.options.get('delete') or not (idp or sp):
+            return
+        digest = entity_digest(name, metadata, self.source)
+        entity = (entity_id, name, metadata, idp, sp)
+        if entity_id not in self.existing:
+            if self.verbose:
+                print 'Creating %s, %s' % (name.encode('utf8'), entity_id)
+            self.to_create.append(entity)
+            if len(self.to_create) >= self.batch_size:
+                self.flush_creations()
+            return
+        pk = self.existing[entity_id][0]
+        if self.existing[entity_id][1] == digest \
+                and (not idp or self.role_unchanged(self.idp_roles, pk, self.idp_policy)) \
+                and (not sp or self.role_unchanged(self.sp_roles, pk, self.sp_policy)):
+            self.counts['unchanged'] += 1
+            return
+        if self.verbose:
+            print 'Updating %s, %s' % (name.encode('utf8'), entity_id)
+        self.to_update.append((pk,) + entity)
+        if len(self.to_update) >= self.batch_size:
+            self.flush_updates()
+
+    def update_roles(self, pks, model, roles, policy_field, policy):
+        '''Enable the given role on the providers, creating it if needed'''
+        if not pks:
+            return
+        existing = [pk for pk in pks if pk in roles]
+        missing = [pk for pk in pks if pk not in roles]
+        kwargs = {'enabled': True}
+        if policy:
+            kwargs[policy_field] = policy
+        if existing:
+            model.objects.filter(pk__in=existing).update(**kwargs)
+        if missing:
+            model.objects.bulk_create([model(liberty_provider_id=pk, **kwargs)
+                for pk in missing])
+
+    def flush_creations(self):
+        if not self.to_create:
+            return
+        LibertyProvider.objects.bulk_create([
+            LibertyProvider(entity_id=entity_id,
+                entity_id_sha1=hashlib.sha1(entity_id).hexdigest(),
+                name=name, metadata=metadata, protocol_conformance=3,
+                federation_source=self.source)
+            for entity_id, name, metadata, idp, sp in self.to_create])
+        # bulk_create() does not return the primary keys
+        pks = dict(LibertyProvider.objects.filter(entity_id__in=[entity[0] for
+            entity in self.to_create]).values_list('entity_id', 'pk'))
+        self.update_roles([pks[entity[0]] for entity in self.to_create if entity[3]],
+                LibertyIdentityProvider, {}, 'idp_options_policy', self.idp_policy)
+        self.update_roles([pks[entity[0]] for entity in self.to_create if entity[4]],
+                LibertyServiceProvider, {}, 'sp_options_policy', self.sp_policy)
+        self.counts['created'] += len(self.to_create)
+        self.to_create = []
+
+    def flush_updates(self):
+        if not self.to_update:
+            return
+        for pk, entity_id, name, metadata, idp, sp in self.to_update:
+            # every row gets its own metadata, it cannot be a single UPDATE;
+            # update() avoids the SELECT done by save()
+            LibertyProvider.objects.filter(pk=pk).update(name=name,
+                    metadata=metadata, protocol_conformance=3,
+                    federation_source=self.source)
+            # update() does not send signals
+            provider_cache.invalidate(entity_id)
+        self.update_roles([entity[0] for entity in self.to_update if entity[4]],
+                LibertyIdentityProvider, self.idp_roles, 'idp_options_policy',
+                self.idp_policy)
+        self.update_roles([entity[0] for entity in self.to_update if entity[5]],
+                LibertyServiceProvider, self.sp_roles, 'sp_options_policy',
+                self.sp_policy)
+        self.counts['updated'] += len(self.to_update)
+        self.to_update = []
+
+    def delete(self, pks):
+        for i in range(0, len(pks), self.batch_size):
+            chunk = pks[i:i+self.batch_size]
+            LibertyProvider.objects.filter(pk__in=chunk).delete()
+            self.counts['deleted'] += len(chunk)
+
+    def finish(self):
+        self.flush_creations()
+        self.flush_updates()
+        if self.options.get('delete'):
+            to_delete = [(entity_id, value[0]) for entity_id, value
+                    in self.existing.iteritems() if entity_id in self.seen]
+            if self.source:
+                print 'Finally delete all providers for source: %s...' % self.source
+                to_delete.extend((entity_id, value[0]) for entity_id, value
+                        in self.existing.iteritems()
+                        if value[2] == self.source and entity_id not in self.seen)
+        elif self.source:
+            to_delete = [(entity_id, value[0]) for entity_id, value
+                    in self.existing.iteritems()
+                    if value[2] == self.source and entity_id not in self.seen]
+        else:
+            to_delete = []
+        if self.verbose:
+            for entity_id, pk in to_delete:
+                print 'Delete provider %s' % entity_id
+        self.delete([pk for entity_id, pk in to_delete])
 
 class Command(BaseCommand):
     '''Load SAMLv2 metadata file into the LibertyProvider, LibertyServiceProvider
@@ -117,6 +270,11 @@ class Command(BaseCommand):
             dest='ignore-errors',
             default=False,
             help='If loading of one EntityDescriptor fails, continue loading'),
+        make_option('--batch-size',
+            dest='batch_size',
+            default=500,
+            type='int',
+            help='Number of providers written per batch of queries'),
         make_option('--source',
             dest='source',
             default=None,
@@ -143,63 +301,53 @@ existing providers with the same tag will be removed if they do not exist\
                 metadata_file = file(args[0])
             except:
                 raise CommandError('Unable to open file %s' % args[0])
+            start = time.time()
+            sp_policy = None
+            if 'sp_policy' in options and options['sp_policy']:
+                sp_policy_name = options['sp_policy']
+                try:
+                    sp_policy = SPOptionsIdPPolicy.objects.get(name=sp_policy_name)
+                    print 'Service providers are set with the following SAML2 \
+                        options policy: %s' % sp_policy
+                except:
+                    print 'SAML2 service provider options policy with name %s not found' % sp_policy_name
+            else:
+                    print 'No SAML2 service provider options policy provided'
+            idp_policy = None
+            if 'idp_policy' in options and options['idp_policy']:
+                idp_policy_name = options['idp_policy']
+                try:
+                    idp_policy = IdPOptionsSPPolicy.objects.get(name=idp_policy_name)
+                    print 'Identity providers are set with the following SAML2 \
+                        options policy: %s' % idp_policy
+                except:
+                    print 'SAML2 identity provider options policy with name %s not found' % idp_policy_name
+            else:
+                    print 'No SAML2 identity provider options policy provided'
+            loader = MetadataLoader(options, sp_policy=sp_policy,
+                    idp_policy=idp_policy)
             try:
-                doc = etree.parse(metadata_file)
-            except Exception, e:
-                raise CommandError('XML parsing error: %s' % str(e))
-            if doc.getroot().tag == ENTITY_DESCRIPTOR_TN:
-                load_one_entity(doc.getroot(), options)
-            elif doc.getroot().tag == ENTITIES_DESCRIPTOR_TN:
-                sp_policy = None
-                if 'sp_policy' in options and options['sp_policy']:
-                    sp_policy_name = options['sp_policy']
+                for entity_descriptor in iter_entities(metadata_file):
                     try:
-                        sp_policy = SPOptionsIdPPolicy.objects.get(name=sp_policy_name)
-                        print 'Service providers are set with the following SAML2 \
-                            options policy: %s' % sp_policy
-                    except:
-                        print 'SAML2 service provider options policy with name %s not found' % sp_policy_name
-                else:
-                        print 'No SAML2 service provider options policy provided'
-                idp_policy = None
-                if 'idp_policy' in options and options['idp_policy']:
-                    idp_policy_name = options['idp_policy']
-                    try:
-                        idp_policy = IdPOptionsSPPolicy.objects.get(name=idp_policy_name)
-                        print 'Identity providers are set with the following SAML2 \
-                            options policy: %s' % idp_policy
-                    except:
-                        print 'SAML2 identity provider options policy with name %s not found' % idp_policy_name
-                else:
-                        print 'No SAML2 identity provider options policy provided'
-                loaded = []
-                for entity_descriptor in doc.getroot().findall(ENTITY_DESCRIPTOR_TN):
-                    try:
-                        load_one_entity(entity_descriptor, options, sp_policy=sp_policy, idp_policy=idp_policy)
-                        loaded.append(entity_descriptor.get(ENTITY_ID))
+                        loader.add(entity_descriptor)
                     except Exception, e:
-                        raise
                         entity_id = entity_descriptor.get(ENTITY_ID)
                         if options['ignore-errors']:
                             print >>sys.stderr, 'Unable to load EntityDescriptor for %s: %s' % (entity_id, str(e))
                         else:
                             raise CommandError('EntityDescriptor loading: %s' % str(e))
-                if options['source']:
-                    if options['delete']:
-                        print 'Finally delete all providers for source: %s...' % source
-                        LibertyProvider.objects.filter(federation_source=source).delete()
-                    else:
-                        to_delete = LibertyProvider.objects.filter(federation_source=source)\
-                                .exclude(entity_id__in=loaded)
-                        for provider in to_delete:
-                            print 'Delete obsolete provider %s' % provider.entity_id
-                            provider.delete()
-            else:
-                raise CommandError('%s is not a SAMLv2 metadata file' % metadata_file)
+            except SyntaxError, e:
+                # ElementTree.ParseError is a subclass of SyntaxError
+                raise CommandError('XML parsing error: %s' % str(e))
+            loader.finish()
         except:
             transaction.rollback()
             raise
         else:
             transaction.commit()
-        if not options.get('delete'):
-            print 'Loaded', options.get('count', 0), 'providers'
+        counts = loader.counts
+        print 'Processed %d providers in %.2f seconds: %d created, %d updated, ' \
+                '%d unchanged, %d deleted' % (len(loader.seen),
+                        time.time() - start, counts['created'],
+                        counts['updated'], counts['unchanged'],
+                        counts['deleted'])
@@ -0,0 +1,171 @@
+'''Refresh of the metadata of providers using HTTP conditional GETs
+
+   The ETag and Last-Modified validators of the last response and the cache
+   validity announced by the metadata, through its validUntil and
+   cacheDuration attributes, are kept in a MetadataSource object for each
+   URL. Metadata are only downloaded again once expired, and only parsed and
+   saved if their content changed.
+'''
+
+import datetime
+import hashlib
+import logging
+import re
+import xml.etree.ElementTree as etree
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from authentic2.http_utils import get_url_conditional
+from authentic2.saml.models import MetadataSource
+
+logger = logging.getLogger('authentic2.saml.metadata_refresh')
+
+# Minimum time in seconds between two requests for the same metadata, used
+# when the metadata do not announce their cache validity
+MIN_REFRESH_INTERVAL = getattr(settings, 'SAML_METADATA_MIN_REFRESH_INTERVAL', 0)
+
+DURATION_RE = re.compile(r'^(-)?P(?:(\d+)Y)?(?:(\d+)M)?(?:(\d+)D)?'
+        r'(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?)?$')
+
+
+def parse_duration(duration):
+    '''Convert a xs:duration value into a timedelta, years and months are
+       approximated'''
+    m = DURATION_RE.match(duration.strip())
+    if not m or duration.strip() in ('P', 'PT'):
+        raise ValueError('Invalid xs:duration %r' % duration)
+    sign, years, months, days, hours, minutes, seconds = m.groups()
+    delta = datetime.timedelta(days=365*int(years or 0) + 30*int(months or 0)
+            + int(days or 0), hours=int(hours or 0),
+            minutes=int(minutes or 0), seconds=float(seconds or 0))
+    if sign:
+        delta = -delta
+    return delta
+
+
+def parse_datetime(value):
+    '''Convert a xs:dateTime value in UTC into a naive local datetime'''
+    m = re.match(r'(\d+-\d+-\d+T\d+:\d+:\d+)(?:\.\d+)?Z?$', value.strip())
+    if not m:
+        raise ValueError('Invalid xs:dateTime %r' % value)
+    utc = datetime.datetime.strptime(m.group(1), '%Y-%m-%dT%H:%M:%S')
+    return utc + (datetime.datetime.now() - datetime.datetime.utcnow())
+
+
+def get_expiration(metadata, now=None):
+    '''Return the date until which the metadata can be cached, from the
+       validUntil and cacheDuration attributes of their root element, or
+       None'''
+    now = now or datetime.datetime.now()
+    try:
+        root = etree.fromstring(metadata)
+    except SyntaxError:
+        return None
+    expirations = []
+    valid_until = root.get('validUntil')
+    if valid_until:
+        try:
+            expirations.append(parse_datetime(valid_until))
+        except ValueError, e:
+            logger.warning('get_expiration: %s' % e)
+    cache_duration = root.get('cacheDuration')
+    if cache_duration:
+        try:
+            expirations.append(now + parse_duration(cache_duration))
+        except ValueError, e:
+            logger.warning('get_expiration: %s' % e)
+    if MIN_REFRESH_INTERVAL:
+        expirations.append(now
+                + datetime.timedelta(seconds=MIN_REFRESH_INTERVAL))
+    if expirations:
+        return min(expirations)
+    return None
+
+
+def get_source(url):
+    '''Return the MetadataSource of an URL, a new unsaved one if there is
+       none yet; it is saved with the result of the first fetch'''
+    try:
+        return MetadataSource.objects.get(url=url)
+    except MetadataSource.DoesNotExist:
+        return MetadataSource(url=url)
+
+
+def is_due(source, now=None):
+    now = now or datetime.datetime.now()
+    return source.expires is None or source.expires <= now
+
+
+def fetch(source):
+    '''Retrieve the metadata of a source with a conditional GET.
+
+       Return the new metadata as an unicode string, or None if they did not
+       change. The fields of the source are updated but it is not saved, so
+       this function can be called outside of the thread owning the database
+       connection. Network errors are raised as urllib2.URLError or IOError.
+    '''
+    now = datetime.datetime.now()
+    content, headers = get_url_conditional(source.url, etag=source.etag,
+            last_modified=source.last_modified)
+    source.last_fetch = now
+    if content is None:
+        if MIN_REFRESH_INTERVAL:
+            source.expires = now \
+                    + datetime.timedelta(seconds=MIN_REFRESH_INTERVAL)
+        logger.debug('fetch: %s not modified' % source.url)
+        return None
+    source.etag = headers.get('ETag', '')
+    source.last_modified = headers.get('Last-Modified', '')
+    digest = hashlib.sha1(content).hexdigest()
+    # the expiration is computed even when the content is unchanged, a
+    # cacheDuration is relative to the time of the request
+    source.expires = get_expiration(content, now=now)
+    if digest == source.digest:
+        logger.debug('fetch: %s unchanged' % source.url)
+        return None
+    source.digest = digest
+    logger.debug('fetch: %s changed, %d bytes' % (source.url, len(content)))
+    return unicode(content, 'utf8')
+
+
+def update_provider(provider, metadata):
+    '''Save new metadata on a LibertyProvider if they differ and are valid,
+       return whether the provider was updated'''
+    if metadata is None or metadata == provider.metadata:
+        return False
+    old_metadata, entity_id = provider.metadata, provider.entity_id
+    provider.metadata = metadata
+    try:
+        provider.full_clean(exclude=['entity_id', 'protocol_conformance'])
+        if provider.entity_id != entity_id:
+            raise ValidationError('metadata are for another entity id, %r'
+                    % provider.entity_id)
+    except ValidationError, e:
+        provider.metadata, provider.entity_id = old_metadata, entity_id
+        logger.error('update_provider: metadata retrieved for %r are '
+                'invalid, %s' % (entity_id, e.args))
+        return False
+    provider.save()
+    logger.info('update_provider: metadata of %r updated' % provider.entity_id)
+    return True
+
+
+def save_refresh(provider, source, metadata):
+    '''Save the result of fetch() on the provider and on its source, return
+       whether the provider was updated'''
+    updated = update_provider(provider, metadata)
+    if metadata is not None and not updated and metadata != provider.metadata:
+        # invalid metadata, download them again at the next refresh
+        source.etag = source.last_modified = source.digest = ''
+    source.save()
+    return updated
+
+
+def refresh_provider(provider, force=False):
+    '''Refresh the metadata of a LibertyProvider from its entity ID, return
+       whether the provider was updated'''
+    source = get_source(provider.entity_id)
+    if not force and not is_due(source):
+        return False
+    return save_refresh(provider, source, fetch(source))
@@ -0,0 +1,293 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Adding model 'MetadataSource'
+        db.create_table('saml_metadatasource', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('url', self.gf('django.db.models.fields.URLField')(unique=True, max_length=255)),
+            ('etag', self.gf('django.db.models.fields.CharField')(max_length=256, blank=True)),
+            ('last_modified', self.gf('django.db.models.fields.CharField')(max_length=64, blank=True)),
+            ('digest', self.gf('django.db.models.fields.CharField')(max_length=40, blank=True)),
+            ('last_fetch', self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True)),
+            ('expires', self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True)),
+        ))
+        db.send_create_signal('saml', ['MetadataSource'])
+
+
+    def backwards(self, orm):
+        
+        # Deleting model 'MetadataSource'
+        db.delete_table('saml_metadatasource')
+
+
+    models = {
+        'attribute_aggregator.attributesource': {
+            'Meta': {'object_name': 'AttributeSource'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '200'}),
+            'namespace': ('django.db.models.fields.CharField', [], {'default': "('Default', 'Default')", 'max_length': '100'})
+        },
+        'auth.group': {
+            'Meta': {'object_name': 'Group'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '80'}),
+            'permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'})
+        },
+        'auth.permission': {
+            'Meta': {'ordering': "('content_type__app_label', 'content_type__model', 'codename')", 'unique_together': "(('content_type', 'codename'),)", 'object_name': 'Permission'},
+            'codename': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'})
+        },
+        'auth.user': {
+            'Meta': {'object_name': 'User'},
+            'date_joined': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '75', 'blank': 'True'}),
+            'first_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'groups': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['auth.Group']", 'symmetrical': 'False', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'is_superuser': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'last_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'user_permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'}),
+            'username': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '30'})
+        },
+        'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        'idp.attributeitem': {
+            'Meta': {'object_name': 'AttributeItem'},
+            'attribute_name': ('django.db.models.fields.CharField', [], {'default': "('OpenLDAProotDSE', 'OpenLDAProotDSE')", 'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'output_name_format': ('django.db.models.fields.CharField', [], {'default': "('urn:oasis:names:tc:SAML:2.0:attrname-format:uri', 'SAMLv2 URI')", 'max_length': '100'}),
+            'output_namespace': ('django.db.models.fields.CharField', [], {'default': "('Default', 'Default')", 'max_length': '100'}),
+            'required': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'source': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['attribute_aggregator.AttributeSource']", 'null': 'True', 'blank': 'True'})
+        },
+        'idp.attributelist': {
+            'Meta': {'object_name': 'AttributeList'},
+            'attributes': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'related_name': "'attributes of the list'", 'null': 'True', 'symmetrical': 'False', 'to': "orm['idp.AttributeItem']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '100'})
+        },
+        'idp.attributepolicy': {
+            'Meta': {'object_name': 'AttributePolicy'},
+            'allow_attributes_selection': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'ask_consent_attributes': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'attribute_filter_for_sso_from_push_sources': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'filter attributes of push sources with list'", 'null': 'True', 'to': "orm['idp.AttributeList']"}),
+            'attribute_list_for_sso_from_pull_sources': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'attributes from pull sources'", 'null': 'True', 'to': "orm['idp.AttributeList']"}),
+            'enabled': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'filter_source_of_filtered_attributes': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'forward_attributes_from_push_sources': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'map_attributes_from_push_sources': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'map_attributes_of_filtered_attributes': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '100'}),
+            'output_name_format': ('django.db.models.fields.CharField', [], {'default': "('urn:oasis:names:tc:SAML:2.0:attrname-format:uri', 'SAMLv2 URI')", 'max_length': '100'}),
+            'output_namespace': ('django.db.models.fields.CharField', [], {'default': "('Default', 'Default')", 'max_length': '100'}),
+            'send_error_and_no_attrs_if_missing_required_attrs': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'source_filter_for_sso_from_push_sources': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'related_name': "'filter attributes of push sources with sources'", 'null': 'True', 'symmetrical': 'False', 'to': "orm['attribute_aggregator.AttributeSource']"})
+        },
+        'saml.authorizationattributemap': {
+            'Meta': {'object_name': 'AuthorizationAttributeMap'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '40'})
+        },
+        'saml.authorizationattributemapping': {
+            'Meta': {'object_name': 'AuthorizationAttributeMapping'},
+            'attribute_name': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'attribute_value': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'attribute_value_format': ('django.db.models.fields.CharField', [], {'max_length': '40', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'map': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['saml.AuthorizationAttributeMap']"}),
+            'source_attribute_name': ('django.db.models.fields.CharField', [], {'max_length': '40', 'blank': 'True'})
+        },
+        'saml.authorizationsppolicy': {
+            'Meta': {'object_name': 'AuthorizationSPPolicy'},
+            'attribute_map': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'authorization_attributes'", 'null': 'True', 'to': "orm['saml.AuthorizationAttributeMap']"}),
+            'default_denial_message': ('django.db.models.fields.CharField', [], {'default': "u'You are not authorized to access the service.'", 'max_length': '80'}),
+            'enabled': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '80'})
+        },
+        'saml.idpoptionssppolicy': {
+            'Meta': {'object_name': 'IdPOptionsSPPolicy'},
+            'accept_slo': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'allow_create': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'back_url': ('django.db.models.fields.CharField', [], {'default': "'/'", 'max_length': '200'}),
+            'binding_for_sso_response': ('django.db.models.fields.CharField', [], {'default': "'urn:oasis:names:tc:SAML:2.0:bindings:HTTP-Artifact'", 'max_length': '200'}),
+            'enable_binding_for_sso_response': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'enable_http_method_for_defederation_request': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'enable_http_method_for_slo_request': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'enabled': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'force_user_consent': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'forward_slo': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'handle_persistent': ('django.db.models.fields.CharField', [], {'default': "'AUTHSAML2_UNAUTH_PERSISTENT_ACCOUNT_LINKING_BY_AUTH'", 'max_length': '200'}),
+            'handle_transient': ('django.db.models.fields.CharField', [], {'default': "''", 'max_length': '200'}),
+            'http_method_for_defederation_request': ('django.db.models.fields.IntegerField', [], {'default': '5', 'max_length': '200'}),
+            'http_method_for_slo_request': ('django.db.models.fields.IntegerField', [], {'default': '4', 'max_length': '200'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '200'}),
+            'no_nameid_policy': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'requested_name_id_format': ('django.db.models.fields.CharField', [], {'default': "'none'", 'max_length': '200'}),
+            'transient_is_persistent': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'want_authn_request_signed': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'want_force_authn_request': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'want_is_passive_authn_request': ('django.db.models.fields.BooleanField', [], {'default': 'False'})
+        },
+        'saml.keyvalue': {
+            'Meta': {'object_name': 'KeyValue'},
+            'key': ('django.db.models.fields.CharField', [], {'max_length': '40', 'primary_key': 'True'}),
+            'value': ('authentic2.saml.fields.PickledObjectField', [], {})
+        },
+        'saml.libertyartifact': {
+            'Meta': {'object_name': 'LibertyArtifact'},
+            'artifact': ('django.db.models.fields.CharField', [], {'max_length': '40', 'primary_key': 'True'}),
+            'content': ('django.db.models.fields.TextField', [], {}),
+            'creation': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'django_session_key': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'provider_id': ('django.db.models.fields.CharField', [], {'max_length': '80'})
+        },
+        'saml.libertyassertion': {
+            'Meta': {'object_name': 'LibertyAssertion'},
+            'assertion': ('django.db.models.fields.TextField', [], {}),
+            'assertion_id': ('django.db.models.fields.CharField', [], {'max_length': '50'}),
+            'creation': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'provider_id': ('django.db.models.fields.CharField', [], {'max_length': '80'}),
+            'session_index': ('django.db.models.fields.CharField', [], {'max_length': '80'})
+        },
+        'saml.libertyfederation': {
+            'Meta': {'unique_together': "(('name_id_qualifier', 'name_id_format', 'name_id_content', 'name_id_sp_name_qualifier'),)", 'object_name': 'LibertyFederation'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'idp_id': ('django.db.models.fields.CharField', [], {'max_length': '80'}),
+            'name_id_content': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name_id_format': ('django.db.models.fields.CharField', [], {'max_length': '100', 'null': 'True', 'blank': 'True'}),
+            'name_id_qualifier': ('django.db.models.fields.CharField', [], {'max_length': '150', 'null': 'True', 'blank': 'True'}),
+            'name_id_sp_name_qualifier': ('django.db.models.fields.CharField', [], {'max_length': '100', 'null': 'True', 'blank': 'True'}),
+            'name_id_sp_provided_id': ('django.db.models.fields.CharField', [], {'max_length': '100', 'null': 'True', 'blank': 'True'}),
+            'sp_id': ('django.db.models.fields.CharField', [], {'max_length': '80'}),
+            'user': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['auth.User']"})
+        },
+        'saml.libertyidentitydump': {
+            'Meta': {'object_name': 'LibertyIdentityDump'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'identity_dump': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'user': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['auth.User']", 'unique': 'True'})
+        },
+        'saml.libertyidentityprovider': {
+            'Meta': {'object_name': 'LibertyIdentityProvider'},
+            'authorization_policy': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'authorization_policy'", 'null': 'True', 'to': "orm['saml.AuthorizationSPPolicy']"}),
+            'enable_following_authorization_policy': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'enable_following_idp_options_policy': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'enabled': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'idp_options_policy': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'idp_options_policy'", 'null': 'True', 'to': "orm['saml.IdPOptionsSPPolicy']"}),
+            'liberty_provider': ('django.db.models.fields.related.OneToOneField', [], {'related_name': "'identity_provider'", 'unique': 'True', 'primary_key': 'True', 'to': "orm['saml.LibertyProvider']"})
+        },
+        'saml.libertymanagedump': {
+            'Meta': {'object_name': 'LibertyManageDump'},
+            'django_session_key': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'manage_dump': ('django.db.models.fields.TextField', [], {'blank': 'True'})
+        },
+        'saml.libertyprovider': {
+            'Meta': {'object_name': 'LibertyProvider'},
+            'ca_cert_chain': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'entity_id': ('django.db.models.fields.URLField', [], {'unique': 'True', 'max_length': '200'}),
+            'entity_id_sha1': ('django.db.models.fields.CharField', [], {'max_length': '40', 'blank': 'True'}),
+            'federation_source': ('django.db.models.fields.CharField', [], {'max_length': '64', 'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'metadata': ('django.db.models.fields.TextField', [], {}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '140', 'blank': 'True'}),
+            'protocol_conformance': ('django.db.models.fields.IntegerField', [], {'max_length': '10'}),
+            'public_key': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'ssl_certificate': ('django.db.models.fields.TextField', [], {'blank': 'True'})
+        },
+        'saml.libertyproviderpolicy': {
+            'Meta': {'object_name': 'LibertyProviderPolicy'},
+            'authn_request_signature_check_hint': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '64'})
+        },
+        'saml.libertyserviceprovider': {
+            'Meta': {'object_name': 'LibertyServiceProvider'},
+            'attribute_policy': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'attribute_policy'", 'null': 'True', 'to': "orm['idp.AttributePolicy']"}),
+            'enable_following_attribute_policy': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'enable_following_sp_options_policy': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'enabled': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'liberty_provider': ('django.db.models.fields.related.OneToOneField', [], {'related_name': "'service_provider'", 'unique': 'True', 'primary_key': 'True', 'to': "orm['saml.LibertyProvider']"}),
+            'policy': ('django.db.models.fields.related.ForeignKey', [], {'default': '1', 'to': "orm['saml.LibertyProviderPolicy']", 'null': 'True'}),
+            'sp_options_policy': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'sp_options_policy'", 'null': 'True', 'to': "orm['saml.SPOptionsIdPPolicy']"})
+        },
+        'saml.libertysession': {
+            'Meta': {'object_name': 'LibertySession'},
+            'assertion': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['saml.LibertyAssertion']", 'null': 'True'}),
+            'creation': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'django_session_key': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'federation': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['saml.LibertyFederation']", 'null': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name_id_content': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name_id_format': ('django.db.models.fields.CharField', [], {'max_length': '100', 'null': 'True'}),
+            'name_id_qualifier': ('django.db.models.fields.CharField', [], {'max_length': '150', 'null': 'True'}),
+            'name_id_sp_name_qualifier': ('django.db.models.fields.CharField', [], {'max_length': '100', 'null': 'True'}),
+            'provider_id': ('django.db.models.fields.CharField', [], {'max_length': '80'}),
+            'session_index': ('django.db.models.fields.CharField', [], {'max_length': '80'})
+        },
+        'saml.libertysessiondump': {
+            'Meta': {'object_name': 'LibertySessionDump'},
+            'django_session_key': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'kind': ('django.db.models.fields.IntegerField', [], {}),
+            'session_dump': ('django.db.models.fields.TextField', [], {'blank': 'True'})
+        },
+        'saml.libertysessionsp': {
+            'Meta': {'object_name': 'LibertySessionSP'},
+            'django_session_key': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'federation': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['saml.LibertyFederation']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'session_index': ('django.db.models.fields.CharField', [], {'max_length': '80'})
+        },
+        'saml.metadatasource': {
+            'Meta': {'object_name': 'MetadataSource'},
+            'digest': ('django.db.models.fields.CharField', [], {'max_length': '40', 'blank': 'True'}),
+            'etag': ('django.db.models.fields.CharField', [], {'max_length': '256', 'blank': 'True'}),
+            'expires': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_fetch': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'last_modified': ('django.db.models.fields.CharField', [], {'max_length': '64', 'blank': 'True'}),
+            'url': ('django.db.models.fields.URLField', [], {'unique': 'True', 'max_length': '255'})
+        },
+        'saml.spoptionsidppolicy': {
+            'Meta': {'object_name': 'SPOptionsIdPPolicy'},
+            'accept_slo': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'accepted_name_id_format': ('authentic2.saml.fields.MultiSelectField', [], {'max_length': '31', 'blank': 'True'}),
+            'ask_user_consent': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'authn_request_signed': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'default_name_id_format': ('django.db.models.fields.CharField', [], {'default': "'none'", 'max_length': '200'}),
+            'enabled': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'encrypt_assertion': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'encrypt_nameid': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'forward_slo': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'idp_initiated_sso': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '80'}),
+            'prefered_assertion_consumer_binding': ('django.db.models.fields.CharField', [], {'default': "'meta'", 'max_length': '4'})
+        }
+    }
+
+    complete_apps = ['saml']
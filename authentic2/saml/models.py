@@ -374,6 +374,23 @@ class LibertyProvider(models.Model):
         if not self.protocol_conformance:
             self.protocol_conformance = p.protocolConformance
 
+class MetadataSource(models.Model):
+    '''HTTP validators and cache validity of the metadata retrieved from an
+       URL, used to refresh metadata with conditional GETs'''
+    # the longest unique column MySQL can index with utf8
+    url = models.URLField(unique=True, max_length=255)
+    etag = models.CharField(max_length=256, blank=True)
+    last_modified = models.CharField(max_length=64, blank=True)
+    # SHA1 of the last retrieved content
+    digest = models.CharField(max_length=40, blank=True)
+    last_fetch = models.DateTimeField(blank=True, null=True)
+    # deduced from the validUntil and cacheDuration attributes of the
+    # metadata, no refresh is needed before this date
+    expires = models.DateTimeField(blank=True, null=True)
+
+    def __unicode__(self):
+        return self.url
+
 # TODO: The IdP must look to the preferred binding order for sso in the SP metadata (AssertionConsumerService)
 # expect if the protocol for response is defined in the request (ProtocolBinding attribute)
 class LibertyServiceProvider(models.Model):
@@ -421,19 +438,59 @@ class LibertyIdentityDump(models.Model):
     user = models.ForeignKey(User, unique = True)
     identity_dump = models.TextField(blank = True)
 
+class LibertyFederationDump(models.Model):
+    '''Store the lasso federation of a user with one provider, used instead
+       of LibertyIdentityDump by the row identity store.'''
+    user = models.ForeignKey(User)
+    # same length as LibertyProvider.entity_id
+    provider_id = models.CharField(max_length = 200)
+    federation_dump = models.TextField()
+    digest = models.CharField(max_length = 40)
+
+    class Meta:
+        unique_together = (('user', 'provider_id'),)
+
+def get_live_session_keys(session_keys):
+    '''Return the subset of session_keys whose Django session exists and
+       has not expired, checked in bulk for the database and cache
+       backends'''
+    engine = settings.SESSION_ENGINE
+    if engine in ('django.contrib.sessions.backends.db',
+            'django.contrib.sessions.backends.cached_db'):
+        from django.contrib.sessions.models import Session
+        return set(Session.objects.filter(session_key__in=session_keys,
+            expire_date__gt=datetime.datetime.now())
+                .values_list('session_key', flat=True))
+    module = import_module(engine)
+    if engine == 'django.contrib.sessions.backends.cache':
+        prefix = module.KEY_PREFIX
+        found = module.cache.get_many([prefix + key for key in session_keys])
+        return set(key[len(prefix):] for key in found)
+    store = module.SessionStore()
+    return set(key for key in session_keys if store.exists(key))
+
+
 class SessionLinkedManager(models.Manager):
-    def cleanup(self):
-        engine = import_module(settings.SESSION_ENGINE)
-        store = engine.SessionStore()
-        for o in self.all():
-            key = o.django_session_key
-            if not store.exists(key):
-                o.delete()
-            else:
-                session = engine.SessionStore(session_key=key)
-                if session.get_expiry_date() >= datetime.datetime.now():
-                    store.delete(key)
-                    o.delete()
+    def cleanup(self, chunk_size=1000):
+        '''Delete the rows linked to Django sessions which do not exist
+           anymore or have expired, return the number of deleted rows'''
+        deleted = 0
+        last_key = None
+        while True:
+            keys = self.order_by('django_session_key') \
+                    .values_list('django_session_key', flat=True).distinct()
+            if last_key is not None:
+                keys = keys.filter(django_session_key__gt=last_key)
+            keys = list(keys[:chunk_size])
+            if not keys:
+                break
+            last_key = keys[-1]
+            dead_keys = set(keys) - get_live_session_keys(keys)
+            if dead_keys:
+                qs = self.filter(django_session_key__in=dead_keys)
+                deleted += qs.count()
+                qs.delete()
+        return deleted
 
 LIBERTY_SESSION_DUMP_KIND_SP = 0
 LIBERTY_SESSION_DUMP_KIND_IDP = 1
@@ -451,6 +508,23 @@ class LibertySessionDump(models.Model):
 
     objects = SessionLinkedManager()
 
+class LibertySessionAssertion(models.Model):
+    '''Store the elements of a lasso session concerning one provider, its
+       assertion, status and NameID and session index, used instead of
+       LibertySessionDump by the row session store.'''
+    django_session_key = models.CharField(max_length = 40, db_index = True)
+    kind = models.IntegerField(choices = LIBERTY_SESSION_DUMP_KIND.items())
+    # same length as LibertyProvider.entity_id
+    provider_id = models.CharField(max_length = 200)
+    assertion = models.TextField()
+    digest = models.CharField(max_length = 40)
+    creation = models.DateTimeField(auto_now_add=True)
+
+    objects = SessionLinkedManager()
+
+    class Meta:
+        unique_together = (('django_session_key', 'kind', 'provider_id'),)
+
 class LibertyManageDump(models.Model):
     '''Store lasso manage dump
 
@@ -544,7 +618,10 @@ class LibertyFederation(models.Model):
 
 
 class LibertySession(models.Model):
-    """Store the link between a Django session and a Liberty session"""
+    """Store the link between a Django session and a Liberty session
+
+       The migrations add indexes on (django_session_key, provider_id,
+       creation) and on (name_id_content, session_index)."""
     django_session_key = models.CharField(max_length = 40)
     session_index = models.CharField(max_length = 80)
     provider_id = models.CharField(max_length = 80)
@@ -577,7 +654,8 @@ class LibertySession(models.Model):
     @classmethod
     def get_for_nameid_and_session_indexes(cls, name_id, session_indexes):
         kwargs = nameid2kwargs(name_id)
-        return LibertySession.objects.filter(session_index__in = session_indexes, **kwargs)
+        return LibertySession.objects.select_related('assertion') \
+                .filter(session_index__in = session_indexes, **kwargs)
 
     def __unicode__(self):
         return '<LibertySession %s>' % self.__dict__
@@ -0,0 +1,166 @@
+'''Cache of the LibertyProvider records used by load_provider()
+
+   A provider and its service and identity provider roles are kept in an
+   in-process LRU cache and, if the SAML_PROVIDER_CACHE setting names a
+   Django cache, in this shared cache. Each cached entry carries a content
+   hash of the provider; the hash is also stored alone in the shared cache
+   and removed each time the provider or one of its roles is saved or
+   deleted, so that every process reloads the provider from the database.
+'''
+
+import copy
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import get_cache
+from django.db.models.signals import post_save, post_delete
+
+from authentic2.utils import LRUCache
+from authentic2.saml.models import LibertyProvider, LibertyServiceProvider, \
+    LibertyIdentityProvider
+
+logger = logging.getLogger('authentic2.saml.provider_cache')
+
+# Name of the Django cache shared between processes, None to only use the
+# in-process cache
+SHARED_CACHE = getattr(settings, 'SAML_PROVIDER_CACHE', None)
+# Number of providers kept in the in-process cache
+LOCAL_CACHE_SIZE = getattr(settings, 'SAML_PROVIDER_CACHE_SIZE', 1000)
+# Lifetime of the cached entries in seconds, without a shared cache it
+# bounds the time a provider modified by another process stays stale
+TIMEOUT = getattr(settings, 'SAML_PROVIDER_CACHE_TIMEOUT', 300)
+
+ROLES = (('sp', 'service_provider', LibertyServiceProvider),
+        ('idp', 'identity_provider', LibertyIdentityProvider))
+
+_local = LRUCache(LOCAL_CACHE_SIZE, TIMEOUT)
+
+
+def get_shared_cache():
+    if SHARED_CACHE:
+        return get_cache(SHARED_CACHE)
+    return None
+
+
+def get_keys(entity_id):
+    '''Return the keys of the version and of the entry of a provider in the
+       shared cache'''
+    if isinstance(entity_id, unicode):
+        entity_id = entity_id.encode('utf8')
+    digest = hashlib.sha1(entity_id).hexdigest()
+    return 'saml-provider-version-%s' % digest, 'saml-provider-%s' % digest
+
+
+def content_hash(liberty_provider, roles):
+    '''Hash the field values of a provider and of its roles'''
+    h = hashlib.sha1()
+    for instance in (liberty_provider, roles['sp'], roles['idp']):
+        if instance is None:
+            h.update('-')
+            continue
+        for field in instance._meta.fields:
+            value = getattr(instance, field.attname)
+            if isinstance(value, unicode):
+                value = value.encode('utf8')
+            h.update('%s=%r;' % (field.attname, value))
+    return h.hexdigest()
+
+
+def load(entity_id):
+    '''Load a provider and its roles from the database'''
+    try:
+        liberty_provider = LibertyProvider.objects.get(entity_id=entity_id)
+    except LibertyProvider.DoesNotExist:
+        return None
+    roles = {}
+    for role, attribute, model in ROLES:
+        try:
+            roles[role] = model.objects.get(pk=liberty_provider.pk)
+        except model.DoesNotExist:
+            roles[role] = None
+    return (content_hash(liberty_provider, roles), liberty_provider, roles)
+
+
+def _copy(entry):
+    '''Return a private copy of the provider of a cache entry, with its roles
+       attached, so that the cached objects are never modified by callers.
+       The roles the provider does not have are recorded on the copy, so
+       that has_role() does not look for them in the database.'''
+    version, liberty_provider, roles = entry
+    liberty_provider = copy.copy(liberty_provider)
+    missing_roles = []
+    for role, attribute, model in ROLES:
+        if roles[role] is not None:
+            setattr(liberty_provider, attribute, copy.copy(roles[role]))
+        else:
+            missing_roles.append(role)
+    liberty_provider._missing_roles = frozenset(missing_roles)
+    return liberty_provider
+
+
+def get(entity_id):
+    '''Return the LibertyProvider with the given entity ID, with its
+       service_provider and identity_provider attributes already loaded, or
+       None if it does not exist.'''
+    shared = get_shared_cache()
+    version = None
+    if shared is not None:
+        version_key, entry_key = get_keys(entity_id)
+        version = shared.get(version_key)
+    entry = _local.get(entity_id)
+    if entry is not None and (shared is None or entry[0] == version):
+        return _copy(entry)
+    if version is not None:
+        entry = shared.get(entry_key)
+        if entry is not None and entry[0] == version:
+            _local.set(entity_id, entry)
+            return _copy(entry)
+    entry = load(entity_id)
+    if entry is None:
+        return None
+    _local.set(entity_id, entry)
+    if shared is not None:
+        shared.set_many({version_key: entry[0], entry_key: entry}, TIMEOUT)
+    logger.debug('get: provider %s loaded' % entity_id)
+    return _copy(entry)
+
+
+def has_role(liberty_provider, role):
+    '''Return whether a provider returned by get() has the given role, 'sp'
+       or 'idp', enabled'''
+    for name, attribute, model in ROLES:
+        if name == role:
+            if role in getattr(liberty_provider, '_missing_roles', ()):
+                return False
+            try:
+                return getattr(liberty_provider, attribute).enabled
+            except model.DoesNotExist:
+                return False
+    raise ValueError('unknown role %r' % role)
+
+
+def invalidate(entity_id):
+    _local.delete(entity_id)
+    shared = get_shared_cache()
+    if shared is not None:
+        shared.delete_many(get_keys(entity_id))
+    logger.debug('invalidate: provider %s invalidated' % entity_id)
+
+
+def provider_changed(sender, instance, **kwargs):
+    if isinstance(instance, LibertyProvider):
+        invalidate(instance.entity_id)
+        return
+    try:
+        invalidate(instance.liberty_provider.entity_id)
+    except LibertyProvider.DoesNotExist:
+        # the provider is being deleted, its own signal invalidates it
+        pass
+
+for model in (LibertyProvider, LibertyServiceProvider,
+        LibertyIdentityProvider):
+    post_save.connect(provider_changed, sender=model,
+            dispatch_uid='provider_cache_%s_saved' % model.__name__)
+    post_delete.connect(provider_changed, sender=model,
+            dispatch_uid='provider_cache_%s_deleted' % model.__name__)
@@ -0,0 +1,141 @@
+'''Per-thread pool of lasso.Server objects
+
+   Building a lasso.Server and parsing the metadata of remote providers are
+   costly operations. Each thread keeps its own lasso.Server objects, so they
+   are never shared between concurrent requests, and the providers loaded
+   into them stay resident between requests. A resident provider is dropped
+   when its metadata or its role configuration changes.
+'''
+
+import threading
+import hashlib
+import time
+import logging
+
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+
+from authentic2.saml.models import LibertyProvider, LibertyServiceProvider, \
+    LibertyIdentityProvider
+
+logger = logging.getLogger('authentic2.saml.server_pool')
+
+# Maximum age of a pooled server in seconds, it bounds the time a provider
+# modified by another process can stay resident.
+MAX_AGE = getattr(settings, 'SAML_SERVER_POOL_MAX_AGE', 3600)
+
+_LOCAL = threading.local()
+_LOCK = threading.Lock()
+# LibertyProvider primary key -> generation, bumped each time a provider is
+# modified
+_GENERATIONS = {}
+
+
+def metadata_digest(metadata):
+    '''Return a digest identifying the content of a metadata file'''
+    if isinstance(metadata, unicode):
+        metadata = metadata.encode('utf8')
+    return hashlib.sha1(metadata).hexdigest()
+
+
+def get_generation(provider_pk):
+    return _GENERATIONS.get(provider_pk, 0)
+
+
+def invalidate(provider_pk):
+    '''Mark the provider as modified, pooled servers will reload it'''
+    _LOCK.acquire()
+    try:
+        _GENERATIONS[provider_pk] = _GENERATIONS.get(provider_pk, 0) + 1
+    finally:
+        _LOCK.release()
+    logger.debug('invalidate: provider %s invalidated' % provider_pk)
+
+
+class PooledServer(object):
+    '''A lasso.Server and the record of the providers loaded into it'''
+    def __init__(self, server):
+        self.server = server
+        self.creation = time.time()
+        # entity_id -> (provider_pk, role, digest, generation)
+        self.providers = {}
+
+    def expired(self, now=None):
+        now = now or time.time()
+        return MAX_AGE and now - self.creation > MAX_AGE
+
+    def drop_stale_providers(self):
+        stale = [entity_id for entity_id, (pk, role, digest, generation)
+                in self.providers.iteritems()
+                if generation != get_generation(pk)]
+        if not stale:
+            return
+        providers = self.server.providers
+        for entity_id in stale:
+            providers.pop(entity_id, None)
+            del self.providers[entity_id]
+        self.server.providers = providers
+        logger.debug('drop_stale_providers: dropped %s' % stale)
+
+
+def _get_pool():
+    pool = getattr(_LOCAL, 'pool', None)
+    if pool is None:
+        pool = _LOCAL.pool = {}
+    return pool
+
+
+def get_server(key, factory):
+    '''Return the lasso.Server of the current thread for the given key,
+       building it with factory() if needed.
+
+       The key must identify the configuration of the server, usually its
+       entity id.
+    '''
+    pool = _get_pool()
+    pooled = pool.get(key)
+    if pooled is None or pooled.expired():
+        pooled = pool[key] = PooledServer(factory())
+        logger.debug('get_server: new server for %s' % key)
+    else:
+        pooled.drop_stale_providers()
+    return pooled.server
+
+
+def _get_pooled(server):
+    for pooled in _get_pool().itervalues():
+        if pooled.server is server:
+            return pooled
+    return None
+
+
+def add_provider(server, role, liberty_provider):
+    '''Load the metadata of a LibertyProvider into the server, unless the
+       same metadata is already resident in it.
+    '''
+    metadata = liberty_provider.metadata
+    pooled = _get_pooled(server)
+    if pooled is None:
+        server.addProviderFromBuffer(role, metadata.encode('utf8'))
+        return
+    entity_id = liberty_provider.entity_id
+    pk = liberty_provider.pk
+    state = (pk, role, metadata_digest(metadata), get_generation(pk))
+    if pooled.providers.get(entity_id) == state:
+        return
+    server.addProviderFromBuffer(role, metadata.encode('utf8'))
+    pooled.providers[entity_id] = state
+    logger.debug('add_provider: %s loaded' % entity_id)
+
+
+def provider_changed(sender, instance, **kwargs):
+    # LibertyServiceProvider and LibertyIdentityProvider use the
+    # LibertyProvider primary key as their own
+    invalidate(instance.pk)
+
+for model in (LibertyProvider, LibertyServiceProvider,
+        LibertyIdentityProvider):
+    post_save.connect(provider_changed, sender=model,
+            dispatch_uid='server_pool_%s_saved' % model.__name__)
+    post_delete.connect(provider_changed, sender=model,
+            dispatch_uid='server_pool_%s_deleted' % model.__name__)
@@ -0,0 +1,180 @@
+'''Storage of the lasso sessions linked to the Django sessions
+
+   The store is chosen by the SAML_SESSION_STORE setting, the dotted path of
+   one of:
+
+    - DumpSessionStore, the default, keeps the whole dump of a lasso session
+      in a LibertySessionDump row, rewritten each time the session changes,
+    - RowSessionStore keeps the elements of a lasso session concerning each
+      remote provider, its assertion, status and NameID and session index,
+      in their own LibertySessionAssertion row, a lasso session is rebuilt
+      from the rows of the providers needed by a profile, and only the rows
+      added, changed or removed are written back. Elements concerning no
+      provider are kept in the row with an empty provider id, always loaded.
+'''
+
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.importlib import import_module
+
+from authentic2.saml.models import LibertySessionDump, \
+    LibertySessionAssertion
+from authentic2.saml.dumputils import split_dump, build_dump
+
+logger = logging.getLogger('authentic2.saml.session_store')
+
+STORE = getattr(settings, 'SAML_SESSION_STORE',
+        'authentic2.saml.session_store.DumpSessionStore')
+
+
+def build_session_dump(elements):
+    '''Build a lasso session dump from a list of pairs (provider_id,
+       assertion_content)'''
+    session = [u'<Session xmlns="http://www.entrouvert.org/namespaces/lasso/0.0" Version="2">']
+    for x in elements:
+        session.append(u'<Assertion RemoteProviderID="%s">%s</Assertion>' % x)
+    session.append(u'</Session>')
+    return u''.join(session)
+
+
+def split_session_dump(session_dump):
+    '''Return a dictionary mapping the remote provider ids of a session
+       dump to the dumps of their assertions, statuses and NameID and
+       session indexes'''
+    return split_dump(session_dump,
+            key_attributes=('RemoteProviderID', 'ProviderID'))
+
+
+def build_session_dump_from_rows(rows):
+    return build_dump('Session', rows)
+
+
+class DumpSessionStore(object):
+    def load(self, profile, session_key, kind, provider_ids=None):
+        try:
+            q = LibertySessionDump.objects.get(django_session_key=session_key,
+                    kind=kind)
+        except LibertySessionDump.DoesNotExist:
+            return
+        profile.setSessionFromDump(q.session_dump.encode('utf8'))
+
+    def save(self, profile, session_key, kind):
+        q, creation = LibertySessionDump.objects.get_or_create(
+                django_session_key=session_key, kind=kind)
+        if profile.session:
+            q.session_dump = profile.session.dump()
+        else:
+            q.session_dump = None
+        q.save()
+
+    def get_queryset(self, session_keys, kind):
+        qs = LibertySessionDump.objects \
+                .filter(django_session_key__in=session_keys)
+        if kind is not None:
+            qs = qs.filter(kind=kind)
+        return qs
+
+    def get_dumps(self, session_keys, kind):
+        return [q.session_dump for q in self.get_queryset(session_keys, kind)
+                if q.session_dump]
+
+    def delete(self, session_keys, kind):
+        self.get_queryset(session_keys, kind).delete()
+
+
+class RowSessionStore(object):
+    def get_queryset(self, session_keys, kind):
+        qs = LibertySessionAssertion.objects \
+                .filter(django_session_key__in=session_keys)
+        if kind is not None:
+            qs = qs.filter(kind=kind)
+        return qs
+
+    def load(self, profile, session_key, kind, provider_ids=None):
+        qs = self.get_queryset([session_key], kind)
+        if provider_ids is not None:
+            qs = qs.filter(provider_id__in=list(provider_ids) + [''])
+        rows = list(qs.values_list('assertion', flat=True))
+        try:
+            # remember which providers the profile may have removed
+            profile._session_store_loaded = provider_ids
+        except (AttributeError, TypeError):
+            pass
+        if rows:
+            profile.setSessionFromDump(
+                    build_session_dump_from_rows(rows).encode('utf8'))
+
+    def save(self, profile, session_key, kind):
+        parts = dict()
+        if profile.session:
+            parts = split_session_dump(profile.session.dump())
+        qs = self.get_queryset([session_key], kind)
+        loaded = getattr(profile, '_session_store_loaded', ())
+        if loaded is not None:
+            qs = qs.filter(provider_id__in=set(loaded) | set(parts) | set(['']))
+        digests = dict(qs.values_list('provider_id', 'digest'))
+        for provider_id, content in parts.iteritems():
+            digest = hashlib.sha1(content.encode('utf8')).hexdigest()
+            if provider_id not in digests:
+                LibertySessionAssertion(django_session_key=session_key,
+                        kind=kind, provider_id=provider_id,
+                        assertion=content, digest=digest).save()
+            elif digests[provider_id] != digest:
+                qs.filter(provider_id=provider_id) \
+                        .update(assertion=content, digest=digest)
+        removed = [provider_id for provider_id in digests
+                if provider_id not in parts]
+        if removed:
+            qs.filter(provider_id__in=removed).delete()
+
+    def get_dumps(self, session_keys, kind):
+        sessions = dict()
+        for session_key, row_kind, content in \
+                self.get_queryset(session_keys, kind) \
+                .order_by('django_session_key', 'kind', 'creation') \
+                .values_list('django_session_key', 'kind', 'assertion'):
+            sessions.setdefault((session_key, row_kind), []).append(content)
+        return [build_session_dump_from_rows(rows)
+                for rows in sessions.itervalues()]
+
+    def delete(self, session_keys, kind):
+        self.get_queryset(session_keys, kind).delete()
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        package, name = STORE.rsplit('.', 1)
+        try:
+            store_class = getattr(import_module(package), name)
+        except (ImportError, AttributeError):
+            raise ImproperlyConfigured('SAML session store %r could not be '
+                    'imported' % STORE)
+        _store = store_class()
+    return _store
+
+
+def load_session(profile, session_key, kind, provider_ids=None):
+    '''Load the lasso session of a Django session into a profile, with the
+       assertions of provider_ids only if not None'''
+    get_store().load(profile, session_key, kind, provider_ids)
+
+
+def save_session(profile, session_key, kind):
+    get_store().save(profile, session_key, kind)
+
+
+def get_session_dumps(session_keys, kind=None):
+    '''Return the dumps of the lasso sessions of some Django sessions, of
+       any kind if kind is None'''
+    return get_store().get_dumps(session_keys, kind)
+
+
+def delete_sessions(session_keys, kind=None):
+    get_store().delete(session_keys, kind)
@@ -0,0 +1,219 @@
+'''Pool of keep-alive HTTP connections used by soap_call()
+
+   Idle connections are kept per (scheme, host, client certificate) and
+   reused by the next SOAP message to the same endpoint, avoiding a TCP
+   connection and a TLS handshake per message. Latencies are counted per
+   endpoint URL, see get_stats(), and reported in the logs every
+   SAML_SOAP_STATS_INTERVAL seconds.
+
+   Other back-channel clients can create their own Pool with their own
+   timeouts.
+'''
+
+import httplib
+import logging
+import socket
+import threading
+import time
+import urllib
+
+from django.conf import settings
+
+logger = logging.getLogger('authentic2.saml.soap_pool')
+
+# Timeouts in seconds to establish a connection and to wait for a response
+CONNECT_TIMEOUT = getattr(settings, 'SAML_SOAP_CONNECT_TIMEOUT', 5)
+READ_TIMEOUT = getattr(settings, 'SAML_SOAP_READ_TIMEOUT', 30)
+# Number of times a connection is attempted again when it could not be
+# established. A message that may have reached the server is never sent again.
+RETRIES = getattr(settings, 'SAML_SOAP_RETRIES', 1)
+# Number of idle connections kept per host, and seconds they are kept
+POOL_SIZE = getattr(settings, 'SAML_SOAP_POOL_SIZE', 4)
+IDLE_TIMEOUT = getattr(settings, 'SAML_SOAP_IDLE_TIMEOUT', 60)
+# Calls slower than this number of seconds are logged
+SLOW_CALL = getattr(settings, 'SAML_SOAP_SLOW_CALL', 2)
+# Seconds between two reports of the statistics in the logs, 0 disables them
+STATS_INTERVAL = getattr(settings, 'SAML_SOAP_STATS_INTERVAL', 3600)
+
+
+class SendError(Exception):
+    '''The message was not sent, no byte of it reached the server, it is
+       safe to send it again'''
+    pass
+
+
+class Pool(object):
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT,
+            read_timeout=READ_TIMEOUT, retries=RETRIES, pool_size=POOL_SIZE,
+            idle_timeout=IDLE_TIMEOUT):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        # key -> list of (connection, time of release)
+        self.idle = dict()
+
+    def get_key(self, url, client_cert):
+        scheme, rest = urllib.splittype(url)
+        host, query = urllib.splithost(rest)
+        return (scheme, host, client_cert), query or '/'
+
+    def connect(self, key):
+        scheme, host, client_cert = key
+        if scheme == 'https':
+            conn = httplib.HTTPSConnection(host, key_file=client_cert,
+                    cert_file=client_cert, timeout=self.connect_timeout)
+        else:
+            conn = httplib.HTTPConnection(host, timeout=self.connect_timeout)
+        try:
+            conn.connect()
+        except (socket.error, httplib.HTTPException), err:
+            conn.close()
+            raise SendError(err)
+        conn.sock.settimeout(self.read_timeout)
+        return conn
+
+    def acquire(self, key, fresh=False):
+        '''Return an idle connection and True, or a new one and False'''
+        now = time.time()
+        self.lock.acquire()
+        try:
+            idle = self.idle.get(key, [])
+            while idle and not fresh:
+                conn, released = idle.pop()
+                if now - released < self.idle_timeout:
+                    return conn, True
+                conn.close()
+        finally:
+            self.lock.release()
+        return self.connect(key), False
+
+    def release(self, key, conn):
+        self.lock.acquire()
+        try:
+            idle = self.idle.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append((conn, time.time()))
+                return
+        finally:
+            self.lock.release()
+        conn.close()
+
+    def post(self, url, body, headers, client_cert=None):
+        '''POST body to url and return (status, data), reusing an idle
+           connection if possible'''
+        return self.request('POST', url, body, headers, client_cert)
+
+    def get(self, url, headers={}, client_cert=None):
+        return self.request('GET', url, None, headers, client_cert)
+
+    def request(self, method, url, body, headers, client_cert=None):
+        key, query = self.get_key(url, client_cert)
+        tries = 0
+        fresh = False
+        while True:
+            tries += 1
+            try:
+                conn, reused = self.acquire(key, fresh)
+            except SendError, err:
+                if tries > self.retries:
+                    raise
+                logger.debug('request: connecting again to %s after %s' % (url,
+                    err))
+                continue
+            try:
+                try:
+                    conn.request(method, query, body, headers)
+                    response = conn.getresponse()
+                except (socket.error, httplib.BadStatusLine), err:
+                    # A reused connection failing without any response was
+                    # closed by the server while idle, the message was not
+                    # read. On a new connection, or on a timeout, the
+                    # message may have been received and is not sent again.
+                    if not reused or isinstance(err, socket.timeout):
+                        raise
+                    raise SendError(err)
+                data = response.read()
+            except SendError, err:
+                conn.close()
+                logger.debug('request: sending again to %s on a new '
+                    'connection after %s' % (url, err))
+                # a stale idle connection does not count as a try, but the
+                # message is sent again only once
+                tries -= 1
+                fresh = True
+                continue
+            except:
+                conn.close()
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                self.release(key, conn)
+            return response.status, data
+
+
+_pool = Pool()
+
+_stats_lock = threading.Lock()
+# url -> [calls, errors, total seconds, maximum seconds]
+_stats = dict()
+_last_report = time.time()
+
+
+def record(url, duration, error):
+    global _last_report
+    report = False
+    _stats_lock.acquire()
+    try:
+        stats = _stats.setdefault(url, [0, 0, 0.0, 0.0])
+        stats[0] += 1
+        if error:
+            stats[1] += 1
+        stats[2] += duration
+        stats[3] = max(stats[3], duration)
+        now = time.time()
+        if STATS_INTERVAL and now - _last_report >= STATS_INTERVAL:
+            _last_report = now
+            report = True
+    finally:
+        _stats_lock.release()
+    if duration > SLOW_CALL:
+        logger.warning('record: SOAP endpoint %s is slow, answered in %.2f '
+            'seconds' % (url, duration))
+    if report:
+        log_stats()
+
+
+def get_stats():
+    '''Return a dictionary mapping the endpoint URLs called by this process to
+       their number of calls, of errors, mean and maximum latency'''
+    _stats_lock.acquire()
+    try:
+        return dict((url, {'calls': calls, 'errors': errors,
+            'mean': total / calls, 'max': maximum})
+            for url, (calls, errors, total, maximum) in _stats.iteritems())
+    finally:
+        _stats_lock.release()
+
+
+def log_stats():
+    '''Log the statistics of the endpoints called by this process'''
+    for url, stats in sorted(get_stats().iteritems()):
+        logger.info('log_stats: SOAP endpoint %s, %d calls, %d errors, '
+            'mean latency %.3f seconds, maximum %.3f seconds' % (url,
+                stats['calls'], stats['errors'], stats['mean'],
+                stats['max']))
+
+
+def post(url, body, headers, client_cert=None):
+    start = time.time()
+    error = True
+    try:
+        status, data = _pool.post(url, body, headers, client_cert)
+        error = status not in (200, 204)
+        return status, data
+    finally:
+        record(url, time.time() - start, error)
@@ -0,0 +1,472 @@
+import BaseHTTPServer
+import errno
+import httplib
+import socket
+import StringIO
+import threading
+import urllib2
+
+from xml.dom import minidom
+
+import lasso
+
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.utils.importlib import import_module
+
+from authentic2.http_utils import get_url_conditional
+from authentic2.saml import metadata_refresh, provider_cache, soap_pool
+from authentic2.saml.common import retrieve_metadata_and_create
+from authentic2.saml.models import LibertyProvider, MetadataSource, \
+    LibertyServiceProvider, LibertySessionAssertion, LIBERTY_SESSION_DUMP_KIND_IDP, \
+    LibertyFederationDump
+from authentic2.saml.session_store import RowSessionStore, \
+    split_session_dump, build_session_dump_from_rows
+from authentic2.saml.identity_store import RowIdentityStore, \
+    split_identity_dump, build_identity_dump
+
+
+METADATA = '''<?xml version="1.0"?>
+<EntityDescriptor xmlns="urn:oasis:names:tc:SAML:2.0:metadata"
+    entityID="%s" cacheDuration="PT1H"/>'''
+ETAG = '"v1"'
+LAST_MODIFIED = 'Mon, 02 Jan 2012 10:00:00 GMT'
+
+
+class HTTPStandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.headers)
+        status, headers, body = self.server.respond(self.headers)
+        self.send_response(status)
+        for header in headers.iteritems():
+            self.send_header(*header)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPStandIn(object):
+    '''HTTP server answering on localhost from a thread, respond(headers)
+       returns the (status, headers, body) of the response'''
+
+    def __init__(self, respond):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                HTTPStandInHandler)
+        self.server.respond = respond
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d/metadata' % self.server.server_port
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def conditional_metadata(headers):
+    '''Serve METADATA with validators, honoring conditional requests'''
+    if headers.get('If-None-Match') == ETAG:
+        return 304, {'ETag': ETAG}, ''
+    return 200, {'ETag': ETAG, 'Last-Modified': LAST_MODIFIED,
+            'Content-Type': 'application/samlmetadata+xml'}, METADATA
+
+
+class HTTPStandInTestCase(TestCase):
+    respond = staticmethod(conditional_metadata)
+
+    def setUp(self):
+        self.stand_in = HTTPStandIn(self.respond)
+        self.url = self.stand_in.url
+
+    def tearDown(self):
+        self.stand_in.stop()
+
+
+class GetUrlConditionalTest(HTTPStandInTestCase):
+    def test_validators(self):
+        content, headers = get_url_conditional(self.url)
+        self.assertEqual(content, METADATA)
+        self.assertEqual(headers.get('ETag'), ETAG)
+        self.assertEqual(headers.get('Last-Modified'), LAST_MODIFIED)
+        self.assertEqual(self.stand_in.requests[0].get('If-None-Match'),
+                None)
+
+    def test_not_modified(self):
+        content, headers = get_url_conditional(self.url, etag=ETAG,
+                last_modified=LAST_MODIFIED)
+        self.assertEqual(content, None)
+        request = self.stand_in.requests[0]
+        self.assertEqual(request.get('If-None-Match'), ETAG)
+        self.assertEqual(request.get('If-Modified-Since'), LAST_MODIFIED)
+
+
+class GetUrlConditionalErrorTest(HTTPStandInTestCase):
+    respond = staticmethod(lambda headers: (500, {}, 'error'))
+
+    def test_error(self):
+        try:
+            get_url_conditional(self.url, etag=ETAG)
+        except urllib2.HTTPError, e:
+            self.assertEqual(e.code, 500)
+        else:
+            self.fail('HTTPError not raised')
+
+
+class MetadataRefreshTest(HTTPStandInTestCase):
+    def test_modified(self):
+        source = metadata_refresh.get_source(self.url)
+        metadata = metadata_refresh.fetch(source)
+        self.assertEqual(metadata, unicode(METADATA))
+        self.assertEqual(source.etag, ETAG)
+        self.assertEqual(source.last_modified, LAST_MODIFIED)
+        self.assertNotEqual(source.digest, '')
+        self.assertTrue(source.expires > source.last_fetch)
+
+    def test_not_modified(self):
+        source = metadata_refresh.get_source(self.url)
+        source.etag = ETAG
+        source.digest = 'digest'
+        source.save()
+        provider = LibertyProvider(entity_id=self.url, metadata=u'old')
+        metadata = metadata_refresh.fetch(source)
+        self.assertEqual(metadata, None)
+        self.assertFalse(metadata_refresh.save_refresh(provider, source,
+            metadata))
+        self.assertEqual(provider.metadata, u'old')
+        self.assertEqual(provider.pk, None)
+        self.assertEqual(LibertyProvider.objects.count(), 0)
+        source = MetadataSource.objects.get(url=self.url)
+        self.assertEqual(source.etag, ETAG)
+        self.assertEqual(source.digest, 'digest')
+        self.assertNotEqual(source.last_fetch, None)
+
+
+class MetadataRefreshErrorTest(HTTPStandInTestCase):
+    respond = staticmethod(lambda headers: (404, {}, 'not found'))
+
+    def test_error(self):
+        source = metadata_refresh.get_source(self.url)
+        source.etag = ETAG
+        self.assertRaises(urllib2.HTTPError, metadata_refresh.fetch, source)
+        self.assertEqual(source.etag, ETAG)
+        self.assertEqual(source.last_fetch, None)
+        self.assertEqual(MetadataSource.objects.count(), 0)
+
+    def test_autoload_error(self):
+        self.assertEqual(retrieve_metadata_and_create(None, self.url, 'sp'),
+                None)
+        self.assertEqual(MetadataSource.objects.count(), 0)
+
+
+SP1 = 'https://sp1.example.com/metadata'
+SP2 = 'https://sp2.example.com/metadata'
+ASSERTION = '''<Assertion RemoteProviderID="%(sp)s"><saml:Assertion \
+xmlns:saml="urn:oasis:names:tc:SAML:2.0:assertion" ID="_%(id)s" \
+IssueInstant="2012-01-02T10:00:00Z" Version="2.0"><saml:Issuer>\
+https://idp.example.com/metadata</saml:Issuer></saml:Assertion></Assertion>'''
+NID_AND_SESSION_INDEX = '''<NidAndSessionIndex ProviderID="%(sp)s" \
+AssertionID="_%(id)s" SessionIndex="_%(id)s"><saml:NameID \
+xmlns:saml="urn:oasis:names:tc:SAML:2.0:assertion" \
+Format="urn:oasis:names:tc:SAML:2.0:nameid-format:transient">\
+_name%(id)s</saml:NameID></NidAndSessionIndex>'''
+SESSION_DUMP = '''<Session \
+xmlns="http://www.entrouvert.org/namespaces/lasso/0.0" Version="2">\
+%s</Session>''' % ''.join(template % {'sp': sp, 'id': id}
+        for sp, id in ((SP1, 1), (SP2, 2))
+        for template in (ASSERTION, NID_AND_SESSION_INDEX))
+
+
+def session_elements(session_dump):
+    '''Return the sorted XML of the children of a session or identity
+       dump'''
+    if isinstance(session_dump, unicode):
+        session_dump = session_dump.encode('utf8')
+    root = minidom.parseString(session_dump).documentElement
+    return sorted(child.toxml() for child in root.childNodes
+            if child.nodeType == child.ELEMENT_NODE)
+
+
+class FakeSession(object):
+    def __init__(self, session_dump):
+        self.session_dump = session_dump
+
+    def dump(self):
+        return self.session_dump
+
+
+class FakeProfile(object):
+    '''Stand-in for a lasso profile, recording the session it is given'''
+    def __init__(self, session_dump=None):
+        self.session = None
+        if session_dump:
+            self.session = FakeSession(session_dump)
+
+    def setSessionFromDump(self, session_dump):
+        self.session = FakeSession(session_dump)
+
+
+class RowSessionStoreTest(TestCase):
+    session_key = 'a' * 32
+    kind = LIBERTY_SESSION_DUMP_KIND_IDP
+
+    def setUp(self):
+        self.store = RowSessionStore()
+
+    def test_split(self):
+        parts = split_session_dump(SESSION_DUMP)
+        self.assertEqual(sorted(parts), [SP1, SP2])
+        for sp, part in parts.iteritems():
+            self.assertTrue(part.startswith('<Assertion RemoteProviderID'))
+            self.assertTrue('<NidAndSessionIndex ProviderID="%s"' % sp in part)
+            self.assertTrue('<saml:NameID' in part)
+        self.assertEqual(session_elements(
+            build_session_dump_from_rows(parts.values())),
+            session_elements(SESSION_DUMP))
+
+    def test_round_trip(self):
+        self.store.save(FakeProfile(SESSION_DUMP), self.session_key,
+                self.kind)
+        self.assertEqual(LibertySessionAssertion.objects.count(), 2)
+        profile = FakeProfile()
+        self.store.load(profile, self.session_key, self.kind)
+        self.assertEqual(session_elements(profile.session.dump()),
+                session_elements(SESSION_DUMP))
+        self.assertEqual(session_elements(self.store.get_dumps(
+            [self.session_key], self.kind)[0]),
+            session_elements(SESSION_DUMP))
+
+    def test_partial_load(self):
+        self.store.save(FakeProfile(SESSION_DUMP), self.session_key,
+                self.kind)
+        profile = FakeProfile()
+        self.store.load(profile, self.session_key, self.kind,
+                provider_ids=[SP1])
+        elements = session_elements(profile.session.dump())
+        self.assertEqual(len(elements), 2)
+        self.assertTrue(SP2 not in ''.join(elements))
+        # the provider removed from the partial session is removed alone
+        profile.session = FakeSession(u'<Session xmlns="%s" Version="2"/>'
+                % 'http://www.entrouvert.org/namespaces/lasso/0.0')
+        self.store.save(profile, self.session_key, self.kind)
+        self.assertEqual(list(LibertySessionAssertion.objects \
+                .values_list('provider_id', flat=True)), [SP2])
+
+    def test_lasso_round_trip(self):
+        parts = split_session_dump(SESSION_DUMP)
+        session = lasso.Session.newFromDump(
+                build_session_dump_from_rows(parts.values()).encode('utf8'))
+        self.assertEqual(sorted(session.get_assertions().keys()),
+                [SP1, SP2])
+        self.assertEqual(sorted(split_session_dump(session.dump())),
+                [SP1, SP2])
+
+
+FEDERATION = '''<Federation RemoteProviderID="%(sp)s" \
+FederationDumpVersion="2"><RemoteNameIdentifier><saml:NameID \
+Format="urn:oasis:names:tc:SAML:2.0:nameid-format:persistent" \
+NameQualifier="https://idp.example.com/metadata" \
+SPNameQualifier="%(sp)s">_name%(id)s</saml:NameID></RemoteNameIdentifier>\
+</Federation>'''
+# the saml prefix is declared on the root, as the children must be moved
+# under a new root without it
+IDENTITY_DUMP = '''<Identity \
+xmlns="http://www.entrouvert.org/namespaces/lasso/0.0" \
+xmlns:saml="urn:oasis:names:tc:SAML:2.0:assertion" Version="2">\
+%s</Identity>''' % ''.join(FEDERATION % {'sp': sp, 'id': id}
+        for sp, id in ((SP1, 1), (SP2, 2)))
+
+
+class FakeIdentity(object):
+    def __init__(self, identity_dump):
+        self.identity_dump = identity_dump
+
+    def dump(self):
+        return self.identity_dump
+
+
+class FakeIdentityProfile(object):
+    def __init__(self, identity_dump=None):
+        self.identity = None
+        if identity_dump:
+            self.identity = FakeIdentity(identity_dump)
+
+    def setIdentityFromDump(self, identity_dump):
+        self.identity = FakeIdentity(identity_dump)
+
+
+class RowIdentityStoreTest(TestCase):
+    def setUp(self):
+        self.store = RowIdentityStore()
+        self.user = User.objects.create(username='john')
+
+    def test_split(self):
+        federations = split_identity_dump(IDENTITY_DUMP)
+        self.assertEqual(sorted(federations), [SP1, SP2])
+        for federation_dump in federations.itervalues():
+            # prefixes are kept, and not rewritten as ns0:, ns1:
+            self.assertTrue(federation_dump.startswith('<Federation '))
+            self.assertTrue('<saml:NameID' in federation_dump)
+            self.assertTrue('xmlns:saml=' in federation_dump)
+            self.assertFalse('ns0:' in federation_dump)
+
+    def test_round_trip(self):
+        self.store.save(FakeIdentityProfile(IDENTITY_DUMP), self.user)
+        self.assertEqual(LibertyFederationDump.objects.count(), 2)
+        profile = FakeIdentityProfile()
+        self.store.load(profile, self.user, provider_ids=[SP2])
+        elements = session_elements(profile.identity.dump())
+        self.assertEqual(len(elements), 1)
+        self.assertTrue(SP2 in elements[0])
+        profile = FakeIdentityProfile()
+        self.store.load(profile, self.user)
+        self.assertEqual(split_identity_dump(profile.identity.dump()),
+                split_identity_dump(IDENTITY_DUMP))
+
+    def test_lasso_round_trip(self):
+        federations = split_identity_dump(IDENTITY_DUMP)
+        identity = lasso.Identity.newFromDump(
+                build_identity_dump(federations.values()).encode('utf8'))
+        for sp in (SP1, SP2):
+            federation = identity.getFederation(sp)
+            self.assertNotEqual(federation, None)
+            self.assertEqual(federation.remoteProviderId, sp)
+        self.assertEqual(sorted(split_identity_dump(identity.dump())),
+                [SP1, SP2])
+
+
+class ProviderCacheTest(TestCase):
+    ENTITY_ID = 'https://sp.example.com/metadata'
+
+    def setUp(self):
+        provider_cache.invalidate(self.ENTITY_ID)
+        liberty_provider = LibertyProvider.objects.create(
+                entity_id=self.ENTITY_ID, protocol_conformance=3,
+                metadata=METADATA % self.ENTITY_ID)
+        LibertyServiceProvider.objects.create(
+                liberty_provider=liberty_provider, enabled=True)
+
+    def tearDown(self):
+        provider_cache.invalidate(self.ENTITY_ID)
+
+    def test_has_role(self):
+        provider_cache.get(self.ENTITY_ID)
+        with self.assertNumQueries(0):
+            liberty_provider = provider_cache.get(self.ENTITY_ID)
+            self.assertEqual([provider_cache.has_role(liberty_provider, role)
+                    for role in ('sp', 'idp', 'sp', 'idp')],
+                [True, False, True, False])
+
+    def test_invalidate(self):
+        provider_cache.get(self.ENTITY_ID)
+        sp = LibertyServiceProvider.objects.get()
+        sp.enabled = False
+        sp.save()
+        liberty_provider = provider_cache.get(self.ENTITY_ID)
+        self.assertFalse(provider_cache.has_role(liberty_provider, 'sp'))
+
+
+sync_metadata = import_module('authentic2.saml.management.commands.sync-metadata')
+
+
+class IterEntitiesTest(TestCase):
+    def iter_entities(self, metadata):
+        metadata_file = StringIO.StringIO(metadata)
+        metadata_file.name = 'metadata.xml'
+        return [(element.get('entityID'), len(element))
+                for element in sync_metadata.iter_entities(metadata_file)]
+
+    def test_nested_entities_descriptor(self):
+        entity = '<EntityDescriptor entityID="%s"><SPSSODescriptor/>' \
+                '</EntityDescriptor>'
+        metadata = '<EntitiesDescriptor xmlns="%s">%s<EntitiesDescriptor>' \
+                '%s</EntitiesDescriptor>%s</EntitiesDescriptor>' % (
+                        lasso.SAML2_METADATA_HREF, entity % 'a',
+                        entity % 'nested', entity % 'b')
+        self.assertEqual(self.iter_entities(metadata), [('a', 1), ('b', 1)])
+
+    def test_entity_descriptor(self):
+        metadata = '<EntityDescriptor xmlns="%s" entityID="a">' \
+                '<SPSSODescriptor/><IDPSSODescriptor/></EntityDescriptor>' \
+                % lasso.SAML2_METADATA_HREF
+        self.assertEqual(self.iter_entities(metadata), [('a', 2)])
+
+
+class FakeResponse(object):
+    status = 200
+    will_close = False
+
+    def read(self):
+        return 'response'
+
+
+class FakeConnection(object):
+    '''Connection whose request() or getresponse() raises error'''
+
+    def __init__(self, error=None, on_request=False):
+        self.error = error
+        self.on_request = on_request
+        self.requests = 0
+        self.closed = False
+
+    def request(self, method, query, body, headers):
+        self.requests += 1
+        if self.error and self.on_request:
+            raise self.error
+
+    def getresponse(self):
+        if self.error and not self.on_request:
+            raise self.error
+        return FakeResponse()
+
+    def close(self):
+        self.closed = True
+
+
+class SoapPoolTest(TestCase):
+    url = 'http://sp.example.com/soap'
+
+    def setUp(self):
+        self.pool = soap_pool.Pool()
+        self.key, query = self.pool.get_key(self.url, None)
+        self.connections = []
+        self.pool.connect = lambda key: self.connections.pop(0)
+
+    def idle(self, conn):
+        self.pool.release(self.key, conn)
+
+    def test_stale_connection_reset(self):
+        stale = FakeConnection(socket.error(errno.ECONNRESET, 'reset'))
+        self.idle(stale)
+        self.idle(FakeConnection(httplib.BadStatusLine('')))
+        fresh = FakeConnection()
+        self.connections.append(fresh)
+        self.assertEqual(self.pool.post(self.url, 'body', {}),
+                (200, 'response'))
+        self.assertEqual(fresh.requests, 1)
+        # the message is sent again once, on a new connection
+        self.assertEqual(len(self.pool.idle[self.key]), 2)
+
+    def test_timeout_not_sent_again(self):
+        self.idle(FakeConnection(socket.timeout('timed out')))
+        self.assertRaises(socket.timeout, self.pool.post, self.url, 'body',
+                {})
+
+    def test_new_connection_not_sent_again(self):
+        conn = FakeConnection(socket.error(errno.EPIPE, 'broken pipe'),
+                on_request=True)
+        self.connections.append(conn)
+        self.connections.append(FakeConnection())
+        self.assertRaises(socket.error, self.pool.post, self.url, 'body', {})
+        self.assertEqual(conn.requests, 1)
+        self.assertTrue(conn.closed)
@@ -237,14 +237,117 @@ SAML_METADATA_ROOT = 'metadata'
 # Only https URLS are accepted.
 # Can be none, sp, idp or both
 SAML_METADATA_AUTOLOAD = 'none'
+# Maximum age in seconds of the per-thread lasso.Server objects, and of the
+# provider metadata kept loaded into them
+# SAML_SERVER_POOL_MAX_AGE = 3600
+# Providers looked up by load_provider() are cached in process; set
+# SAML_PROVIDER_CACHE to the name of a Django cache to share them between
+# processes
+# SAML_PROVIDER_CACHE = 'default'
+# SAML_PROVIDER_CACHE_SIZE = 1000
+# SAML_PROVIDER_CACHE_TIMEOUT = 300
+# Minimum interval in seconds between two downloads of the metadata of a
+# provider by the refresh-metadata command, when the metadata do not declare
+# a validUntil or a cacheDuration
+# SAML_METADATA_MIN_REFRESH_INTERVAL = 0
+# Artifacts are kept until their resolution in the database, or in the
+# Django cache named by SAML_ARTIFACT_CACHE with the CacheArtifactStore, for
+# at most SAML2_ARTIFACT_EXPIRATION seconds
+# SAML_ARTIFACT_STORE = 'authentic2.saml.artifact_store.ModelArtifactStore'
+# SAML_ARTIFACT_STORE = 'authentic2.saml.artifact_store.CacheArtifactStore'
+# SAML_ARTIFACT_CACHE = 'default'
+# SAML2_ARTIFACT_EXPIRATION = 600
+# Lasso sessions are kept as a whole dump, or one row per assertion with the
+# RowSessionStore
+# SAML_SESSION_STORE = 'authentic2.saml.session_store.DumpSessionStore'
+# SAML_SESSION_STORE = 'authentic2.saml.session_store.RowSessionStore'
+# Lasso identities are kept as a whole dump, or one row per federation with
+# the RowIdentityStore, see the migrate-identity-dumps command
+# SAML_IDENTITY_STORE = 'authentic2.saml.identity_store.DumpIdentityStore'
+# SAML_IDENTITY_STORE = 'authentic2.saml.identity_store.RowIdentityStore'
+# Relay the SOAP logout requests to the service providers in parallel, each
+# provider being given SAML_SLO_SOAP_TIMEOUT seconds to answer
+# SAML_SLO_SOAP_CONCURRENT = False
+# SAML_SLO_SOAP_TIMEOUT = 10
+# SAML_SLO_SOAP_WORKERS = 10
+# SOAP messages are sent on keep-alive connections kept per host
+# SAML_SOAP_CONNECT_TIMEOUT = 5
+# SAML_SOAP_READ_TIMEOUT = 30
+# SAML_SOAP_RETRIES = 1
+# SAML_SOAP_POOL_SIZE = 4
+# SAML_SOAP_IDLE_TIMEOUT = 60
+# SOAP endpoints slower than this number of seconds are logged
+# SAML_SOAP_SLOW_CALL = 2
+# Number of seconds between two reports in the logs of the calls, errors and
+# latencies of the SOAP endpoints called by each process, 0 disables them
+# SAML_SOAP_STATS_INTERVAL = 3600
+# Timeout in seconds of the HTTP requests done to retrieve metadata
+# HTTP_TIMEOUT = 30
+
+# Attribute aggregator settings
+# Attribute sources are queried concurrently by a pool of threads
+# ATTRIBUTE_SOURCE_WORKERS = 10
+# Time in seconds given to each source, and to all sources, to answer
+# ATTRIBUTE_SOURCE_TIMEOUT = 5
+# ATTRIBUTE_SOURCE_TIMEOUTS = {'source name': 5}
+# ATTRIBUTE_SOURCES_DEADLINE = 10
+# Sources slower than this number of seconds are logged
+# ATTRIBUTE_SOURCE_SLOW = 1
+# Connections to the LDAP sources are kept in a pool, idle connections are
+# checked before reuse after LDAP_POOL_CHECK_INTERVAL seconds
+# LDAP_POOL_SIZE = 10
+# LDAP_POOL_CHECK_INTERVAL = 60
+# LDAP_TIMEOUT = 5
+# CA certificates of the LDAPS sources are written in a directory private to
+# the process, created in the temporary directory unless set
+# LDAP_CA_DIR = '/var/lib/authentic2/ldap-ca'
+# Time in seconds the attribute values retrieved from a source are cached
+# for a user, by default and per source name, 0 disables the cache
+# ATTRIBUTE_SOURCE_CACHE_TIMEOUT = 0
+# ATTRIBUTE_SOURCE_CACHE_TIMEOUTS = {'source name': 300}
+# ATTRIBUTE_CACHE = 'default'
+# Time in seconds the attribute policies resolved at SSO are cached in each
+# process, they are reloaded at once when modified in the same process
+# ATTRIBUTE_POLICY_CACHE_TIMEOUT = 60
+
+# Nonce settings
+# Nonces are kept in the database, in a directory with 'fs:<path>', or in a
+# Django cache shared by all the nodes with 'cache:<cache name>'; with the
+# filesystem storage the expired nonces are removed by buckets of
+# NONCE_FILESYSTEM_BUCKET_DURATION seconds, see the migrate-nonce-files
+# command to upgrade an existing directory
+# NONCE_STORAGE = 'model'
+# NONCE_STORAGE = 'fs:/var/lib/authentic2/nonces'
+# NONCE_STORAGE = 'cache:default'
+# NONCE_FILESYSTEM_BUCKET_DURATION = 3600
 
 # OpenID settings
 IDP_OPENID = True
+# OpenID associations looked up by handle are cached in process; set
+# OPENID_ASSOCIATION_CACHE to the name of a Django cache to share them
+# between processes
+# OPENID_ASSOCIATION_CACHE = 'default'
+# OPENID_ASSOCIATION_CACHE_SIZE = 1000
+# OPENID_ASSOCIATION_CACHE_TIMEOUT = 300
 
 # CAS settings
 IDP_CAS = False
 # expiration time in seconds of the cas tickets
 # CAS_TICKET_EXPIRATION = 240
+# CAS service tickets are kept in the database, or in the Django cache named
+# by CAS_TICKET_CACHE with the CacheTicketStore. The idp_cas application is
+# managed by South, existing installations must run
+# 'manage.py migrate idp_cas 0001 --fake' before migrating
+# CAS_TICKET_STORE = 'authentic2.idp.idp_cas.ticket_store.ModelTicketStore'
+# CAS_TICKET_STORE = 'authentic2.idp.idp_cas.ticket_store.CacheTicketStore'
+# CAS_TICKET_CACHE = 'default'
+# Lifetime in seconds of the proxy granting tickets, and timeout of the calls
+# to the proxy callbacks
+# CAS_PGT_EXPIRATION = 7200
+# CAS_PROXY_CALLBACK_TIMEOUT = 5
+# Attributes are released in the serviceValidate and proxyValidate responses
+# to the services whose URL starts with a prefix mapped to an attribute policy
+# CAS_ATTRIBUTE_POLICIES = {'https://service.example.com/': 'policy name'}
 
 # Logging settings
 
@@ -2,6 +2,7 @@ import time
 import hashlib
 import datetime as dt
 import logging
+import threading
 
 from django.views.decorators.http import condition
 from django.conf import settings
@@ -55,6 +56,87 @@ class MWT(object):
         return func
 
 
+class LRUCache(object):
+    '''Thread-safe least recently used cache, entries can also expire after a
+       timeout in seconds.'''
+    PREV, NEXT, KEY, VALUE, EXPIRE = range(5)
+
+    def __init__(self, maxsize=1000, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.data = {}
+            # circular doubly linked list of the entries, most recently used
+            # first
+            self.root = []
+            self.root[:] = [self.root, self.root, None, None, None]
+        finally:
+            self.lock.release()
+
+    def _unlink(self, link):
+        link[self.PREV][self.NEXT] = link[self.NEXT]
+        link[self.NEXT][self.PREV] = link[self.PREV]
+
+    def _push_front(self, link):
+        first = self.root[self.NEXT]
+        link[self.PREV], link[self.NEXT] = self.root, first
+        first[self.PREV] = self.root[self.NEXT] = link
+
+    def get(self, key, default=None):
+        self.lock.acquire()
+        try:
+            link = self.data.get(key)
+            if link is None:
+                return default
+            if link[self.EXPIRE] is not None \
+                    and link[self.EXPIRE] < time.time():
+                self._unlink(link)
+                del self.data[key]
+                return default
+            self._unlink(link)
+            self._push_front(link)
+            return link[self.VALUE]
+        finally:
+            self.lock.release()
+
+    def set(self, key, value, timeout=None):
+        timeout = timeout or self.timeout
+        expire = None
+        if timeout:
+            expire = time.time() + timeout
+        self.lock.acquire()
+        try:
+            link = self.data.get(key)
+            if link is not None:
+                self._unlink(link)
+            elif len(self.data) >= self.maxsize:
+                last = self.root[self.PREV]
+                self._unlink(last)
+                del self.data[last[self.KEY]]
+            link = [None, None, key, value, expire]
+            self._push_front(link)
+            self.data[key] = link
+        finally:
+            self.lock.release()
+
+    def delete(self, key):
+        self.lock.acquire()
+        try:
+            link = self.data.pop(key, None)
+            if link is not None:
+                self._unlink(link)
+        finally:
+            self.lock.release()
+
+    def __len__(self):
+        return len(self.data)
+
+
 def cache_and_validate(timeout, hashing=hashlib.md5):
     '''
        Decorator to add caching, with support for ETag and Last-modified